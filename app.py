@@ -1,28 +1,52 @@
 import os
 import sys
+import logging
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 os.chdir(BASE_DIR)
 # Set PYTHONPATH to include the script directory
 sys.path.insert(0, BASE_DIR)
 
-from flask import Flask, render_template, Response, jsonify, request, send_from_directory
-import ftplib
+from flask import Flask, Request, render_template, Response, jsonify, request, send_from_directory, url_for
 import ssl
 import threading
 import cv2
-import numpy as np
 from rgbmatrix import RGBMatrix, RGBMatrixOptions
-from PIL import Image
 import time
 from datetime import datetime
+from collections import OrderedDict
 import base64
 import io
+import tempfile
+import requests
+from serving import run_server
+from scanner_ingest import IngestQueue
+from ftp_outbox import FtpOutbox
+from effects import parse_effect_params
+from presets import PresetStore, DEFAULT_PRESET, edit_preset, preset_params
+from preview_cache import PreviewRenderer
+from live_preview import PreviewChannel
+from edit_session import EditSession
+from capture_index import CaptureIndex
+from metrics import Counter, Histogram, install_flask
+from logs import setup_logging, install_flask as install_logs
+from tiles import make_tile, encode_tile, sha256_hex, promotion_artifacts, CATALOG_TOKEN_HEADER
+from mosaic import (square_crop, block_grid, upscale, parse_panel_layout, layout_levels,
+                    PanelFramebuffer, PYRAMID_LEVELS, PANEL_SIZE)
+from temporal import TemporalFilter, parse_temporal_settings
+from dither import PanelQuantizer
 
 isSavingToFTP = False
 
 UPLOAD_ROOT = os.path.join(BASE_DIR, "uploads")
 os.makedirs(UPLOAD_ROOT, exist_ok=True)
 
+# Uploaded scans are streamed into this folder instead of being held in memory
+SPOOL_DIR = os.path.join(UPLOAD_ROOT, ".spool")
+os.makedirs(SPOOL_DIR, exist_ok=True)
+for stale in os.listdir(SPOOL_DIR):
+    os.remove(os.path.join(SPOOL_DIR, stale))
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "200"))
+
 TEMPLATE_PATH = os.path.join(BASE_DIR, 'templates')
 STATIC_PATH = os.path.join(BASE_DIR, 'static')
 
@@ -30,30 +54,61 @@ context = ssl.create_default_context()
 context.check_hostname = False
 context.verify_mode = ssl.CERT_NONE
 
-FTP_HOST = "ftp.oc-d.co.uk"
-FTP_USER = "tracingtogetherauto@oc-d.co.uk"
-FTP_PASS = "72lrqnvrw387"
-FTP_TARGET_DIR = "screenshots"
+FTP_HOST = os.getenv("FTP_HOST", "77.72.2.82")  # ftp.oc-d.co.uk
+FTP_PORT = int(os.getenv("FTP_PORT", "21"))
+FTP_USER = os.getenv("FTP_USER", "tracingtogetherauto@oc-d.co.uk")
+FTP_PASS = os.getenv("FTP_PASS", "72lrqnvrw387")
+FTP_TARGET_DIR = os.getenv("FTP_TARGET_DIR", "screenshots")
+FTP_USE_TLS = os.getenv("FTP_USE_TLS", "1") == "1"  # 0 for a local plain-FTP test server
+FTP_OUTBOX_DIR = os.path.join(UPLOAD_ROOT, ".outbox")
+
+# Image coordinator that promoted images are registered with
+COORDINATOR_URL = os.getenv("COORDINATOR_URL", "http://127.0.0.1:5001")
+CATALOG_TOKEN = os.getenv("CATALOG_TOKEN", "")  # must match the coordinator's
+
+ftp_outbox = FtpOutbox(FTP_OUTBOX_DIR, FTP_HOST, FTP_USER, FTP_PASS, FTP_TARGET_DIR,
+                       port=FTP_PORT, use_tls=FTP_USE_TLS, tls_context=context)
+if isSavingToFTP:
+    ftp_outbox.start()
+
+class SpoolingRequest(Request):
+    """Stream uploaded files straight into named spool files on disk"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.NamedTemporaryFile("wb+", dir=SPOOL_DIR, suffix=".upload", delete=False)
 
 app = Flask(__name__,
             template_folder=TEMPLATE_PATH,
             static_folder=STATIC_PATH)
+app.request_class = SpoolingRequest
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_MB * 1024 * 1024
+install_flask(app, "app")
+install_logs(app)
+
+log = logging.getLogger("app")
+
+FRAME_SECONDS = Histogram("app_frame_seconds", "Matrix loop work per frame, excluding the camera read and sleep")
+JPEG_ENCODE = Histogram("app_jpeg_encode_seconds", "JPEG encode time per streamed frame", ("stream",))
 
 # app = Flask(__name__)
 
 latest_frame = None
 mosaic_frame = None
 frame_lock = threading.Lock()
-effect_params = {
-    "brightness": 1.0,
-    "contrast": 1.0,
-    "saturation": 1.0,
-    "blur": 0
-}
+# The effect parameters in use, compiled; writers replace the whole Preset under
+# params_lock, readers just take the reference
+active_preset = DEFAULT_PRESET
 params_lock = threading.Lock()
+preset_store = PresetStore()
 last_captured_mosaic_path = None
 display_captured = False
 display_lock = threading.Lock()
+# EditSessions by image path, least recently used first: the captured image on the
+# matrix and the ones open in the browser each keep their own cached renders
+EDIT_SESSION_LIMIT = 4
+edit_sessions = OrderedDict()
+edited_path = None  # the image the browser edited last
+session_lock = threading.Lock()
 
 # Scanner mode configuration
 USE_SCANNER_MODE = False  # Set to True to use scanner instead of webcam
@@ -61,11 +116,27 @@ scanner_image = None
 scanner_filename = None  # Store the current scanner image filename
 scanner_lock = threading.Lock()
 
+# Mosaic grid sizes (cells per side) and what each chained panel shows
+MOSAIC_GRID = int(os.getenv("MOSAIC_GRID", "32"))  # browser mosaic
+CAPTURE_GRID = int(os.getenv("CAPTURE_GRID", str(MOSAIC_GRID)))  # saved -mosaic.jpg
+PANEL_LAYOUT = parse_panel_layout(os.getenv("PANEL_LAYOUT", "32,32,32,32"))  # e.g. "32,64,16,8" or "64:0:0,64:32:0,..."
+MOSAIC_LEVELS = set(PYRAMID_LEVELS) | {MOSAIC_GRID} | layout_levels(PANEL_LAYOUT)
+# Trails/motion/denoise on the live panel frame (TEMPORAL_MODE, or POST /temporal)
+temporal_filter = TemporalFilter((PANEL_SIZE, PANEL_SIZE * len(PANEL_LAYOUT), 3))
+PWM_BITS = int(os.getenv("PWM_BITS", "11"))  # the library's default; fewer bits refresh faster
+panel_quantizer = PanelQuantizer(PWM_BITS)  # DITHER=bayer hides the banding of low PWM_BITS
+
+def panel_effects(frame, out):
+    """Temporal effect, then quantization to PWM_BITS, on the composed panel frame"""
+    panel_quantizer.apply(temporal_filter.apply(frame, out), out)
+
 def gen_frames():
     global latest_frame
+    encode_timer = JPEG_ENCODE.labels("camera")
     while True:
         if latest_frame is not None:
-            ret, buffer = cv2.imencode('.jpg', latest_frame)
+            with encode_timer.time():
+                ret, buffer = cv2.imencode('.jpg', latest_frame)
             if not ret:
                 continue
             frameWeb = buffer.tobytes()
@@ -93,16 +164,18 @@ def matrix_loop():
     options.chain_length = 4
     options.hardware_mapping = 'adafruit-hat'
     # options.pixel_mapper_config = "U-mapper"
-    # options.pwm_bits = 6
+    options.pwm_bits = PWM_BITS
     # options.pwm_lsb_nanoseconds = 800
     # options.brightness = 50
     matrix = RGBMatrix(options=options)
+    framebuffer = PanelFramebuffer(PANEL_LAYOUT, MOSAIC_LEVELS)
     
     # Only check camera in webcam mode
     if not USE_SCANNER_MODE and not cap.isOpened():
-        print("Cannot open camera")
+        log.error("Cannot open camera")
         return
 
+    showing_live = False
     while True:
         # In scanner mode, we don't read from webcam
         if USE_SCANNER_MODE:
@@ -124,23 +197,17 @@ def matrix_loop():
             latest_frame = frame.copy()
         time.sleep(0.01)
 
-        h, w = latest_frame.shape[:2]
-        min_dim = min(h, w)
-        if min_dim <= 0:
-            continue
-
-        start_x = max((w - min_dim) // 2, 0)
-        start_y = max((h - min_dim) // 2, 0)
-
-        cropped = latest_frame[start_y:start_y+min_dim, start_x:start_x+min_dim]
-        if cropped.shape[0] <= 0 or cropped.shape[1] <= 0:
+        if min(frame.shape[:2]) <= 0:
             continue
+        frame_start = time.perf_counter()
 
         # --- Mosaic generation ---
-        small = cv2.resize(cropped, (32, 32), interpolation=cv2.INTER_LINEAR)
-        mosaic = cv2.resize(small, (min_dim, min_dim), interpolation=cv2.INTER_NEAREST)
+        # One pyramid per frame, built in place; the panels and the browser mosaic pick their levels from it
+        cropped = square_crop(frame)
+        framebuffer.update_pyramid(cropped)
+        mosaic = upscale(framebuffer.grids[MOSAIC_GRID], cropped.shape[0])
         with frame_lock:
-            mosaic_frame = mosaic.copy()
+            mosaic_frame = mosaic  # freshly allocated, safe to share without a copy
         # --- End mosaic generation ---
 
         # Decide what to display on the matrix
@@ -149,69 +216,103 @@ def matrix_loop():
             captured_path = last_captured_mosaic_path
 
         if use_captured and captured_path and os.path.exists(captured_path):
-            img = cv2.imread(captured_path)
-            if img is not None:
-                # Apply effects using current effect_params
-                with params_lock:
-                    brightness = effect_params.get("brightness", 1.0)
-                    contrast = effect_params.get("contrast", 1.0)
-                    saturation = effect_params.get("saturation", 1.0)
-                    hue_shift = int(effect_params.get("hue_shift", 0))
-                    colorize = int(effect_params.get("colorize", 0))
-                    invert = int(effect_params.get("invert", 0))
-                img = img.astype('float32') / 255.0
-                img = img * contrast + (brightness - 1.0)
-                img = np.clip(img, 0, 1)
-                
-                # Apply invert if enabled
-                if invert:
-                    img = 1.0 - img
-                
-                img_hsv = cv2.cvtColor((img * 255).astype('uint8'), cv2.COLOR_BGR2HSV).astype('float32')
-                img_hsv[..., 1] *= saturation
-                img_hsv[..., 1] = np.clip(img_hsv[..., 1], 0, 255)
-                if colorize:
-                    img_hsv[..., 0] = hue_shift
-                else:
-                    if hue_shift != 0:
-                        img_hsv[..., 0] = (img_hsv[..., 0] + hue_shift) % 180
-                img = cv2.cvtColor(img_hsv.astype('uint8'), cv2.COLOR_HSV2BGR).astype('float32') / 255.0
-                img = (img * 255).astype('uint8')
-                img_resized = cv2.resize(img, (32, 32))
-
-                # for four panels: quadruplicate horizontally
-                img_128x32 = np.concatenate([img_resized, img_resized, img_resized, img_resized], axis=1)  # shape (32, 128, 3)
-
-                frame_rgb = cv2.cvtColor(img_128x32, cv2.COLOR_BGR2RGB)
-                image = Image.fromarray(frame_rgb)
-                matrix.SetImage(image)
+            # The edit session renders the panel frame once per parameter change
+            outputs = get_edit_session(captured_path).outputs()
+            if outputs is not None:
                 try:
-                    matrix.SetImage(image)
+                    matrix.SetImage(panel_quantizer.image(outputs.panel_image))
                 except Exception as e:
-                    print(f"SetImage error: {e}")
+                    log.warning("SetImage error: %s", e)
             else:
-                print("Failed to load captured mosaic image.")
+                log.warning("Failed to load captured mosaic image.")
+            showing_live = False
         else:
-            # Display live mosaic as before
+            if not showing_live:
+                temporal_filter.reset()  # trails shouldn't start from before the captured image
+                showing_live = True
+            # Display live mosaic; the framebuffer and its PIL image are reused every frame
             try:
-                resized = cv2.resize(cropped, (32, 32))
-                img_128x32 = np.concatenate([resized, resized, resized, resized], axis=1)
-                frame_rgb = cv2.cvtColor(img_128x32, cv2.COLOR_BGR2RGB)
-                image = Image.fromarray(frame_rgb)
-                matrix.SetImage(image)
+                matrix.SetImage(framebuffer.render(panel_effects))
             except Exception as e:
-                print(f"Matrix live display error: {e}")
+                log.warning("Matrix live display error: %s", e)
                 continue
+        FRAME_SECONDS.observe(time.perf_counter() - frame_start)
+
+def get_edit_session(path):
+    """The edit session for path, opening one if needed; the least recently used
+    session is closed beyond EDIT_SESSION_LIMIT, but never the matrix's"""
+    with session_lock:
+        session = edit_sessions.get(path)
+        if session is None:
+            session = edit_sessions[path] = EditSession(path, active_preset.params, PANEL_LAYOUT)
+        edit_sessions.move_to_end(path)
+        if len(edit_sessions) > EDIT_SESSION_LIMIT:
+            on_matrix = last_captured_mosaic_path
+            for old in edit_sessions:
+                if old != path and old != on_matrix:
+                    del edit_sessions[old]
+                    break
+        return session
+
+def open_edit_sessions():
+    """The open edit sessions, for pushing parameter changes to all of them"""
+    with session_lock:
+        return list(edit_sessions.values())
+
+def publish_scanner_preview(img_180, small_path, context):
+    """Called from the ingest worker as soon as the 180x180 preview exists"""
+    global scanner_image, latest_frame, mosaic_frame, scanner_filename
+    global last_captured_mosaic_path, display_captured
+
+    # Build the mosaic before taking any locks
+    cropped = square_crop(img_180)
+    mosaic = upscale(block_grid(cropped, MOSAIC_GRID), cropped.shape[0])
+
+    # Update scanner_image and also latest_frame for compatibility
+    with scanner_lock:
+        scanner_image = img_180
+        scanner_filename = context["filename"]  # Store the scanner filename
+    with frame_lock:
+        latest_frame = img_180
+        mosaic_frame = mosaic
+
+    # Set the captured mosaic path and flag for editor compatibility
+    with display_lock:
+        last_captured_mosaic_path = small_path  # Use the 180x180 as the main for manipulation
+        display_captured = True
+
+capture_index = CaptureIndex(UPLOAD_ROOT)
+
+def index_scanner_upload(original_path, small_path, context):
+    """Called from the ingest worker once the archival crop is written"""
+    capture_index.add("scan", context["folder"], {"original": original_path, "small": small_path},
+                      thumb_img=cv2.imread(small_path))
+
+ingest_queue = IngestQueue(on_preview=publish_scanner_preview, on_done=index_scanner_upload)
+
+def discard_spooled_files():
+    """Remove spool files of a request whose uploads will not be processed"""
+    for f in request.files.values():
+        f.close()
+        try:
+            os.remove(f.stream.name)
+        except (AttributeError, OSError):
+            pass
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify(success=False, error=f"Upload larger than {MAX_UPLOAD_MB} MB"), 413
 
 @app.route("/upload_scanner_image", methods=["POST"])
 def upload_scanner_image():
-    global scanner_image, latest_frame, mosaic_frame, scanner_filename
     # Accept both 'image' and 'file' for compatibility
     file = request.files.get('image') or request.files.get('file')
     user_filename = request.form.get('filename', '').strip()
     if not file or file.filename == '':
+        discard_spooled_files()
         return jsonify(success=False, error="No image file selected")
     if not user_filename:
+        discard_spooled_files()
         return jsonify(success=False, error="No filename provided")
 
     # Sanitize filename
@@ -222,66 +323,29 @@ def upload_scanner_image():
     os.makedirs(save_dir, exist_ok=True)
 
     try:
-        # Read image data
-        image_data = file.read()
-        nparr = np.frombuffer(image_data, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if img is None:
-            return jsonify(success=False, error="Invalid image format")
-
-        # Auto-crop A4 scanned image to specific region
-        h, w = img.shape[:2]
-        pixels_per_cm = w / 21.0
-        left_offset_px = int(4.3 * pixels_per_cm)
-        top_offset_px = int(1.4 * pixels_per_cm)
-        crop_size_px = int(11.8 * pixels_per_cm)
-        right_edge = min(left_offset_px + crop_size_px, w)
-        bottom_edge = min(top_offset_px + crop_size_px, h)
-        if (right_edge > left_offset_px and bottom_edge > top_offset_px and left_offset_px >= 0 and top_offset_px >= 0):
-            cropped_img = img[top_offset_px:bottom_edge, left_offset_px:right_edge]
-            if cropped_img.shape[0] > 0 and cropped_img.shape[1] > 0:
-                img = cropped_img
-                
-        # Save original (cropped) image
+        # The upload is already on disk; decoding, cropping and saving happen on the ingest worker
+        file.stream.flush()
+        spool_path = file.stream.name
+        for other in request.files.values():
+            if other is not file:
+                other.close()
+                os.remove(other.stream.name)
         original_path = os.path.join(save_dir, f"{safe_filename}.jpg")
-        cv2.imwrite(original_path, img)
-
-        # Save 180x180px version for manipulation
-        min_dim = min(img.shape[:2])
-        start_x = max((img.shape[1] - min_dim) // 2, 0)
-        start_y = max((img.shape[0] - min_dim) // 2, 0)
-        square_img = img[start_y:start_y+min_dim, start_x:start_x+min_dim]
-        img_180 = cv2.resize(square_img, (180, 180), interpolation=cv2.INTER_AREA)
         small_path = os.path.join(save_dir, f"{safe_filename}_180x180.jpg")
-        cv2.imwrite(small_path, img_180)
-
-        # Update scanner_image and also latest_frame for compatibility
-        with scanner_lock:
-            scanner_image = img_180.copy()
-            scanner_filename = safe_filename  # Store the scanner filename
-        with frame_lock:
-            latest_frame = img_180.copy()
-            # Generate mosaic from 180x180 image
-            min_dim = min(img_180.shape[:2])
-            start_x = max((img_180.shape[1] - min_dim) // 2, 0)
-            start_y = max((img_180.shape[0] - min_dim) // 2, 0)
-            cropped = img_180[start_y:start_y+min_dim, start_x:start_x+min_dim]
-            if cropped.shape[0] > 0 and cropped.shape[1] > 0:
-                small = cv2.resize(cropped, (32, 32), interpolation=cv2.INTER_LINEAR)
-                mosaic = cv2.resize(small, (min_dim, min_dim), interpolation=cv2.INTER_NEAREST)
-                mosaic_frame = mosaic.copy()
-
-        # Set the captured mosaic path and flag for editor compatibility
-        mosaic_path = small_path  # Use the 180x180 as the main for manipulation
-        global last_captured_mosaic_path, display_captured
-        with display_lock:
-            last_captured_mosaic_path = mosaic_path
-            display_captured = True
-
-        return jsonify(success=True, message="Scanner image uploaded and processed successfully", folder=folder, filename=safe_filename)
+        job_id = ingest_queue.submit(spool_path, original_path, small_path,
+                                     {"folder": folder, "filename": safe_filename})
+        return jsonify(success=True, message="Scanner image queued for processing", job_id=job_id, folder=folder, filename=safe_filename)
     except Exception as e:
+        discard_spooled_files()
         return jsonify(success=False, error=str(e))
 
+@app.route("/ingest_status/<job_id>")
+def ingest_status(job_id):
+    job = ingest_queue.status(job_id)
+    if job is None:
+        return jsonify(success=False, error="Unknown job"), 404
+    return jsonify(success=True, **job)
+
 @app.route("/set_scanner_mode", methods=["POST"])
 def set_scanner_mode():
     global USE_SCANNER_MODE
@@ -300,11 +364,13 @@ def get_scanner_mode():
 def video_feed_mosaic():
     def gen_mosaic_frames():
         global mosaic_frame
+        encode_timer = JPEG_ENCODE.labels("mosaic")
         while True:
             with frame_lock:
                 frame = mosaic_frame.copy() if mosaic_frame is not None else None
             if frame is not None:
-                ret, buffer = cv2.imencode('.jpg', frame)
+                with encode_timer.time():
+                    ret, buffer = cv2.imencode('.jpg', frame)
                 if not ret:
                     continue
                 frameWeb = buffer.tobytes()
@@ -317,38 +383,15 @@ def video_feed_mosaic():
 @app.route("/video_feed_effect")
 def video_feed_effect():
     def gen_effect_frames():
-        global mosaic_frame, effect_params
+        global mosaic_frame
+        encode_timer = JPEG_ENCODE.labels("effect")
         while True:
             with frame_lock:
                 frame = mosaic_frame.copy() if mosaic_frame is not None else None
             if frame is not None:
-                with params_lock:
-                    brightness = effect_params["brightness"]
-                    contrast = effect_params["contrast"]
-                    saturation = effect_params["saturation"]
-                    blur = effect_params["blur"]
-
-                # Convert to float32 for processing
-                img = frame.astype('float32') / 255.0
-
-                # Apply brightness and contrast
-                img = img * contrast + (brightness - 1.0)
-                img = np.clip(img, 0, 1)
-
-                # Convert to HSV for saturation
-                img_hsv = cv2.cvtColor((img * 255).astype('uint8'), cv2.COLOR_BGR2HSV).astype('float32')
-                img_hsv[..., 1] *= saturation
-                img_hsv[..., 1] = np.clip(img_hsv[..., 1], 0, 255)
-                img = cv2.cvtColor(img_hsv.astype('uint8'), cv2.COLOR_HSV2BGR).astype('float32') / 255.0
-
-                # Convert back to uint8
-                img = (img * 255).astype('uint8')
-
-                # Apply blur
-                if blur > 0:
-                    img = cv2.GaussianBlur(img, (blur*2+1, blur*2+1), 0)
-
-                ret, buffer = cv2.imencode('.jpg', img)
+                img = active_preset.stream.apply(frame)
+                with encode_timer.time():
+                    ret, buffer = cv2.imencode('.jpg', img)
                 if not ret:
                     continue
                 frameWeb = buffer.tobytes()
@@ -360,13 +403,16 @@ def video_feed_effect():
 
 @app.route("/set_effect_params", methods=["POST"])
 def set_effect_params():
-    global effect_params
+    global active_preset
     data = request.json
+    changes = {
+        "brightness": float(data.get("brightness", 1.0)),
+        "contrast": float(data.get("contrast", 1.0)),
+        "saturation": float(data.get("saturation", 1.0)),
+        "blur": int(data.get("blur", 0)),
+    }
     with params_lock:
-        effect_params["brightness"] = float(data.get("brightness", 1.0))
-        effect_params["contrast"] = float(data.get("contrast", 1.0))
-        effect_params["saturation"] = float(data.get("saturation", 1.0))
-        effect_params["blur"] = int(data.get("blur", 0))
+        active_preset = edit_preset(active_preset, changes)
     return jsonify(success=True)
 
 @app.route("/capture_image", methods=["POST"])
@@ -391,10 +437,13 @@ def capture_image():
         mosaic_img = mosaic_frame.copy() if mosaic_frame is not None else None
     if main_img is None or mosaic_img is None:
         return jsonify(success=False, error="No image available")
+    if CAPTURE_GRID != MOSAIC_GRID:
+        mosaic_img = upscale(block_grid(square_crop(main_img), CAPTURE_GRID), mosaic_img.shape[0])
     main_path = os.path.join(save_dir, f"{timestamp}-{base}.jpg")
     mosaic_path = os.path.join(save_dir, f"{timestamp}-{base}-mosaic.jpg")
     cv2.imwrite(main_path, main_img)
     cv2.imwrite(mosaic_path, mosaic_img)
+    capture_index.add("capture", folder, {"main": main_path, "mosaic": mosaic_path}, thumb_img=main_img)
     # Set the captured mosaic path and flag
     with display_lock:
         last_captured_mosaic_path = mosaic_path
@@ -405,45 +454,25 @@ def capture_image():
 def uploaded_file(folder, filename):
     return send_from_directory(os.path.join(UPLOAD_ROOT, folder), filename)
 
+preview_renderer = PreviewRenderer()
+Counter("app_preview_cache_total", "Preview response cache lookups", ("result",)).set_function(
+    lambda: {("hit",): preview_renderer.hits, ("miss",): preview_renderer.misses})
+Counter("app_preview_source_reads_total", "Preview source images decoded from disk").set_function(
+    lambda: preview_renderer.source_reads)
+
 @app.route("/processed_mosaic/<folder>/<filename>")
 def processed_mosaic(folder, filename):
-    brightness = float(request.args.get("brightness", 1.0))
-    contrast = float(request.args.get("contrast", 1.0))
-    saturation = float(request.args.get("saturation", 1.0))
-    hue_shift = int(request.args.get("hue_shift", 0))
-    colorize = int(request.args.get("colorize", 0))
-    invert = int(request.args.get("invert", 0))
+    params = parse_effect_params(request.args)
+    size = request.args.get("size", type=int)
 
     img_path = os.path.join(UPLOAD_ROOT, folder, filename)
-    if not os.path.exists(img_path):
-        return "", 404
-
-    img = cv2.imread(img_path)
-    if img is None:
+    data = preview_renderer.render(img_path, params, size)
+    if data is None:
         return "", 404
 
-    img = img.astype('float32') / 255.0
-    img = img * contrast + (brightness - 1.0)
-    img = np.clip(img, 0, 1)
-    
-    # Apply invert if enabled
-    if invert:
-        img = 1.0 - img
-    
-    img_hsv = cv2.cvtColor((img * 255).astype('uint8'), cv2.COLOR_BGR2HSV).astype('float32')
-    img_hsv[..., 1] *= saturation
-    img_hsv[..., 1] = np.clip(img_hsv[..., 1], 0, 255)
-    if colorize:
-        # Set all hue to the selected value, keep value and saturation
-        img_hsv[..., 0] = hue_shift
-    else:
-        if hue_shift != 0:
-            img_hsv[..., 0] = (img_hsv[..., 0] + hue_shift) % 180
-    img = cv2.cvtColor(img_hsv.astype('uint8'), cv2.COLOR_HSV2BGR).astype('float32') / 255.0
-    img = (img * 255).astype('uint8')
-
-    _, buffer = cv2.imencode('.jpg', img)
-    return Response(buffer.tobytes(), mimetype='image/jpeg')
+    response = Response(data, mimetype='image/jpeg')
+    response.headers["Cache-Control"] = "private, max-age=60"
+    return response
     
 @app.route("/matrix_live")
 def matrix_live():
@@ -461,15 +490,126 @@ def matrix_edit():
 
 @app.route("/set_matrix_effect_params", methods=["POST"])
 def set_matrix_effect_params():
-    global effect_params
+    global active_preset
+    changes = parse_effect_params(request.json)
+    with params_lock:
+        active_preset = edit_preset(active_preset, changes)
+        params = active_preset.params
+    for session in open_edit_sessions():
+        session.set_params(params)
+    return jsonify(success=True)
+
+def render_session_preview(path, params):
+    """Preview JPEG from the edit session's shared render"""
+    outputs = get_edit_session(path).outputs(params)
+    return outputs.preview if outputs is not None else None
+
+preview_channel = PreviewChannel(render_session_preview)
+
+@app.route("/preview_params", methods=["POST"])
+def preview_params():
+    """One POST per edit: updates the matrix and the preview stream together"""
+    global active_preset, edited_path
     data = request.json
+    folder = data.get("folder")
+    filename = data.get("filename")
+    if not folder or not filename:
+        return jsonify(success=False, error="Missing folder or filename"), 400
+    params = parse_effect_params(data.get("params", {}))
+    img_path = os.path.join(UPLOAD_ROOT, folder, filename)
+    with params_lock:
+        active_preset = edit_preset(active_preset, params)
+    get_edit_session(img_path).set_params(params)
+    with session_lock:
+        edited_path = img_path
+    version = preview_channel.update(img_path, params)
+    return jsonify(success=True, version=version)
+
+@app.route("/preview_stream")
+def preview_stream():
+    response = Response(preview_channel.stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route("/preview_status")
+def preview_status():
+    with session_lock:
+        renders = {path: session.renders for path, session in edit_sessions.items()}
+    return jsonify(**preview_channel.status(), session_renders=sum(renders.values()), sessions=renders,
+                   cache_hits=preview_renderer.hits, cache_misses=preview_renderer.misses)
+
+def preset_json(preset):
+    return {"name": preset.name, "version": preset.version, "params": preset_params(preset)}
+
+def activate_preset(preset):
+    """Make preset current and push it to the captured image being edited"""
+    global active_preset
     with params_lock:
-        effect_params["brightness"] = float(data.get("brightness", 1.0))
-        effect_params["contrast"] = float(data.get("contrast", 1.0))
-        effect_params["saturation"] = float(data.get("saturation", 1.0))
-        effect_params["hue_shift"] = int(data.get("hue_shift", 0))
-        effect_params["colorize"] = int(data.get("colorize", 0))
-        effect_params["invert"] = int(data.get("invert", 0))
+        active_preset = preset
+    for session in open_edit_sessions():
+        session.set_params(preset.params)
+    with session_lock:
+        path = edited_path
+    if path is not None:
+        preview_channel.update(path, preset.params)
+
+@app.route("/temporal", methods=["GET", "POST"])
+def temporal_settings():
+    """Live panel temporal effect: {"mode": "off|trails|motion|denoise", "alpha", "threshold", "background"}"""
+    if request.method == "POST":
+        try:
+            settings = parse_temporal_settings(request.json or {}, temporal_filter.settings)
+        except (ValueError, TypeError) as e:
+            return jsonify(success=False, error=str(e)), 400
+        temporal_filter.configure(settings)
+    return jsonify(success=True, **temporal_filter.settings._asdict())
+
+@app.route("/presets")
+def list_presets():
+    return jsonify(presets=preset_store.list(), active=preset_json(active_preset))
+
+@app.route("/presets/active")
+def get_active_preset():
+    return jsonify(preset_json(active_preset))
+
+@app.route("/presets", methods=["POST"])
+def save_preset():
+    """Save params (default: the ones in use) under a name; saving an existing name bumps its version"""
+    global active_preset
+    data = request.json or {}
+    if not isinstance(data, dict) or not isinstance(data.get("params") or {}, dict):
+        return jsonify(success=False, error="Expected {\"name\": ..., \"params\": {...}}"), 400
+    try:
+        with params_lock:
+            params = data.get("params") or preset_params(active_preset)
+            record = preset_store.save(data.get("name"), params)
+            if record["params"] == preset_params(active_preset):
+                active_preset = active_preset._replace(name=record["name"], version=record["version"])
+    except (ValueError, TypeError) as e:
+        return jsonify(success=False, error=str(e)), 400
+    return jsonify(success=True, preset=record)
+
+@app.route("/presets/<name>/select", methods=["POST"])
+def select_preset(name):
+    try:
+        preset = preset_store.compile(name)
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    if preset is None:
+        return jsonify(success=False, error="No such preset"), 404
+    activate_preset(preset)
+    log.info("Preset %s v%d selected", preset.name, preset.version)
+    return jsonify(success=True, preset=preset_json(preset))
+
+@app.route("/presets/<name>", methods=["DELETE"])
+def delete_preset(name):
+    try:
+        deleted = preset_store.delete(name)
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    if not deleted:
+        return jsonify(success=False, error="No such preset"), 404
     return jsonify(success=True)
 
 @app.route("/save_final_image", methods=["POST"])
@@ -485,58 +625,106 @@ def save_final_image():
     if not os.path.exists(img_path):
         return jsonify(success=False, error="Image not found")
 
-    # Get effect parameters
-    brightness = float(params.get("brightness", 1.0))
-    contrast = float(params.get("contrast", 1.0))
-    saturation = float(params.get("saturation", 1.0))
-    hue_shift = int(params.get("hue_shift", 0))
-    colorize = int(params.get("colorize", 0))
-    invert = int(params.get("invert", 0))
-
-    img = cv2.imread(img_path)
-    if img is None:
+    # Full-resolution output of the same render the preview and the panel use
+    outputs = get_edit_session(img_path).outputs(parse_effect_params(params))
+    if outputs is None:
         return jsonify(success=False, error="Failed to load image")
-
-    # Apply effects (same as in processed_mosaic)
-    img = img.astype('float32') / 255.0
-    img = img * contrast + (brightness - 1.0)
-    img = np.clip(img, 0, 1)
-    
-    # Apply invert if enabled
-    if invert:
-        img = 1.0 - img
-    
-    img_hsv = cv2.cvtColor((img * 255).astype('uint8'), cv2.COLOR_BGR2HSV).astype('float32')
-    img_hsv[..., 1] *= saturation
-    img_hsv[..., 1] = np.clip(img_hsv[..., 1], 0, 255)
-    if colorize:
-        img_hsv[..., 0] = hue_shift
-    else:
-        if hue_shift != 0:
-            img_hsv[..., 0] = (img_hsv[..., 0] + hue_shift) % 180
-    img = cv2.cvtColor(img_hsv.astype('uint8'), cv2.COLOR_HSV2BGR).astype('float32') / 255.0
-    img = (img * 255).astype('uint8')
+    img = outputs.full
 
     # Save as -final.jpg
     base, ext = os.path.splitext(filename)
     final_filename = f"{base}-final.jpg"
     final_path = os.path.join(UPLOAD_ROOT, folder, final_filename)
     cv2.imwrite(final_path, img)
+    capture_index.add("final", folder, {"final": final_path, "source": img_path},
+                      params=outputs.params, thumb_img=img)
 
-    # --- FTP upload ---
+    # --- FTP upload (queued; the outbox thread uploads in the background) ---
     if isSavingToFTP:
         try:
-            with ftplib.FTP_TLS(context=context) as ftp:
-                ftp.connect("77.72.2.82", 21)
-                ftp.login("tracingtogetherauto@oc-d.co.uk", "72lrqnvrw387")
-                ftp.prot_p()
-                ftp.cwd("screenshots")
-                with open(final_path, "rb") as f:
-                    ftp.storbinary(f"STOR {final_filename}", f)
+            ftp_outbox.enqueue(final_path, final_filename)
         except Exception as e:
-            return jsonify(success=False, error=f"FTP upload failed: {e}")
+            return jsonify(success=False, error=f"FTP queueing failed: {e}")
+
+    return jsonify(success=True, path=final_path, ftp_queued=isSavingToFTP)
+
+@app.route("/promote", methods=["POST"])
+def promote():
+    """Put a final image into the exhibition: tiles and rotated variants are built
+    here once, and each file is registered with the coordinator's catalog"""
+    data = request.json
+    folder = data.get("folder")
+    if not folder:
+        return jsonify(success=False, error="Missing folder")
+    filename = data.get("filename") or f"{folder}-mosaic-final.jpg"
+    img_path = os.path.join(UPLOAD_ROOT, folder, filename)
+    img = cv2.imread(img_path)
+    if img is None:
+        return jsonify(success=False, error="Image not found"), 404
+    with open(img_path, "rb") as f:
+        original_bytes = f.read()
+
+    registered = []
+    try:
+        for rel_path, full, scheduled in promotion_artifacts(img, data.get("name") or filename,
+                                                             linking=bool(data.get("linking"))):
+            if full is img:
+                image_bytes = original_bytes  # no re-encode for the unrotated image
+            else:
+                ok, buffer = cv2.imencode('.jpg', full, [cv2.IMWRITE_JPEG_QUALITY, 95])
+                image_bytes = buffer.tobytes()
+            tile_bytes = encode_tile(make_tile(full))
+            response = requests.post(f"{COORDINATOR_URL}/catalog/add",
+                                     data={'path': rel_path,
+                                           'scheduled': '1' if scheduled else '0',
+                                           'overwrite': '1' if data.get("overwrite") else '0',
+                                           'tile_sha256': sha256_hex(tile_bytes)},
+                                     files={'image': (os.path.basename(rel_path), image_bytes, 'image/jpeg'),
+                                            'tile': ('tile.png', tile_bytes, 'image/png')},
+                                     headers={CATALOG_TOKEN_HEADER: CATALOG_TOKEN},
+                                     timeout=10)
+            if response.status_code in (403, 409):  # wrong token, or the file exists without "overwrite"
+                return jsonify(success=False, error=response.json().get('error'),
+                               registered=registered), response.status_code
+            response.raise_for_status()
+            registered.append(response.json())
+    except requests.exceptions.RequestException as e:
+        return jsonify(success=False, error=f"Coordinator registration failed: {e}", registered=registered), 502
+    return jsonify(success=True, registered=registered)
+
+MAX_CAPTURES_PER_PAGE = 200
+
+@app.route("/captures")
+def captures():
+    """Paginated capture index, newest first; thumbnails come from the index, not the originals"""
+    page = request.args.get("page", 1, type=int)
+    per_page = min(max(request.args.get("per_page", 50, type=int), 1), MAX_CAPTURES_PER_PAGE)
+    total, records = capture_index.page(page, per_page, kind=request.args.get("kind"),
+                                        folder=request.args.get("folder"))
+    items = []
+    for record in records:
+        item = dict(record)
+        item.pop('thumb')
+        item['thumb_url'] = url_for('capture_thumbnail', record_id=record['id']) if record['thumb'] else None
+        item['files'] = {role: {**entry, 'url': url_for('uploaded_file', folder=record['folder'],
+                                                         filename=os.path.basename(entry['path']))}
+                         for role, entry in record['files'].items()}
+        items.append(item)
+    return jsonify(page=page, per_page=per_page, total=total, captures=items)
+
+@app.route("/captures/<int:record_id>/thumb")
+def capture_thumbnail(record_id):
+    data = capture_index.thumbnail(record_id)
+    if data is None:
+        return "", 404
+    response = Response(data, mimetype='image/jpeg')
+    # Records are append-only, so a thumbnail never changes
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
 
-    return jsonify(success=True, path=final_path)
+@app.route("/ftp_status")
+def ftp_status():
+    return jsonify(enabled=isSavingToFTP, **ftp_outbox.status())
 
 @app.route("/")
 def hello():
@@ -547,9 +735,10 @@ def video_feed():
     return Response(gen_frames(), mimetype="multipart/x-mixed-replace; boundary=frame")
 
 def run_flask():
-    app.run(debug=True, use_reloader=False, port=5000)
+    run_server(app, host=os.getenv("APP_HOST", "127.0.0.1"), port=5000, debug=True)
 
 if __name__ == "__main__":
+    setup_logging()
     flask_thread = threading.Thread(target=run_flask, daemon=True)
     flask_thread.start()
 
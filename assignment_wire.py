@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Compact binary encoding of the coordinator's screen assignments.
+/images/all sends every screen's full relative path (plus the next cycle's
+list) as JSON on every poll. With this protocol the paths are exchanged once
+as an append-only id table, and assignments travel as uint16 ids tagged with
+a sequence number, either as a full frame or as a delta of changed screens
+since a sequence the client already has.
+
+Table (GET /assign/table?start=N):
+  header  '<2sBxIII'  magic b'AT', protocol, epoch, first id, total ids
+  body    the paths for ids start.. as UTF-8, one per line
+
+Frame (GET /assign?since=SEQ&epoch=E, and UDP multicast datagrams):
+  header  '<2sBBIIIId'  magic b'AW', protocol, kind, epoch, table length,
+                        seq, base seq (deltas), cycle start
+  FULL    display count (B), screens per display (B each), ids (H each)
+  DELTA   change count (H), then (global screen index, id) pairs (H each)
+
+The table only grows, so an id never changes meaning within an epoch; a
+frame whose table length is larger than the client's table tells it to fetch
+the new ids. A restarted coordinator has a new epoch, and clients drop their
+table and sequence when they see one.
+"""
+
+import logging
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+import requests
+
+log = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+FRAME_MAGIC = b"AW"
+TABLE_MAGIC = b"AT"
+FULL, DELTA = 0, 1
+HEADER = struct.Struct("<2sBBIIIId")
+TABLE_HEADER = struct.Struct("<2sBxIII")
+MAX_IDS = 0xFFFF
+HISTORY = 64  # snapshots kept for deltas; older clients get a full frame
+
+def parse_group(spec):
+    """'239.255.42.1:5005' -> ('239.255.42.1', 5005), or None if unset"""
+    if not spec:
+        return None
+    host, _, port = spec.rpartition(":")
+    return host, int(port)
+
+def _pack_ids(ids):
+    return struct.pack(f"<{len(ids)}H", *ids)
+
+def _unpack_ids(data, offset, count):
+    return list(struct.unpack_from(f"<{count}H", data, offset))
+
+class AssignmentPublisher:
+    """Coordinator side: id table, sequence numbers and frames for the current assignments"""
+
+    def __init__(self, history=HISTORY, epoch=None):
+        self.lock = threading.Lock()
+        self.epoch = int(time.time()) & 0xFFFFFFFF if epoch is None else epoch
+        self.paths = []
+        self.ids = {}
+        self.seq = 0
+        self.counts = ()
+        self.flat = ()
+        self.cycle_start = 0.0
+        self.snapshots = OrderedDict()  # {seq: (counts, flat ids)}
+        self.history = history
+
+    def _id_for(self, path):
+        path_id = self.ids.get(path)
+        if path_id is None:
+            if len(self.paths) >= MAX_IDS:
+                raise ValueError("Assignment id table is full")
+            path_id = self.ids[path] = len(self.paths)
+            self.paths.append(path)
+        return path_id
+
+    def publish(self, assignments, cycle_start):
+        """Record {display_id: [path, ...]}; returns True if this is a new sequence"""
+        displays = sorted(assignments)
+        with self.lock:
+            counts = tuple(len(assignments[d]) for d in displays)
+            flat = tuple(self._id_for(p) for d in displays for p in assignments[d])
+            self.cycle_start = cycle_start
+            if self.seq and counts == self.counts and flat == self.flat:
+                return False
+            self.seq += 1
+            self.counts, self.flat = counts, flat
+            self.snapshots[self.seq] = (counts, flat)
+            while len(self.snapshots) > self.history:
+                self.snapshots.popitem(last=False)
+            return True
+
+    def frame(self, since=None, epoch=None):
+        """Bytes of a delta from seq since when possible, else a full frame; None if since is current.
+        since is only trusted when epoch (the client's) matches, or isn't given."""
+        with self.lock:
+            if epoch is not None and epoch != self.epoch:
+                since = None
+            if since == self.seq and self.seq:
+                return None
+            base = self.snapshots.get(since)
+            if base is not None and base[0] == self.counts:
+                changes = [(i, path_id) for i, (old, path_id) in enumerate(zip(base[1], self.flat))
+                           if old != path_id]
+                header = HEADER.pack(FRAME_MAGIC, PROTOCOL_VERSION, DELTA, self.epoch, len(self.paths),
+                                     self.seq, since, self.cycle_start)
+                return header + struct.pack("<H", len(changes)) + _pack_ids([v for c in changes for v in c])
+            header = HEADER.pack(FRAME_MAGIC, PROTOCOL_VERSION, FULL, self.epoch, len(self.paths),
+                                 self.seq, 0, self.cycle_start)
+            return (header + struct.pack(f"<B{len(self.counts)}B", len(self.counts), *self.counts)
+                    + _pack_ids(self.flat))
+
+    def table(self, start=0):
+        """Bytes of the id table from id start"""
+        with self.lock:
+            paths = self.paths[start:]
+            total = len(self.paths)
+        return TABLE_HEADER.pack(TABLE_MAGIC, PROTOCOL_VERSION, self.epoch, start, total) + "\n".join(paths).encode()
+
+class AssignmentClient:
+    """Display side: applies frames to a local copy of the table and assignments"""
+
+    def __init__(self, base_url, timeout=2):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.fetch_lock = threading.Lock()  # one HTTP exchange at a time, so table fetches don't race
+        self.epoch = None
+        self.paths = []
+        self.seq = 0
+        self.counts = ()
+        self.flat = []
+        self.cycle_start = 0.0
+        self.last_frame = 0.0  # time.time() of the last applied frame
+        self.headers = None  # callable returning extra request headers (telemetry), or None
+        self.stats = {'frames': 0, 'bytes': 0, 'resyncs': 0}
+
+    def apply_table(self, data):
+        """Append ids from a table response"""
+        magic, version, epoch, start, total = TABLE_HEADER.unpack_from(data)
+        if magic != TABLE_MAGIC or version != PROTOCOL_VERSION:
+            raise ValueError("Not an assignment table")
+        body = data[TABLE_HEADER.size:]
+        new = body.decode().split("\n") if body else []
+        with self.lock:
+            if epoch != self.epoch:
+                # New coordinator process: ids and sequence numbers start over
+                self.epoch, self.paths, self.seq, self.counts, self.flat = epoch, [], 0, (), []
+            if start != len(self.paths):
+                raise ValueError(f"Table starts at {start}, have {len(self.paths)} ids")
+            self.paths.extend(new)
+        return total
+
+    def needs_table(self, data):
+        """True if a frame references ids this client hasn't fetched (or comes from a new epoch)"""
+        _, _, _, epoch, table_len = HEADER.unpack_from(data)[:5]
+        return epoch != self.epoch or table_len > len(self.paths)
+
+    def apply(self, data):
+        """Apply a frame; returns False if it can't be (a delta on the wrong base, or missing ids)"""
+        magic, version, kind, epoch, table_len, seq, base_seq, cycle_start = HEADER.unpack_from(data)
+        if magic != FRAME_MAGIC or version != PROTOCOL_VERSION:
+            raise ValueError("Not an assignment frame")
+        offset = HEADER.size
+        with self.lock:
+            if epoch != self.epoch or table_len > len(self.paths):
+                return False
+            # Datagrams can be short or foreign: check every length and id before using it
+            if kind == FULL:
+                if len(data) < offset + 1 or len(data) < offset + 1 + data[offset]:
+                    raise ValueError("Truncated full frame")
+                n = data[offset]
+                counts = tuple(data[offset + 1:offset + 1 + n])
+                flat = _unpack_ids(data, offset + 1 + n, sum(counts))
+                if any(path_id >= table_len for path_id in flat):
+                    raise ValueError("Frame references ids past its table")
+                self.flat = flat
+                self.counts = counts
+            elif kind == DELTA:
+                if base_seq != self.seq:
+                    return False
+                n = struct.unpack_from("<H", data, offset)[0]
+                pairs = _unpack_ids(data, offset + 2, 2 * n)
+                screens, path_ids = pairs[::2], pairs[1::2]
+                if any(screen >= len(self.flat) for screen in screens) or any(p >= table_len for p in path_ids):
+                    raise ValueError("Delta references screens or ids that don't exist")
+                for screen, path_id in zip(screens, path_ids):
+                    self.flat[screen] = path_id
+            else:
+                raise ValueError(f"Unknown frame kind {kind}")
+            self.seq = seq
+            self.cycle_start = cycle_start
+            self.last_frame = time.time()
+            self.stats['frames'] += 1
+            self.stats['bytes'] += len(data)
+        return True
+
+    def poll(self):
+        """Fetch changes over HTTP; returns True if the assignments changed.
+        Raises RequestException if the coordinator is unreachable."""
+        with self.fetch_lock:
+            params = {'since': self.seq, 'epoch': self.epoch} if self.epoch is not None else {}
+            headers = self.headers() if self.headers else None
+            response = requests.get(f"{self.base_url}/assign", params=params, headers=headers,
+                                    timeout=self.timeout)
+            if response.status_code == 304:
+                self.last_frame = time.time()
+                return False
+            response.raise_for_status()
+            return self._apply_fetched(response.content)
+
+    def _apply_fetched(self, data):
+        """Apply a frame, fetching new table ids first if it needs them (call with fetch_lock held)"""
+        if self.needs_table(data):
+            epoch = HEADER.unpack_from(data)[3]
+            start = len(self.paths) if epoch == self.epoch else 0
+            response = requests.get(f"{self.base_url}/assign/table", params={'start': start},
+                                    timeout=self.timeout)
+            response.raise_for_status()
+            self.apply_table(response.content)
+        return self.apply(data)
+
+    def assignments(self):
+        """{display_id: [path, ...]} for the current sequence"""
+        with self.lock:
+            result = {}
+            i = 0
+            for display_id, count in enumerate(self.counts):
+                result[display_id] = [self.paths[p] for p in self.flat[i:i + count]]
+                i += count
+            return result
+
+    def display_images(self, display_id):
+        """Paths assigned to one display, or None before the first frame"""
+        return self.assignments().get(display_id)
+
+    def listen(self, group):
+        """Receive multicast frames forever (run in a thread); falls back to an HTTP poll when one can't be applied"""
+        host, port = group
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("", port))
+        membership = struct.pack("4s4s", socket.inet_aton(host), socket.inet_aton("0.0.0.0"))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        while True:
+            data, _ = sock.recvfrom(65535)
+            try:
+                with self.fetch_lock:
+                    applied = self._apply_fetched(data)
+                if not applied:
+                    # Missed a datagram (delta on another base): catch up over HTTP
+                    self.stats['resyncs'] += 1
+                    self.poll()
+            except (ValueError, struct.error) as e:
+                log.warning("Bad assignment datagram: %s", e)
+            except requests.exceptions.RequestException as e:
+                log.warning("Assignment resync failed: %s", e)
+
+def multicast_sender(ttl=1):
+    """UDP socket for sending frames to a LAN multicast group"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+    return sock
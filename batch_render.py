@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Offline batch re-rendering of whole folders, e.g. re-editing
+exhibition/pre-edit/ or regenerating exhibition/rotate/.
+Each image goes through the editor's effect chain (effects.py, the same maths
+as processed_mosaic and save_final_image), an optional rotation, and
+optionally the promotion variants and 32x32 panel tiles (tiles.py), on a
+process pool with one worker per core.
+
+Outputs are skipped when nothing that goes into them changed: a manifest in
+the output folder records, for each output, a SHA-256 over the source bytes,
+the parameters, the rotation and the JPEG quality. Re-running over a night's
+captures only renders the new or re-edited ones.
+
+Examples:
+  python3 batch_render.py exhibition/pre-edit --out /tmp/edited --params '{"contrast": 1.2}'
+  python3 batch_render.py exhibition/pre-edit --out /tmp/rotated --rotate 90 --tiles
+  python3 batch_render.py exhibition/pre-edit --out /tmp/night --preset night
+  python3 batch_render.py uploads/*/*-mosaic-final.jpg --out /tmp/exhibition --variants --tiles
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+from effects import DEFAULT_PARAMS, apply_effects, parse_effect_params
+from presets import PresetStore
+from tiles import ROTATIONS, encode_tile, make_tile, promotion_artifacts, sha256_hex, tile_path
+
+MANIFEST_NAME = ".batch_render.json"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+RENDER_VERSION = 1  # bump when the output for the same inputs changes
+
+def list_sources(inputs):
+    """Image files from file and folder arguments, as (absolute path, output name)"""
+    sources = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths = sorted(p for p in glob.glob(os.path.join(item, "*"))
+                           if p.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths = [item]
+        for path in paths:
+            base, _ = os.path.splitext(os.path.basename(path))
+            sources.append((os.path.abspath(path), base + ".jpg"))
+    return sources
+
+def load_params(spec):
+    """Effect parameters from a JSON string or a JSON file"""
+    if not spec:
+        return dict(DEFAULT_PARAMS)
+    if os.path.exists(spec):
+        with open(spec) as f:
+            spec = f.read()
+    return parse_effect_params(json.loads(spec))
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def job_key(source_bytes, job):
+    """Content hash of everything that determines a job's outputs"""
+    settings = json.dumps([RENDER_VERSION, job['params'], job['rotate'], job['quality'],
+                           job['variants'], job['linking'], job['tiles']], sort_keys=True)
+    return sha256_hex(sha256_hex(source_bytes).encode() + settings.encode())
+
+def render_job(job):
+    """Render one source (runs in a pool worker); returns a result dict"""
+    start = time.perf_counter()
+    result = {'name': job['name'], 'status': 'failed', 'outputs': [], 'pixels': 0}
+    try:
+        with open(job['source'], "rb") as f:
+            source_bytes = f.read()
+        key = job_key(source_bytes, job)
+        result['key'] = key
+        if (not job['force'] and job['previous'] and job['previous']['key'] == key
+                and all(os.path.exists(os.path.join(job['out'], p)) for p in job['previous']['outputs'])):
+            result.update(status='skipped', outputs=job['previous']['outputs'])
+            return result
+        img = cv2.imdecode(np.frombuffer(source_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            result['error'] = "not a readable image"
+            return result
+        result['pixels'] = img.shape[0] * img.shape[1]
+        img = apply_effects(img, job['params'])
+        if job['rotate']:
+            img = cv2.rotate(img, ROTATIONS[job['rotate']])
+        if job['variants']:
+            artifacts = [(rel_path, full) for rel_path, full, _ in
+                         promotion_artifacts(img, job['name'], linking=job['linking'])]
+        else:
+            artifacts = [(job['name'], img)]
+        for rel_path, full in artifacts:
+            ok, buffer = cv2.imencode('.jpg', full, [cv2.IMWRITE_JPEG_QUALITY, job['quality']])
+            if not ok:
+                raise ValueError(f"failed to encode {rel_path}")
+            write_atomic(os.path.join(job['out'], rel_path), buffer.tobytes())
+            result['outputs'].append(rel_path)
+            if job['tiles']:
+                tile_file = tile_path(job['out'], rel_path)
+                write_atomic(tile_file, encode_tile(make_tile(full)))
+                result['outputs'].append(os.path.relpath(tile_file, job['out']))
+        result['status'] = 'rendered'
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        result['seconds'] = time.perf_counter() - start
+    return result
+
+def init_worker():
+    # One process per core already; OpenCV's own threads would only contend
+    cv2.setNumThreads(1)
+
+def load_manifest(out):
+    try:
+        with open(os.path.join(out, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def run(args):
+    if args.preset:
+        record = PresetStore().get(args.preset)
+        if record is None:
+            print(f"No preset named {args.preset}")
+            return 1
+        params = parse_effect_params(record['params'])
+    else:
+        params = load_params(args.params)
+    for name in ("brightness", "contrast", "saturation", "hue_shift", "colorize", "invert"):
+        value = getattr(args, name)
+        if value is not None:
+            params[name] = value
+    params = parse_effect_params(params)
+    sources = list_sources(args.inputs)
+    if not sources:
+        print("No images found")
+        return 1
+    names = [name for _, name in sources]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        print(f"Several inputs would be written as {', '.join(duplicates)}; render them separately")
+        return 1
+    manifest = load_manifest(args.out)
+    jobs = [{
+        'source': source, 'name': name, 'out': args.out, 'params': params,
+        'rotate': args.rotate, 'quality': args.quality, 'variants': args.variants,
+        'linking': args.linking or os.path.basename(os.path.dirname(source)) == "linkings",
+        'tiles': args.tiles, 'force': args.force, 'previous': manifest.get(name),
+    } for source, name in sources]
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"Rendering {len(jobs)} images with {workers} workers, params {params}")
+    start = time.perf_counter()
+    counts = {'rendered': 0, 'skipped': 0, 'failed': 0}
+    pixels = 0
+    busy = 0.0
+    with Pool(workers, initializer=init_worker) as pool:
+        for result in pool.imap_unordered(render_job, jobs):
+            counts[result['status']] += 1
+            busy += result['seconds']
+            if result['status'] == 'failed':
+                print(f"  {result['name']}: {result.get('error')}")
+                continue
+            pixels += result['pixels']
+            manifest[result['name']] = {'key': result['key'], 'outputs': result['outputs']}
+            if args.verbose:
+                print(f"  {result['status']:<9}{result['name']} ({result['seconds'] * 1000:.0f} ms)")
+    elapsed = time.perf_counter() - start
+    os.makedirs(args.out, exist_ok=True)
+    write_atomic(os.path.join(args.out, MANIFEST_NAME), json.dumps(manifest, indent=1).encode())
+
+    print(f"{counts['rendered']} rendered, {counts['skipped']} unchanged, {counts['failed']} failed "
+          f"in {elapsed:.2f} s")
+    if counts['rendered']:
+        print(f"{counts['rendered'] / elapsed:.1f} images/s, {pixels / elapsed / 1e6:.1f} MP/s, "
+              f"{busy / elapsed / workers:.0%} worker utilisation")
+    return 1 if counts['failed'] else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply effects, rotations and tiles to folders of images")
+    parser.add_argument("inputs", nargs="+", help="image files or folders")
+    parser.add_argument("--out", required=True, help="output folder")
+    parser.add_argument("--params", help="effect parameters as JSON, or a JSON file")
+    parser.add_argument("--preset", help="a preset saved from the app (presets/), instead of --params")
+    parser.add_argument("--brightness", type=float)
+    parser.add_argument("--contrast", type=float)
+    parser.add_argument("--saturation", type=float)
+    parser.add_argument("--hue-shift", dest="hue_shift", type=int)
+    parser.add_argument("--colorize", type=int, choices=(0, 1))
+    parser.add_argument("--invert", type=int, choices=(0, 1))
+    parser.add_argument("--rotate", type=int, choices=sorted(ROTATIONS), help="degrees counter-clockwise")
+    parser.add_argument("--variants", action="store_true",
+                        help="also write the promotion variants (rotate/, linkings rotations)")
+    parser.add_argument("--linking", action="store_true",
+                        help="treat every input as a linking image (default: inputs from a linkings/ folder)")
+    parser.add_argument("--tiles", action="store_true", help="write 32x32 tiles under .tiles/")
+    parser.add_argument("--quality", type=int, default=95)
+    parser.add_argument("--workers", type=int, help="default: one per core")
+    parser.add_argument("--force", action="store_true", help="render even if the outputs are up to date")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    raise SystemExit(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
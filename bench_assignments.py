@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Bytes-on-the-wire and parse-time benchmark for assignment polling.
+Compares the JSON the coordinator serves at /images/all (and the per-display
+/images/<id>) with the binary frames from assignment_wire.py: a full frame,
+a one-screen delta, and the id table that is sent once per client.
+
+Payloads are built the way image_coordinator.py builds them, for a
+configurable number of displays with the usual 4 screens each. Sizes are
+response bodies only; HTTP headers (~150-250 bytes each way) come on top of
+every poll either way, and a 304 for an unchanged poll carries no body.
+
+Example:
+  python3 bench_assignments.py --displays 3 50 --images 400
+"""
+
+import argparse
+import json
+import random
+import time
+
+from assignment_wire import AssignmentPublisher, AssignmentClient
+
+SCREENS = 4
+CYCLE_TIME = 120
+
+def make_paths(count, rng):
+    names = [f"{rng.randrange(10**9):09d}-mosaic-final.jpg" for _ in range(count)]
+    return names + [f"linkings/link_{i:03d}_rot{a}.jpg" for i in range(count // 20) for a in (180, 270)]
+
+def make_assignments(paths, displays, rng):
+    return {d: rng.sample(paths, SCREENS) for d in range(displays)}
+
+def all_images_json(assignments, paths, rng):
+    """Body of GET /images/all"""
+    now = time.time()
+    return json.dumps({
+        'assignments': assignments,
+        'cycle_start': now - 30,
+        'time_in_cycle': 30.0,
+        'next_cycle_in': CYCLE_TIME - 30.0,
+        'total_images': len(paths),
+        'total_screens': SCREENS * len(assignments),
+        'current_screen_to_update': 3,
+        'next_images': rng.sample(paths, SCREENS * len(assignments)),
+    }).encode()
+
+def display_json(assignments, display_id):
+    """Body of GET /images/<id>"""
+    return json.dumps({
+        'display_id': display_id,
+        'images': assignments[display_id],
+        'cycle_start': time.time() - 30,
+        'time_in_cycle': 30.0,
+        'next_cycle_in': CYCLE_TIME - 30.0,
+    }).encode()
+
+def binary_poll(publisher, client):
+    """One binary poll, fetching new table ids when the frame needs them; returns bytes received"""
+    frame = publisher.frame(client.seq)
+    if frame is None:
+        return 0
+    received = len(frame)
+    if client.needs_table(frame):
+        table = publisher.table(len(client.paths))
+        client.apply_table(table)
+        received += len(table)
+    client.apply(frame)
+    return received
+
+def per_call_us(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def run(displays, image_count, repeat):
+    rng = random.Random(displays)
+    paths = make_paths(image_count, rng)
+    assignments = make_assignments(paths, displays, rng)
+
+    publisher = AssignmentPublisher()
+    publisher.publish(assignments, time.time())
+    table = publisher.table()
+    full = publisher.frame()
+    base_seq = publisher.seq
+    changed = {d: list(v) for d, v in assignments.items()}
+    changed[0][1] = rng.choice(paths)
+    publisher.publish(changed, time.time())
+    delta = publisher.frame(base_seq)
+
+    client = AssignmentClient("http://unused")
+    client.apply_table(table)
+    client.apply(full)
+
+    def apply_full():
+        client.apply(full)
+    def apply_delta():
+        client.seq = base_seq
+        client.apply(delta)
+
+    all_json = all_images_json(assignments, paths, rng)
+    one_json = display_json(assignments, 0)
+    rows = [
+        ("/images/all JSON", len(all_json), per_call_us(lambda: json.loads(all_json), repeat)),
+        ("/images/<id> JSON", len(one_json), per_call_us(lambda: json.loads(one_json), repeat)),
+        ("binary full", len(full), per_call_us(apply_full, repeat)),
+        ("binary delta", len(delta), per_call_us(apply_delta, repeat)),
+        ("id table (once)", len(table), per_call_us(lambda: AssignmentClient("x").apply_table(table), repeat // 10 or 1)),
+    ]
+    print(f"\n{displays} displays x {SCREENS} screens, {len(paths)} paths")
+    print(f"{'message':<20}{'bytes':>8}{'parse us':>10}")
+    for name, size, us in rows:
+        print(f"{name:<20}{size:>8}{us:>10.1f}")
+
+    # One cycle as polled every 5 s, with one screen changing every 2 s
+    # (INCREMENTAL_UPDATE_TIME): JSON resends everything, binary sends a
+    # delta of the screens changed since the client's sequence, plus table
+    # entries for paths it hasn't seen yet
+    json_bytes = binary_bytes = 0
+    current = {d: list(v) for d, v in assignments.items()}
+    total_screens = SCREENS * displays
+    for t in range(CYCLE_TIME):
+        if t % 2 == 0:
+            screen = (t // 2) % total_screens
+            current[screen // SCREENS][screen % SCREENS] = rng.choice(paths)
+            publisher.publish(current, time.time())
+        if t % 5 == 0:
+            json_bytes += len(all_images_json(current, paths, rng))
+            binary_bytes += binary_poll(publisher, client)
+    binary_poll(publisher, client)  # catch up on the last changes before comparing
+    print(f"one {CYCLE_TIME} s cycle polled every 5 s: JSON {json_bytes} bytes, binary {binary_bytes} bytes "
+          f"({json_bytes / max(binary_bytes, 1):.0f}x less), client matches: {client.assignments() == current}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON and binary assignment payloads")
+    parser.add_argument("--displays", type=int, nargs="+", default=[3, 50])
+    parser.add_argument("--images", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+    for displays in args.displays:
+        run(displays, args.images, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Reader latency and lock hold benchmark for the coordinator's assignment state.
+Runs image_coordinator.py's real writers (update_single_image, and
+start_new_cycle every CYCLE_EVERY updates) in a thread, much faster than the
+real 2 s cadence so they contend with readers, while N client threads call
+/images/<id> and /images/all through Flask's test client, each pausing
+--poll-interval between requests like a polling display. Without the pause
+every thread is CPU-bound and the numbers measure the GIL, not the lock.
+
+Two reader modes are compared against the same writer:
+  locked    the handlers as they were, holding coordinator_lock while the
+            response is built from the working state
+  snapshot  the real handlers, reading the immutable snapshot without a lock
+
+Lock waits and hold times (means per acquisition) come from the
+coordinator_lock_*_seconds histograms; the snapshot readers never take the
+lock, so only the writer shows up in them.
+
+Example:
+  python3 bench_coordinator_lock.py --clients 1 8 32 --seconds 3
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from flask import jsonify
+
+import image_coordinator as coordinator
+
+CYCLE_EVERY = 10
+
+def legacy_images(display_id):
+    """/images/<id> as it was before snapshots"""
+    with coordinator.coordinator_lock:
+        return jsonify({
+            'display_id': display_id,
+            'images': coordinator.current_assignments[display_id],
+            'cycle_start': coordinator.cycle_start_time,
+            'time_in_cycle': time.time() - coordinator.cycle_start_time,
+            'next_cycle_in': max(0, coordinator.CYCLE_TIME - (time.time() - coordinator.cycle_start_time))
+        })
+
+def legacy_all_images():
+    """/images/all as it was before snapshots"""
+    with coordinator.coordinator_lock:
+        return jsonify({
+            'assignments': coordinator.current_assignments,
+            'cycle_start': coordinator.cycle_start_time,
+            'time_in_cycle': time.time() - coordinator.cycle_start_time,
+            'next_cycle_in': max(0, coordinator.CYCLE_TIME - (time.time() - coordinator.cycle_start_time)),
+            'total_images': len(coordinator.image_files),
+            'total_screens': sum(coordinator.SCREENS_PER_DISPLAY),
+            'current_screen_to_update': coordinator.current_screen_to_update,
+            'next_images': coordinator.next_cycle_images
+        })
+
+coordinator.app.add_url_rule('/bench/locked/images/<int:display_id>', 'legacy_images', legacy_images)
+coordinator.app.add_url_rule('/bench/locked/images/all', 'legacy_all_images', legacy_all_images)
+
+def writer(stop, interval, counts):
+    updates = 0
+    while not stop.is_set():
+        if updates % CYCLE_EVERY == CYCLE_EVERY - 1:
+            coordinator.start_new_cycle()
+        else:
+            coordinator.update_single_image()
+        updates += 1
+        time.sleep(interval)
+    counts['writes'] = updates
+
+def reader(client, urls, stop, interval, latencies):
+    i = 0
+    while not stop.is_set():
+        url = urls[i % len(urls)]
+        i += 1
+        start = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+        time.sleep(interval)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+def lock_times():
+    """(acquisitions, total wait, total hold) of coordinator_lock so far"""
+    wait = coordinator.LOCK_WAIT.labels("coordinator")
+    hold = coordinator.LOCK_HOLD.labels("coordinator")
+    with wait.lock, hold.lock:
+        return hold.count, wait.sum, hold.sum
+
+def run(mode, clients, seconds, write_interval, poll_interval):
+    prefix = "/bench/locked" if mode == "locked" else ""
+    urls = [f"{prefix}/images/{d}" for d in range(coordinator.NUM_DISPLAYS)] + [f"{prefix}/images/all"]
+    coordinator.assign_images()
+    before = lock_times()
+    stop = threading.Event()
+    counts = {}
+    per_thread = [[] for _ in range(clients)]
+    threads = [threading.Thread(target=writer, args=(stop, write_interval, counts))]
+    threads += [threading.Thread(target=reader, args=(coordinator.app.test_client(), urls, stop,
+                                                      poll_interval, latencies))
+                for latencies in per_thread]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies = [v for thread_latencies in per_thread for v in thread_latencies]
+    acquisitions, waited, held = (after - b for after, b in zip(lock_times(), before))
+    print(f"{mode:<10}{clients:>8}{len(latencies) / elapsed:>10.0f}"
+          f"{percentile(latencies, 0.5) * 1e6:>10.0f}{percentile(latencies, 0.99) * 1e6:>10.0f}"
+          f"{max(latencies) * 1e6:>10.0f}{counts['writes']:>8}{acquisitions:>10}"
+          f"{waited / max(acquisitions, 1) * 1e6:>10.1f}{held / max(acquisitions, 1) * 1e6:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare locked and snapshot reads of the coordinator's assignments")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--write-interval", type=float, default=0.001,
+                        help="seconds between writer updates (the coordinator uses 2)")
+    parser.add_argument("--poll-interval", type=float, default=0.02,
+                        help="seconds each client waits between requests")
+    parser.add_argument("--images", type=int, default=400)
+    args = parser.parse_args()
+
+    coordinator.image_files = [os.path.join(coordinator.EXHIBITION_FOLDER, f"{i:09d}-mosaic-final.jpg")
+                               for i in range(args.images)]
+    print(f"{'mode':<10}{'clients':>8}{'req/s':>10}{'p50 us':>10}{'p99 us':>10}{'max us':>10}"
+          f"{'writes':>8}{'locks':>10}{'wait us':>10}{'hold us':>10}")
+    for clients in args.clients:
+        for mode in ("locked", "snapshot"):
+            run(mode, clients, args.seconds, args.write_interval, args.poll_interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Refresh rate versus perceived quality of the panel output at each pwm_bits,
+without dithering and with dither.py's bayer and fs methods.
+
+Quality is the error against what the panel shows at its full 11 bits, as the
+eye sees it: the light of both frames (the library's CIE1931 mapping,
+truncated to pwm_bits) is blurred over about one LED pitch (--sigma, the
+viewing distance) and compared in CIE L*, reported as mean and 99th
+percentile delta L* over the frames. A delta L* around 1 is at the edge of
+visibility. Frames are smooth ramps (where banding shows first) and the
+exhibition images laid out like jpg_cycle_app.py's 128x32 strip.
+
+Refresh rate is modelled from the library's timing: each of the 16 scan rows
+shows pwm_bits bit planes, plane b lasting pwm_lsb_nanoseconds << b but never
+less than the time to clock out a row (--clock-us, which depends on the chain
+length and gpio_slowdown). Measure real rates on a Pi with the library's
+--led-show-refresh and pass them with --measured to replace the model.
+
+Examples:
+  python3 bench_dither.py
+  python3 bench_dither.py --lsb-ns 300 --clock-us 10 --bits 5 6 7 8 11
+  python3 bench_dither.py --measured 6:900,7:640,8:380,11:95
+"""
+
+import argparse
+import glob
+import os
+import time
+import cv2
+import numpy as np
+
+from dither import METHODS, LIGHT_BITS, PanelQuantizer, panel_light
+
+SCAN_ROWS = 16  # 32-row panels are driven as 16 row pairs
+
+def refresh_hz(pwm_bits, lsb_ns, clock_us):
+    row_ns = sum(max(clock_us * 1000, lsb_ns << b) for b in range(pwm_bits))
+    return 1e9 / (SCAN_ROWS * row_ns)
+
+def parse_measured(spec):
+    """{pwm_bits: Hz} from "6:900,7:640" """
+    measured = {}
+    for item in (spec or "").split(","):
+        if item.strip():
+            bits, hz = item.split(":")
+            measured[int(bits)] = float(hz)
+    return measured
+
+def test_frames(limit):
+    """Ramps and exhibition strips, 128x32 RGB"""
+    x = np.linspace(0, 1, 128)
+    frames = []
+    for top in (255, 96, 40):  # full, dim and very dark ramps
+        ramp = np.round(x * top).astype(np.uint8)
+        frames.append(np.repeat(np.stack([ramp, ramp, ramp], axis=1)[None], 32, axis=0))
+    hue = np.repeat(np.round(x * 179).astype(np.uint8)[None], 32, axis=0)
+    value = np.repeat(np.round(np.linspace(40, 255, 32)).astype(np.uint8)[:, None], 128, axis=1)
+    hsv = np.stack([hue, np.full_like(hue, 200), value], axis=2)
+    frames.append(cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB))
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exhibition")
+    paths = sorted(glob.glob(os.path.join(folder, "*.jpg")))
+    for i in range(0, min(len(paths), limit * 4), 4):
+        tiles = [cv2.imread(p) for p in paths[i:i + 4]]
+        tiles = [cv2.resize(t, (32, 32), interpolation=cv2.INTER_AREA) for t in tiles if t is not None]
+        if len(tiles) == 4:
+            frames.append(cv2.cvtColor(np.concatenate(tiles, axis=1), cv2.COLOR_BGR2RGB))
+    return frames
+
+def perceived(light, sigma):
+    """CIE L* of the light (11-bit units) after blurring over the viewing distance"""
+    y = cv2.GaussianBlur(light.astype(np.float32) / ((1 << LIGHT_BITS) - 1), (0, 0), sigma)
+    return np.where(y > 0.008856, 116 * np.cbrt(y) - 16, 903.3 * y)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare panel refresh rate and perceived quality per pwm_bits")
+    parser.add_argument("--bits", type=int, nargs="+", default=[5, 6, 7, 8, 9, 11])
+    parser.add_argument("--brightness", type=int, default=80, help="options.brightness of the panels")
+    parser.add_argument("--lsb-ns", type=int, default=300, help="options.pwm_lsb_nanoseconds")
+    parser.add_argument("--clock-us", type=float, default=10.0, help="time to clock out one row of the chain")
+    parser.add_argument("--measured", help="measured refresh rates, e.g. 6:900,7:640 (Hz)")
+    parser.add_argument("--sigma", type=float, default=1.0, help="viewing blur in LED pitches")
+    parser.add_argument("--images", type=int, default=8, help="exhibition strips to include")
+    parser.add_argument("--repeat", type=int, default=20, help="timing passes per frame")
+    args = parser.parse_args()
+
+    frames = test_frames(args.images)
+    measured = parse_measured(args.measured)
+    reference = [perceived(panel_light(LIGHT_BITS, args.brightness)[f], args.sigma) for f in frames]
+    print(f"{len(frames)} frames 128x32, brightness {args.brightness}, "
+          f"{'measured' if measured else f'modelled (lsb {args.lsb_ns} ns, clock {args.clock_us:g} us)'} refresh")
+    print(f"{'bits':>4}{'refresh Hz':>12}{'method':>8}{'mean dL*':>10}{'p99 dL*':>10}{'us/frame':>10}")
+    results = {}
+    for bits in args.bits:
+        hz = measured.get(bits, refresh_hz(bits, args.lsb_ns, args.clock_us))
+        shown_light = panel_light(bits, args.brightness)
+        for method in METHODS:
+            quantizer = PanelQuantizer(bits, method, args.brightness)
+            errors = []
+            for frame, ref in zip(frames, reference):
+                out = quantizer.apply(frame)
+                errors.append(np.abs(perceived(shown_light[out], args.sigma) - ref).ravel())
+            errors = np.concatenate(errors)
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for frame in frames:
+                    quantizer.last = None  # time the work, not the redraw cache
+                    quantizer.apply(frame)
+            us = (time.perf_counter() - start) / (args.repeat * len(frames)) * 1e6
+            results[bits, method] = errors.mean()
+            print(f"{bits:>4}{hz:>12.0f}{method:>8}{errors.mean():>10.2f}"
+                  f"{np.percentile(errors, 99):>10.2f}{us:>10.0f}")
+
+    undithered = {bits: results[bits, "off"] for bits in args.bits}
+    for method in ("bayer", "fs"):
+        for bits in sorted(args.bits):
+            # the deepest undithered output this is at least as close as
+            matched = [b for b in args.bits if b > bits and results[bits, method] <= undithered[b]]
+            if matched:
+                print(f"{method} at {bits} bits is at least as close as no dithering at {max(matched)} bits")
+                break
+
+if __name__ == "__main__":
+    main()
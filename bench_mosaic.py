@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Quality and speed benchmark for mosaic generation.
+Compares the previous matrix_loop path (INTER_LINEAR to 32x32, INTER_NEAREST
+back up, plus a separate default cv2.resize for the panels) with mosaic.py
+(one INTER_AREA grid shared by panels and preview, upscaled by lookup).
+
+Quality is measured against an exact area average (the crop upsampled 8x by
+pixel replication, then averaged over whole blocks), on a moving zone plate
+so aliasing also shows up as frame-to-frame flicker.
+
+Example:
+  python3 bench_mosaic.py --frames 500 --size 180
+"""
+
+import argparse
+import time
+import cv2
+import numpy as np
+
+from mosaic import block_grid, build_mosaic, square_crop, GRID_SIZE
+
+def zone_plate(width, height, shift=0.0):
+    """Chirp pattern with detail up to the Nyquist limit, shifted horizontally"""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float64)
+    x = x + shift
+    r2 = (x - width / 2) ** 2 + (y - height / 2) ** 2
+    k = np.pi / max(width, height)
+    base = 0.5 + 0.5 * np.cos(k * r2)
+    img = np.dstack([base, np.roll(base, 7, axis=1), np.roll(base, 13, axis=0)])
+    return (img * 255).astype(np.uint8)
+
+def reference_grid(cropped, cells=GRID_SIZE):
+    """Exact area-average grid, independent of OpenCV's interpolation code"""
+    size = cropped.shape[0]
+    factor = 1
+    while (size * factor) % cells:
+        factor += 1
+    up = np.repeat(np.repeat(cropped.astype(np.float64), factor, axis=0), factor, axis=1)
+    block = size * factor // cells
+    return up.reshape(cells, block, cells, block, -1).mean(axis=(1, 3))
+
+def old_path(frame):
+    """matrix_loop before mosaic.py: two resizes for the preview, one for the panels"""
+    cropped = square_crop(frame)
+    min_dim = cropped.shape[0]
+    small = cv2.resize(cropped, (32, 32), interpolation=cv2.INTER_LINEAR)
+    mosaic = cv2.resize(small, (min_dim, min_dim), interpolation=cv2.INTER_NEAREST)
+    mosaic = mosaic.copy()
+    panel = cv2.resize(cropped, (32, 32))
+    return panel, mosaic
+
+def new_path(frame):
+    grid, mosaic = build_mosaic(frame)
+    return grid, mosaic
+
+def psnr(a, ref):
+    mse = np.mean((a.astype(np.float64) - ref) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+def time_path(fn, frames, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for frame in frames:
+            fn(frame)
+    return (time.perf_counter() - start) / (repeats * len(frames)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare mosaic generation quality and speed")
+    parser.add_argument("--frames", type=int, default=60, help="moving zone plate frames")
+    parser.add_argument("--size", type=int, default=180, help="frame height (width is 16:9)")
+    parser.add_argument("--repeats", type=int, default=20, help="timing passes over the frames")
+    args = parser.parse_args()
+
+    height = args.size
+    width = height * 16 // 9
+    frames = [zone_plate(width, height, shift=i * 0.5) for i in range(args.frames)]
+    refs = [reference_grid(square_crop(f)) for f in frames]
+
+    results = {}
+    for name, fn in (("old", old_path), ("new", new_path)):
+        grids = [fn(f)[0] for f in frames]
+        quality = np.mean([psnr(g, r) for g, r in zip(grids, refs)])
+        # Flicker: how much the grid changes between frames, beyond what the reference does
+        flicker = np.mean([np.abs(np.diff([g.astype(np.float64), h], axis=0)).mean() -
+                           np.abs(r2 - r1).mean()
+                           for g, h, r1, r2 in zip(grids, grids[1:], refs, refs[1:])])
+        usec = time_path(fn, frames, args.repeats)
+        results[name] = (quality, flicker, usec)
+
+    # The lookup upscale must match INTER_NEAREST exactly
+    grid = block_grid(square_crop(frames[0]))
+    _, mosaic = build_mosaic(frames[0])
+    nearest = cv2.resize(grid, (height, height), interpolation=cv2.INTER_NEAREST)
+    print(f"{width}x{height} frames, {GRID_SIZE}x{GRID_SIZE} grid; "
+          f"upscale matches INTER_NEAREST: {np.array_equal(mosaic, nearest)}")
+    print(f"{'path':<6}{'PSNR dB':>10}{'flicker':>10}{'us/frame':>10}")
+    for name, (quality, flicker, usec) in results.items():
+        print(f"{name:<6}{quality:>10.2f}{flicker:>10.2f}{usec:>10.1f}")
+
+if __name__ == "__main__":
+    main()
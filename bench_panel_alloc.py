@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Per-frame allocation benchmark for the live panel path in app.py's matrix_loop.
+Compares allocating a new pyramid, panel strip, RGB copy and PIL image every
+frame with mosaic.PanelFramebuffer, which writes into preallocated buffers.
+
+Allocations are measured with tracemalloc, which sees numpy and OpenCV output
+arrays (both use Python's allocator) but not PIL's internal image memory; the
+old path's PIL image (another 16 KB) comes on top of its figure.
+
+Example:
+  python3 bench_panel_alloc.py --frames 1000 --layout 32,64,16,8
+"""
+
+import argparse
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from PIL import Image
+
+from mosaic import (square_crop, build_pyramid, compose_panels, parse_panel_layout, layout_levels,
+                    PanelFramebuffer, PYRAMID_LEVELS)
+
+def old_path(cropped, layout, levels):
+    pyramid = build_pyramid(cropped, levels)
+    frame_rgb = cv2.cvtColor(compose_panels(pyramid, layout), cv2.COLOR_BGR2RGB)
+    return Image.fromarray(frame_rgb)
+
+def measure(fn, frames):
+    """(bytes allocated per frame at peak, microseconds per frame), after a warm-up pass"""
+    for frame in frames[:10]:
+        fn(frame)
+    tracemalloc.start()
+    peak_total = 0
+    for frame in frames:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn(frame)
+        peak_total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for frame in frames:
+        fn(frame)
+    elapsed = time.perf_counter() - start
+    return peak_total / len(frames), elapsed / len(frames) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure live panel allocations per frame")
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--layout", default="32,32,32,32", help="PANEL_LAYOUT to render")
+    args = parser.parse_args()
+
+    layout = parse_panel_layout(args.layout)
+    levels = set(PYRAMID_LEVELS) | layout_levels(layout)
+    rng = np.random.default_rng(0)
+    frames = [square_crop(rng.integers(0, 256, (180, 320, 3), dtype=np.uint8)) for _ in range(16)]
+    frames = [frames[i % len(frames)] for i in range(args.frames)]
+
+    framebuffer = PanelFramebuffer(layout, levels)
+    def new_path(cropped):
+        framebuffer.update_pyramid(cropped)
+        return framebuffer.render()
+
+    same = np.array_equal(np.asarray(old_path(frames[0], layout, levels)), np.asarray(new_path(frames[0])))
+    old_bytes, old_us = measure(lambda f: old_path(f, layout, levels), frames)
+    new_bytes, new_us = measure(new_path, frames)
+
+    print(f"layout {args.layout}, {args.frames} frames; identical output: {same}")
+    print(f"{'path':<14}{'bytes/frame':>12}{'us/frame':>10}")
+    print(f"{'allocating':<14}{old_bytes:>12.0f}{old_us:>10.1f}")
+    print(f"{'framebuffer':<14}{new_bytes:>12.0f}{new_us:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Replay benchmark for the live panel temporal effects (temporal.py).
+Replays recorded camera frames through the live path of app.py's
+matrix_loop (square crop, pyramid, panel composition, temporal effect, PIL
+image; everything but SetImage) and times each mode, against a
+straightforward numpy version of the same effect that allocates new arrays
+every frame. Frames are decoded up front, so only the per-frame work is timed.
+
+Frames come from a video file or a folder of images; --record captures one
+from the camera first (same GStreamer pipeline as app.py). Without either, a
+pan across an exhibition image with sensor-like noise stands in for the camera.
+
+Examples:
+  python3 bench_temporal.py --record /tmp/camera.avi --seconds 10
+  python3 bench_temporal.py --video /tmp/camera.avi --camera-fps 30
+  python3 bench_temporal.py --layout 32,64,16,8 --frames 600
+"""
+
+import argparse
+import glob
+import os
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+from mosaic import square_crop, parse_panel_layout, layout_levels, PanelFramebuffer, PYRAMID_LEVELS, PANEL_SIZE
+from temporal import MODES, TemporalFilter, parse_temporal_settings
+
+CAMERA_PIPELINE = (
+    "v4l2src device=/dev/video0 ! "
+    "video/x-raw,width=320,height=180 ! "
+    "videoconvert ! appsink"
+)
+
+class NaiveFilter:
+    """The same effects with fresh arrays every frame, for comparison"""
+
+    def __init__(self, settings, depth):
+        self.settings = settings
+        self.history = deque(maxlen=depth)
+        self.average = None
+
+    def apply(self, frame, out):
+        s = self.settings
+        previous = self.history[-1] if self.history else None
+        self.history.append(frame.copy())
+        if s.mode == "trails":
+            self.average = frame.astype(np.float32) if self.average is None else \
+                self.average * (1 - s.alpha) + frame * s.alpha
+            result = np.clip(np.rint(self.average), 0, 255).astype(np.uint8)
+        else:
+            if s.mode == "motion":
+                result = np.clip(np.rint(frame * s.background), 0, 255).astype(np.uint8)
+            else:
+                stack = np.stack(self.history).astype(np.uint16)
+                result = ((stack.sum(axis=0) + len(stack) // 2) // len(stack)).astype(np.uint8)
+            if previous is not None:
+                diff = np.abs(frame.astype(np.int16) - previous).astype(np.uint8)
+                moved = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY) > s.threshold
+                result[moved] = frame[moved]
+        out[...] = result
+
+def record(path, seconds, fps):
+    cap = cv2.VideoCapture(CAMERA_PIPELINE, cv2.CAP_GSTREAMER)
+    if not cap.isOpened():
+        raise SystemExit("Cannot open camera")
+    writer = None
+    frames = 0
+    end = time.time() + seconds
+    while time.time() < end:
+        ret, frame = cap.read()
+        if not ret or frame is None:
+            continue
+        if writer is None:
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps,
+                                     (frame.shape[1], frame.shape[0]))
+        writer.write(frame)
+        frames += 1
+    cap.release()
+    if writer is not None:
+        writer.release()
+    print(f"Recorded {frames} frames to {path}")
+
+def load_frames(args):
+    if args.video:
+        cap = cv2.VideoCapture(args.video)
+        frames = []
+        while len(frames) < args.frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        return frames
+    if args.frames_dir:
+        paths = sorted(glob.glob(os.path.join(args.frames_dir, "*")))[:args.frames]
+        return [img for img in (cv2.imread(p) for p in paths) if img is not None]
+    # A slow pan with noise, 320x180 like the camera pipeline
+    sources = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "exhibition", "*.jpg")))
+    source = cv2.imread(sources[0]) if sources else None
+    if source is None:
+        source = np.random.default_rng(1).integers(0, 256, (720, 720, 3), dtype=np.uint8)
+    source = cv2.resize(source, (720, 720))
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(args.frames):
+        x = int(200 + 200 * np.sin(i / 40))
+        y = int(250 + 150 * np.cos(i / 55))
+        frame = cv2.resize(source[y:y+360, x:x+640], (320, 180), interpolation=cv2.INTER_AREA)
+        noise = rng.integers(-12, 13, frame.shape, dtype=np.int16)
+        frames.append(np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    return frames
+
+def replay(frames, framebuffer, effect):
+    """(per-frame seconds, per-effect seconds) for the whole replay"""
+    frame_times = []
+    effect_times = []
+
+    def timed(frame, out):
+        start = time.perf_counter()
+        effect(frame, out)
+        effect_times.append(time.perf_counter() - start)
+
+    for frame in frames:
+        start = time.perf_counter()
+        framebuffer.update_pyramid(square_crop(frame))
+        framebuffer.render(timed if effect is not None else None)
+        frame_times.append(time.perf_counter() - start)
+    return frame_times, effect_times
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay camera frames through the temporal panel effects")
+    parser.add_argument("--video", help="recorded camera video to replay")
+    parser.add_argument("--frames-dir", help="folder of frames to replay instead")
+    parser.add_argument("--frames", type=int, default=300, help="at most this many frames")
+    parser.add_argument("--record", help="record the camera to this video file and exit")
+    parser.add_argument("--seconds", type=float, default=10.0, help="recording length")
+    parser.add_argument("--camera-fps", type=float, default=30.0, help="frame rate to keep up with")
+    parser.add_argument("--layout", default="32,32,32,32", help="PANEL_LAYOUT to render")
+    parser.add_argument("--depth", type=int, default=4, help="TEMPORAL_DEPTH")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.seconds, args.camera_fps)
+        return
+    frames = load_frames(args)
+    if not frames:
+        raise SystemExit("No frames to replay")
+    cv2.setNumThreads(1)  # the matrix loop shares the Pi with the web server and the panel refresh
+    layout = parse_panel_layout(args.layout)
+    framebuffer = PanelFramebuffer(layout, set(PYRAMID_LEVELS) | layout_levels(layout))
+    shape = (PANEL_SIZE, PANEL_SIZE * len(layout), 3)
+
+    budget_us = 1e6 / args.camera_fps
+    print(f"{len(frames)} frames {frames[0].shape[1]}x{frames[0].shape[0]}, layout {args.layout}, "
+          f"budget {budget_us:.0f} us/frame at {args.camera_fps:g} fps")
+    print(f"{'mode':<9}{'impl':<8}{'effect us':>10}{'p99 us':>9}{'frame us':>10}{'max fps':>9}{'budget':>8}")
+    for mode in MODES:
+        settings = parse_temporal_settings({"mode": mode})
+        impls = [("inplace", TemporalFilter(shape, settings, args.depth).apply)]
+        if mode != "off":
+            impls.append(("naive", NaiveFilter(settings, args.depth).apply))
+        for name, effect in impls:
+            replay(frames[:10], framebuffer, effect)  # warm-up
+            frame_times, effect_times = replay(frames, framebuffer, effect)
+            frame_us = sum(frame_times) / len(frame_times) * 1e6
+            effect_us = sum(effect_times) / len(effect_times) * 1e6 if effect_times else 0.0
+            print(f"{mode:<9}{name:<8}{effect_us:>10.1f}{percentile(effect_times, 0.99) * 1e6:>9.1f}"
+                  f"{frame_us:>10.1f}{1e6 / frame_us:>9.0f}{frame_us / budget_us:>8.1%}")
+
+if __name__ == "__main__":
+    main()
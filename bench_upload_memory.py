@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for scanner upload decoding.
+Generates A4 scans (JPEG and TIFF) at the given resolutions and compares the
+peak memory and time of the old upload path (file.read() + np.frombuffer +
+cv2.imdecode of the whole scan) with the spooled path in scanner_ingest.py
+(memory-mapped reduced preview decode + crop-only full-resolution decode).
+
+Each measurement runs in a fresh subprocess so the peak RSS reflects only
+that decode.
+
+Example:
+  python3 bench_upload_memory.py --dpi 300 600
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    # VmHWM is reset by exec; ru_maxrss can carry over the parent's peak on Linux
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def make_scan(path, dpi):
+    """Write a synthetic A4 scan with some texture so it compresses like a drawing"""
+    import cv2
+    import numpy as np
+    from PIL import Image
+    w, h = int(21.0 / 2.54 * dpi), int(29.7 / 2.54 * dpi)
+    y, x = np.mgrid[0:h, 0:w]
+    img = np.dstack([(x // 3) % 256, (y // 5) % 256, ((x + y) // 7) % 256]).astype(np.uint8)
+    cv2.circle(img, (w // 2, h // 3), w // 4, (30, 60, 200), thickness=max(1, dpi // 30))
+    if path.endswith(".jpg"):
+        cv2.imwrite(path, img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    else:
+        Image.fromarray(img[:, :, ::-1]).save(path, format="TIFF")
+    return w, h
+
+def run_old(path):
+    """The previous upload path: whole file in memory, whole image decoded"""
+    import cv2
+    import numpy as np
+    from scanner_ingest import a4_crop_box, crop_to_box, center_square
+    with open(path, "rb") as f:
+        image_data = f.read()
+    img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    img = crop_to_box(img, a4_crop_box(img.shape[1], img.shape[0]))
+    cv2.resize(center_square(img), (180, 180), interpolation=cv2.INTER_AREA)
+    return img.shape
+
+def run_new(path):
+    """The spooled path: mapped reduced preview, then crop-only decode"""
+    import cv2
+    from scanner_ingest import (a4_crop_box, crop_to_box, center_square, pick_reduction,
+                                image_header, map_file, decode_roi)
+    fmt, size = image_header(path)
+    box = a4_crop_box(*size)
+    if fmt == "JPEG":
+        factor, flag = pick_reduction(box[2] - box[0])
+        preview = cv2.imdecode(map_file(path), flag)
+        cv2.resize(center_square(crop_to_box(preview, box, factor)), (180, 180), interpolation=cv2.INTER_AREA)
+        preview = None
+        roi = decode_roi(path, box)
+    else:
+        roi = decode_roi(path, box)
+        cv2.resize(center_square(roi), (180, 180), interpolation=cv2.INTER_AREA)
+    return roi.shape
+
+def worker(mode, path):
+    """Subprocess entry point: print baseline MB, peak MB and seconds"""
+    import cv2  # noqa: F401 - imported up front so it is part of the baseline
+    import numpy  # noqa: F401
+    import PIL.Image  # noqa: F401
+    import scanner_ingest  # noqa: F401
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    (run_old if mode == "old" else run_new)(path)
+    elapsed = time.perf_counter() - start
+    print(f"{baseline:.1f} {peak_rss_mb():.1f} {elapsed:.3f}")
+
+def measure(mode, path):
+    out = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--worker", mode, path],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+    baseline, peak, elapsed = map(float, out.split())
+    return peak - baseline, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare scanner upload decode memory")
+    parser.add_argument("--dpi", type=int, nargs="+", default=[300, 600])
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(*args.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'scan':<22}{'file MB':>9}{'old MB':>9}{'new MB':>9}{'old s':>8}{'new s':>8}")
+        for dpi in args.dpi:
+            for ext in (".jpg", ".tif"):
+                path = os.path.join(tmp, f"a4_{dpi}dpi{ext}")
+                w, h = make_scan(path, dpi)
+                size_mb = os.path.getsize(path) / 1e6
+                old_mb, old_s = measure("old", path)
+                new_mb, new_s = measure("new", path)
+                label = f"{dpi}dpi {ext[1:]} {w}x{h}"
+                print(f"{label:<22}{size_mb:>9.1f}{old_mb:>9.1f}{new_mb:>9.1f}{old_s:>8.2f}{new_s:>8.2f}")
+                os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Append-only index of everything app.py writes under uploads/.
+Each capture, scanner upload and saved final image adds one JSON line to
+index.jsonl (paths relative to uploads/, file sizes, image dimensions, effect
+params) and appends a small JPEG thumbnail to thumbs.bin. Records point at
+their thumbnail by (offset, length), so /captures can list and show
+thumbnails without walking the folders or decoding the originals.
+
+Layout (uploads/.index/):
+  index.jsonl  one record per line, never rewritten
+  thumbs.bin   concatenated thumbnail JPEGs
+"""
+
+import json
+import os
+import threading
+import time
+import cv2
+
+THUMB_SIZE = 96
+THUMB_QUALITY = 80
+
+def make_thumbnail(img, size=THUMB_SIZE):
+    """JPEG bytes of an image scaled to fit in size x size"""
+    h, w = img.shape[:2]
+    scale = size / max(h, w)
+    if scale < 1:
+        img = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))),
+                         interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, THUMB_QUALITY])
+    return buffer.tobytes() if ok else None
+
+class CaptureIndex:
+    """JSON-lines capture index with a thumbnail blob file"""
+
+    def __init__(self, upload_root, index_dir=None):
+        self.upload_root = upload_root
+        self.index_dir = index_dir or os.path.join(upload_root, ".index")
+        self.index_path = os.path.join(self.index_dir, "index.jsonl")
+        self.thumbs_path = os.path.join(self.index_dir, "thumbs.bin")
+        self.lock = threading.Lock()
+        self.records = []
+        self.by_id = {}
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                # Torn last line after a crash: drop it so the next append starts clean
+                f.truncate(data.rfind(b"\n") + 1)
+        with open(self.index_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.records.append(record)
+                self.by_id[record['id']] = record
+
+    def add(self, kind, folder, files, params=None, thumb_img=None):
+        """Append a record. files maps a role ('main', 'mosaic', ...) to an absolute path;
+        thumb_img is the decoded image the thumbnail (and the recorded size) is taken from."""
+        entries = {}
+        for role, path in files.items():
+            entry = {'path': os.path.relpath(path, self.upload_root)}
+            try:
+                entry['bytes'] = os.path.getsize(path)
+            except OSError:
+                entry['bytes'] = None
+            entries[role] = entry
+        thumb = make_thumbnail(thumb_img) if thumb_img is not None else None
+
+        with self.lock:
+            record = {
+                'id': self.records[-1]['id'] + 1 if self.records else 1,
+                'time': time.time(),
+                'kind': kind,
+                'folder': folder,
+                'files': entries,
+                'size': [thumb_img.shape[1], thumb_img.shape[0]] if thumb_img is not None else None,
+                'params': params,
+                'thumb': None,
+            }
+            if thumb:
+                with open(self.thumbs_path, "ab") as f:
+                    offset = f.tell()
+                    f.write(thumb)
+                record['thumb'] = [offset, len(thumb)]
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            self.records.append(record)
+            self.by_id[record['id']] = record
+        return record
+
+    def page(self, page=1, per_page=50, kind=None, folder=None):
+        """(total, records) for one page, newest first"""
+        with self.lock:
+            records = [r for r in reversed(self.records)
+                       if (kind is None or r['kind'] == kind) and (folder is None or r['folder'] == folder)]
+        start = (max(page, 1) - 1) * per_page
+        return len(records), records[start:start + per_page]
+
+    def thumbnail(self, record_id):
+        """Thumbnail JPEG bytes for a record, or None"""
+        with self.lock:
+            record = self.by_id.get(record_id)
+        if record is None or not record['thumb']:
+            return None
+        offset, length = record['thumb']
+        with open(self.thumbs_path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Coordinator discovery and display liveness over UDP multicast.
+The coordinator sends a small beacon to DISCOVERY_GROUP every second (and
+straight away when the assignments change). It carries the HTTP port, the
+assignment epoch and sequence (see assignment_wire.py), the tile catalog
+version and the schedule epoch, so display clients:
+  - find the coordinator from the beacon's source address, without
+    COORDINATOR_IP;
+  - only poll when the sequence moves past what they already have.
+
+Each display answers every beacon with a unicast reply to the socket the
+beacon came from, echoing the beacon's send time. From those replies the
+coordinator knows which displays are alive, their round-trip latency, and how
+many assignment versions behind each one is.
+
+Beacon  '<2sBxHIIIdd'  magic b'CB', protocol, http port, assignment epoch,
+                       assignment seq, catalog version, schedule epoch, sent time
+Reply   '<2sBxHIId'    magic b'DR', protocol, display id, assignment epoch and
+                       seq the display has applied, echoed sent time, then
+                       optionally a telemetry record (see telemetry.py)
+"""
+
+import logging
+import socket
+import struct
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+BEACON_MAGIC = b"CB"
+REPLY_MAGIC = b"DR"
+BEACON = struct.Struct("<2sBxHIIIdd")
+REPLY = struct.Struct("<2sBxHIId")
+BEACON_INTERVAL = 1.0
+NO_DISPLAY = 0xFFFF
+
+class BeaconSender:
+    """Coordinator side: sends beacons and collects display replies"""
+
+    def __init__(self, group, http_port, state, interval=BEACON_INTERVAL, ttl=1, on_reply=None):
+        """state() returns (assignment epoch, assignment seq, catalog version, schedule epoch);
+        on_reply(display_id, tail) receives whatever a reply carries after its header"""
+        self.group = group
+        self.http_port = http_port
+        self.state = state
+        self.on_reply = on_reply
+        self.interval = interval
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self.sock.bind(("", 0))  # replies come back to this port
+        self.lock = threading.Lock()
+        self.displays = {}  # {display_id: {'address', 'last_seen', 'latency', 'epoch', 'seq'}}
+
+    def send(self):
+        epoch, seq, catalog_version, schedule_epoch = self.state()
+        beacon = BEACON.pack(BEACON_MAGIC, PROTOCOL_VERSION, self.http_port, epoch, seq,
+                             catalog_version, schedule_epoch, time.time())
+        self.sock.sendto(beacon, self.group)
+        return seq
+
+    def _receive(self, data, address):
+        try:
+            magic, version, display_id, epoch, seq, sent = REPLY.unpack_from(data)
+        except struct.error:
+            return
+        if magic != REPLY_MAGIC or version != PROTOCOL_VERSION or display_id == NO_DISPLAY:
+            return
+        now = time.time()
+        with self.lock:
+            entry = self.displays.setdefault(display_id, {'latency': None})
+            rtt = now - sent
+            # Smoothed like TCP's SRTT, so one slow reply doesn't dominate /status
+            entry['latency'] = rtt if entry['latency'] is None else 0.875 * entry['latency'] + 0.125 * rtt
+            entry.update(address=address[0], last_seen=now, epoch=epoch, seq=seq)
+        if self.on_reply and len(data) > REPLY.size:
+            self.on_reply(display_id, data[REPLY.size:])
+
+    def run(self):
+        """Send beacons forever (run in a thread), every interval and whenever the sequence changes"""
+        sent_seq = None
+        next_beacon = 0
+        self.sock.settimeout(0.25)
+        while True:
+            now = time.time()
+            try:
+                if now >= next_beacon or self.state()[1] != sent_seq:
+                    sent_seq = self.send()
+                    next_beacon = now + self.interval
+            except OSError as e:
+                log.warning("Beacon send failed: %s", e)
+                next_beacon = now + self.interval
+            try:
+                data, address = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            except OSError:
+                continue
+            self._receive(data, address)
+
+    def status(self, epoch, seq):
+        """{display_id: last seen, latency and version lag} for /status"""
+        now = time.time()
+        with self.lock:
+            return {display_id: {
+                'address': entry['address'],
+                'last_seen_ago': round(now - entry['last_seen'], 2),
+                'latency_ms': round(entry['latency'] * 1000, 2),
+                'version_lag': seq - entry['seq'] if entry['epoch'] == epoch else None,
+            } for display_id, entry in sorted(self.displays.items())}
+
+class BeaconListener:
+    """Display side: tracks the coordinator's beacons and replies to them"""
+
+    def __init__(self, group, display_id=None, applied=None, on_coordinator=None, telemetry=None):
+        """applied() returns the (epoch, seq) of the assignments the display has, or None;
+        on_coordinator(ip, port) is called when the coordinator's address is first seen or changes;
+        telemetry() returns bytes to append to each reply"""
+        self.group = group
+        self.display_id = NO_DISPLAY if display_id is None else display_id
+        self.applied = applied or (lambda: None)
+        self.on_coordinator = on_coordinator
+        self.telemetry = telemetry
+        self.coordinator = None  # (ip, http port)
+        self.epoch = None
+        self.seq = None
+        self.catalog_version = None
+        self.schedule_epoch = None
+        self.last_beacon = 0.0
+
+    def current(self, max_age):
+        """True if a beacon within max_age seconds says the display already has the latest assignments"""
+        if time.time() - self.last_beacon > max_age or self.seq is None:
+            return False
+        return self.applied() == (self.epoch, self.seq)
+
+    def _handle(self, data, address, sock):
+        try:
+            magic, version, port, epoch, seq, catalog_version, schedule_epoch, sent = BEACON.unpack(data)
+        except struct.error:
+            return
+        if magic != BEACON_MAGIC or version != PROTOCOL_VERSION:
+            return
+        coordinator = (address[0], port)
+        if coordinator != self.coordinator:
+            self.coordinator = coordinator
+            log.info("Coordinator found at %s:%d", *coordinator)
+            if self.on_coordinator:
+                self.on_coordinator(*coordinator)
+        self.epoch, self.seq = epoch, seq
+        self.catalog_version, self.schedule_epoch = catalog_version, schedule_epoch
+        self.last_beacon = time.time()
+        applied_epoch, applied_seq = self.applied() or (0, 0)
+        reply = REPLY.pack(REPLY_MAGIC, PROTOCOL_VERSION, self.display_id, applied_epoch, applied_seq, sent)
+        if self.telemetry:
+            reply += self.telemetry()
+        try:
+            sock.sendto(reply, address)
+        except OSError as e:
+            log.warning("Beacon reply failed: %s", e)
+
+    def listen(self):
+        """Receive beacons forever (run in a thread)"""
+        host, port = self.group
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("", port))
+        membership = struct.pack("4s4s", socket.inet_aton(host), socket.inet_aton("0.0.0.0"))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        while True:
+            data, address = sock.recvfrom(512)
+            self._handle(data, address, sock)
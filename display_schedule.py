@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Deterministic image schedule shared by the coordinator and the display Pis.
+Given the same exhibition folder contents, seed and clock, every machine
+computes the same assignments, so displays can keep showing a coordinated
+sequence while the coordinator is unreachable.
+
+The schedule follows image_coordinator.py: every CYCLE_TIME seconds a new set
+of images is chosen, and every INCREMENTAL_UPDATE_TIME seconds one screen
+switches to its image from the new set. Display 0 and 1 always show one
+linking image, display 2 every 4th cycle. Instead of the coordinator's
+process-local random state, the image order is a seeded shuffle per pass
+through the catalog and linking choices are seeded per cycle.
+"""
+
+import os
+import glob
+import fnmatch
+import random
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.JPG", "*.JPEG")
+
+def list_schedule_images(folder):
+    """Return (images, linkings) as sorted paths relative to the exhibition folder"""
+    images = []
+    for pattern in IMAGE_PATTERNS:
+        images.extend(glob.glob(os.path.join(folder, pattern)))
+    linkings = []
+    linkings_folder = os.path.join(folder, "linkings")
+    if os.path.exists(linkings_folder):
+        for pattern in IMAGE_PATTERNS:
+            linkings.extend(glob.glob(os.path.join(linkings_folder, pattern)))
+    to_rel = lambda path: os.path.relpath(path, folder).replace(os.sep, "/")
+    return sorted(set(map(to_rel, images))), sorted(set(map(to_rel, linkings)))
+
+def split_schedule_images(paths):
+    """(images, linkings) from exhibition-relative paths, e.g. the coordinator's tile
+    manifest, picking the same files list_schedule_images would find in its folder"""
+    images, linkings = set(), set()
+    for path in paths:
+        folder, name = path.rpartition("/")[::2]
+        if not any(fnmatch.fnmatchcase(name, pattern) for pattern in IMAGE_PATTERNS):
+            continue
+        if folder == "":
+            images.add(path)
+        elif folder == "linkings":
+            linkings.add(path)
+    return sorted(images), sorted(linkings)
+
+class DisplaySchedule:
+    """Pure function of (catalog, seed, time) -> screen assignments"""
+
+    def __init__(self, images, linkings, seed, epoch=0.0, cycle_time=120,
+                 incremental_update_time=2.0, screens_per_display=(4, 4, 2)):
+        self.images = sorted(images)
+        self.linkings = sorted(linkings)
+        self.seed = str(seed)
+        self.epoch = float(epoch)
+        self.cycle_time = cycle_time
+        self.incremental_update_time = incremental_update_time
+        self.screens_per_display = list(screens_per_display)
+        self.total_screens = sum(self.screens_per_display)
+        self._pass_cache = {}
+
+    def _pass_order(self, pass_index):
+        """Seeded shuffle of the catalog for one pass through it"""
+        order = self._pass_cache.get(pass_index)
+        if order is None:
+            order = list(self.images)
+            random.Random(f"{self.seed}:pass:{pass_index}").shuffle(order)
+            if len(self._pass_cache) > 4:
+                self._pass_cache.clear()
+            self._pass_cache[pass_index] = order
+        return order
+
+    def _image_at(self, position):
+        """Image at an absolute position in the endless sequence of passes"""
+        count = len(self.images)
+        return self._pass_order(position // count)[position % count]
+
+    def cycle_at(self, t):
+        """Cycle number and seconds into that cycle for a wall-clock time"""
+        elapsed = max(0.0, t - self.epoch)
+        cycle = int(elapsed // self.cycle_time)
+        return cycle, elapsed - cycle * self.cycle_time
+
+    def cycle_images(self, cycle):
+        """The flat list of images a cycle moves the screens towards"""
+        if not self.images:
+            return [None] * self.total_screens
+        start = (cycle * 2 + 1) * self.total_screens
+        images = [self._image_at(start + i) for i in range(self.total_screens)]
+        if not self.linkings:
+            return images
+
+        rng = random.Random(f"{self.seed}:link:{cycle}")
+        used_bases = []
+        offset = 0
+        for display_id, screens in enumerate(self.screens_per_display):
+            wants_link = screens == 4 or (display_id == 2 and cycle % 4 == 0)
+            if display_id > 2 or not wants_link:
+                offset += screens
+                continue
+            candidates = [img for img in self.linkings
+                          if not any(base in os.path.basename(img) for base in used_bases)]
+            link_img = rng.choice(candidates or self.linkings)
+            images[offset + rng.randint(0, screens - 1)] = link_img
+            used_bases.append(os.path.basename(link_img).split('.')[0])
+            offset += screens
+        return images
+
+    def flat_assignments_at(self, t):
+        """Flat list of images on every screen at time t"""
+        cycle, into_cycle = self.cycle_at(t)
+        current = self.cycle_images(cycle)
+        previous = self.cycle_images(cycle - 1) if cycle > 0 else current
+        # Screens switch one at a time, in order, every incremental update
+        switched = int(into_cycle // self.incremental_update_time) + 1
+        # Display 2 switches its whole set at the cycle boundary
+        display2 = range(sum(self.screens_per_display[:2]), sum(self.screens_per_display[:3]))
+        flat = []
+        for screen in range(self.total_screens):
+            if screen < switched or screen in display2:
+                flat.append(current[screen])
+            else:
+                flat.append(previous[screen])
+        return flat
+
+    def assignments_at(self, t):
+        """{display_id: [images]} at time t"""
+        flat = self.flat_assignments_at(t)
+        assignments = {}
+        offset = 0
+        for display_id, screens in enumerate(self.screens_per_display):
+            assignments[display_id] = flat[offset:offset + screens]
+            offset += screens
+        return assignments
+
+    def display_images_at(self, display_id, t):
+        """Images for one display at time t"""
+        return self.assignments_at(t).get(display_id, [])
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Output quantization for the LED panels at reduced pwm_bits.
+The rgbmatrix library maps each 8-bit value through CIE1931 luminance
+correction to 11 bits of light and then drops the low 11 - pwm_bits bits, so
+at 6-8 bits neighbouring input values collapse onto one light level and
+smooth gradients (dark ones above all) band. Lower pwm_bits refresh faster,
+though, with less flicker and less CPU in the refresh thread.
+
+PanelQuantizer works in that light domain. For every input value it knows
+the two light levels the panel can show around the 11-bit light the value
+should have, the 8-bit codes that produce them, and how far between them it
+falls. Frames are then written as those codes with the remainder dithered:
+  bayer  an ordered 4x4 threshold matrix; three table lookups and a compare
+         per frame, and stable from frame to frame (use it for live video)
+  fs     Floyd-Steinberg error diffusion in linear light, vectorised along
+         wavefronts (pixels with equal x + 2y don't depend on each other),
+         so a 128x32 frame is about 190 numpy steps; best for still images,
+         and a redraw of the same frame is served from the last result
+  off    the frame is passed through unchanged
+
+The tables are built once per (pwm_bits, brightness), and frame-sized
+buffers once per shape.
+"""
+
+import os
+import cv2
+import numpy as np
+from PIL import Image
+
+DITHER = os.getenv("DITHER", "off")  # off | bayer | fs
+METHODS = ("off", "bayer", "fs")
+LIGHT_BITS = 11  # the library's bit planes (kBitPlanes)
+
+BAYER_4 = np.array([[0, 8, 2, 10],
+                    [12, 4, 14, 6],
+                    [3, 11, 1, 9],
+                    [15, 7, 13, 5]])
+
+def panel_light(pwm_bits=LIGHT_BITS, brightness=100):
+    """Light (in 11-bit units) the panel shows for each 8-bit value, as the library computes it"""
+    v = np.arange(256, dtype=np.float64) * brightness / 255.0
+    y = np.where(v <= 8, v / 902.3, ((v + 16) / 116.0) ** 3)
+    light = np.floor(((1 << LIGHT_BITS) - 1) * y + 0.5).astype(np.int64)
+    shift = LIGHT_BITS - pwm_bits
+    return (light >> shift) << shift
+
+class PanelQuantizer:
+    """Rewrites 8-bit frames (greyscale, or any channel order) so the panel shows them as closely as pwm_bits allows"""
+
+    def __init__(self, pwm_bits, method=DITHER, brightness=100):
+        if method not in METHODS:
+            raise ValueError(f"Unknown dither method {method!r}, expected one of {', '.join(METHODS)}")
+        self.pwm_bits = pwm_bits
+        self.method = method
+        self.target = panel_light(LIGHT_BITS, brightness)  # what an 11-bit panel would show
+        shown = panel_light(pwm_bits, brightness)
+        self.levels, first = np.unique(shown, return_index=True)
+        self.level_codes = first.astype(np.uint8)  # lowest input value showing each level
+        hi = np.minimum(np.searchsorted(self.levels, self.target, side="right"), len(self.levels) - 1)
+        lo = np.searchsorted(self.levels, self.target, side="right") - 1
+        span = self.levels[hi] - self.levels[lo]
+        frac = np.where(span > 0, (self.target - self.levels[lo]) / np.maximum(span, 1), 0.0)
+        self.lo_lut = self.level_codes[lo]
+        self.hi_lut = self.level_codes[hi]
+        self.frac_lut = np.clip(np.floor(frac * 256), 0, 255).astype(np.uint8)
+        self.exact = not self.frac_lut.any()  # every value has its own level (11 bits): nothing to dither
+        self.light_lut = self.target.astype(np.float32)
+        self.light_levels = self.levels.astype(np.float32)
+        self.buffers = {}
+        self.last = None  # (input, output) of the last fs frame; the display clients redraw still images
+
+    def _buffers(self, shape):
+        buffers = self.buffers.get(shape)
+        if buffers is None:
+            h, w = shape[:2]
+            thresholds = (BAYER_4 * 16 + 8).astype(np.uint8)  # (k + 0.5) / 16 of 256
+            tiled = np.tile(thresholds, (h // 4 + 1, w // 4 + 1))[:h, :w]
+            if len(shape) == 3:  # the same threshold for every channel of a pixel
+                tiled = np.ascontiguousarray(np.broadcast_to(tiled[..., None], shape))
+            # Flat indices of each wavefront's pixels, in the frame and in the padded error
+            # buffer, and of their right, down-left, down and down-right neighbours
+            wavefronts = []
+            stride = w + 2
+            for t in range(w + 2 * (h - 1)):
+                ys = np.arange(max(0, (t - w + 2) // 2), min(h - 1, t // 2) + 1)
+                xs = t - 2 * ys
+                at = ys * stride + xs + 1
+                wavefronts.append((ys * w + xs, at, at + 1, at + stride - 1, at + stride, at + stride + 1))
+            buffers = {
+                'thresholds': tiled,
+                'frac': np.empty(shape, np.uint8),
+                'hi': np.empty(shape, np.uint8),
+                'mask': np.empty(shape, bool),
+                'error': np.empty((h + 1, w + 2) + tuple(shape[2:]), np.float32),
+                'wavefronts': wavefronts,
+            }
+            self.buffers[shape] = buffers
+        return buffers
+
+    def _bayer(self, frame, out, b):
+        cv2.LUT(frame, self.frac_lut, dst=b['frac'])
+        cv2.LUT(frame, self.hi_lut, dst=b['hi'])
+        np.greater(b['frac'], b['thresholds'], out=b['mask'])
+        cv2.LUT(frame, self.lo_lut, dst=out)
+        np.copyto(out, b['hi'], where=b['mask'])
+
+    def _floyd_steinberg(self, frame, out, b):
+        h, w = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        buf = b['error']  # light plus diffused error, padded by one column each side and one row below
+        buf[...] = 0
+        buf[:h, 1:w + 1] = self.light_lut[frame]
+        flat_buf = buf.reshape(-1, channels)
+        flat_out = out.reshape(-1, channels)
+        levels, codes = self.light_levels, self.level_codes
+        top = levels[-1]
+        last = len(levels) - 1
+        for pixels, at, right, down_left, down, down_right in b['wavefronts']:
+            value = np.clip(flat_buf[at], 0, top)
+            i = np.clip(np.searchsorted(levels, value), 1, last)
+            i -= value - levels[i - 1] < levels[i] - value
+            flat_out[pixels] = codes[i]
+            error = value - levels[i]
+            flat_buf[right] += error * (7 / 16)
+            flat_buf[down_left] += error * (3 / 16)
+            flat_buf[down] += error * (5 / 16)
+            flat_buf[down_right] += error * (1 / 16)
+
+    def apply(self, frame, out=None):
+        """Quantized frame, written to out (default: a new array; out may be frame itself).
+        Returns frame unchanged when the method is off"""
+        if self.method == "off":
+            return frame
+        if out is None:
+            out = np.empty_like(frame)
+        if self.exact:
+            return cv2.LUT(frame, self.lo_lut, dst=out)
+        b = self._buffers(frame.shape)
+        if self.method == "bayer":
+            self._bayer(frame, out, b)
+        elif self.last is not None and self.last[0].shape == frame.shape and np.array_equal(self.last[0], frame):
+            np.copyto(out, self.last[1])
+        else:
+            source = frame.copy()
+            self._floyd_steinberg(source, out, b)
+            self.last = (source, out.copy())
+        return out
+
+    def image(self, image):
+        """apply() for a PIL image; returns image itself when off"""
+        if self.method == "off":
+            return image
+        return Image.fromarray(self.apply(np.asarray(image)))
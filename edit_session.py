@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Render graph for the captured image while it is being edited in app.py.
+One EditSession exists per captured mosaic. Each parameter change is
+rendered once, from one parameter snapshot, into every output the app needs:
+  full     the effect applied at the file's resolution (save_final_image)
+  preview  a JPEG of that at PREVIEW_SIZE (the browser's live preview)
+  panel    the 32x32 frame, and the chained-panel PIL image laid out like
+           the live view (matrix_loop)
+Consumers read these cached outputs, so matrix_loop no longer re-reads the
+file and re-runs the effect chain on every frame.
+"""
+
+import threading
+from collections import namedtuple
+import cv2
+from PIL import Image
+
+from effects import DEFAULT_PARAMS, apply_effects
+from mosaic import build_pyramid, compose_panels, layout_levels, PANEL_SIZE
+
+PREVIEW_SIZE = 180
+DEFAULT_LAYOUT = [(PANEL_SIZE, None)] * 4
+
+EditOutputs = namedtuple("EditOutputs", "version params full preview panel panel_image")
+
+class EditSession:
+    """Cached effect outputs for one captured image"""
+
+    def __init__(self, path, params=None, layout=DEFAULT_LAYOUT):
+        self.path = path
+        self.layout = layout
+        self.lock = threading.Lock()
+        self.source = cv2.imread(path)
+        self.params = dict(params or DEFAULT_PARAMS)
+        self.version = 1
+        self.outputs_cache = None
+        self.renders = 0
+
+    def set_params(self, params):
+        """Make params current; returns the new version"""
+        with self.lock:
+            if params != self.params:
+                self.params = dict(params)
+                self.version += 1
+            return self.version
+
+    def outputs(self, params=None):
+        """Outputs for params (default: the current ones), rendered at most once per change"""
+        with self.lock:
+            if self.source is None:
+                return None
+            if params is None or params == self.params:
+                params, version = self.params, self.version
+            else:
+                version = None  # an explicit snapshot that isn't current, e.g. save with stale params
+            cached = self.outputs_cache
+            if cached is not None and cached.params == params:
+                return cached
+            outputs = self._render(params, version)
+            if version is not None:
+                self.outputs_cache = outputs
+            return outputs
+
+    def _render(self, params, version):
+        full = apply_effects(self.source, params)
+        h, w = full.shape[:2]
+        if max(h, w) > PREVIEW_SIZE:
+            scale = PREVIEW_SIZE / max(h, w)
+            small = cv2.resize(full, (max(1, round(w * scale)), max(1, round(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+        else:
+            small = full
+        ok, buffer = cv2.imencode('.jpg', small)
+        preview = buffer.tobytes() if ok else None
+        pyramid = build_pyramid(full, layout_levels(self.layout) | {PANEL_SIZE})
+        panel = pyramid[PANEL_SIZE]
+        # chained panels follow the same layout as the live view, as RGB for SetImage
+        panel_image = Image.fromarray(cv2.cvtColor(compose_panels(pyramid, self.layout), cv2.COLOR_BGR2RGB))
+        self.renders += 1
+        return EditOutputs(version, dict(params), full, preview, panel, panel_image)
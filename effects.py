@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Effect chain used by the editor (processed_mosaic, save_final_image) and by
+the matrix while it shows the captured image. Kept in one place so the
+browser preview, the saved file and the panel all apply the same maths.
+
+compile_effects() turns a parameter set into an immutable EffectPipeline
+once: every per-pixel step of the chain is a function of one 8-bit value, so
+it becomes a 256-entry lookup table, and a frame is three cv2.LUT passes and
+the two colour conversions, with no float image in between. The tables are
+computed with the same float32 arithmetic apply_effects always used, so the
+output is bit-identical.
+"""
+
+from functools import lru_cache
+import cv2
+import numpy as np
+
+DEFAULT_PARAMS = {
+    "brightness": 1.0,
+    "contrast": 1.0,
+    "saturation": 1.0,
+    "hue_shift": 0,
+    "colorize": 0,
+    "invert": 0,
+}
+
+def parse_effect_params(source):
+    """Read effect parameters from request args, JSON or effect_params"""
+    return {
+        "brightness": float(source.get("brightness", 1.0)),
+        "contrast": float(source.get("contrast", 1.0)),
+        "saturation": float(source.get("saturation", 1.0)),
+        "hue_shift": int(source.get("hue_shift", 0)),
+        "colorize": int(source.get("colorize", 0)),
+        "invert": int(source.get("invert", 0)),
+    }
+
+_LEVELS = np.arange(256, dtype=np.uint8)
+
+def _table(values):
+    table = values.astype('uint8')
+    table.flags.writeable = False
+    return table
+
+def _tone_table(brightness, contrast, invert):
+    """Brightness/contrast and invert for each 8-bit level"""
+    v = _LEVELS.astype('float32') / 255.0
+    v = v * contrast + (brightness - 1.0)
+    v = np.clip(v, 0, 1)
+    if invert:
+        v = 1.0 - v
+    return _table(v * 255)
+
+def _hsv_table(saturation, hue_shift, colorize):
+    """Saturation and hue shift/colorize for each 8-bit H, S and V level, as a 3-channel table"""
+    v = _LEVELS.astype('float32')
+    hue = v.copy()
+    if colorize:
+        hue[:] = hue_shift
+    elif hue_shift != 0:
+        hue = (hue + hue_shift) % 180
+    sat = np.clip(v * saturation, 0, 255)
+    return _table(np.stack([hue, sat, v], axis=1).reshape(1, 256, 3))
+
+def _unit_table():
+    """The float round trip at the end of the chain (not exactly the identity in float32)"""
+    return _table(_LEVELS.astype('float32') / 255.0 * 255)
+
+def _is_identity(table):
+    return table.ndim == 1 and np.array_equal(table, _LEVELS)
+
+class EffectPipeline:
+    """An immutable, compiled effect chain; apply() runs it on a BGR uint8 image"""
+
+    __slots__ = ("params", "ops")
+
+    def __init__(self, params, ops):
+        object.__setattr__(self, "params", params)
+        object.__setattr__(self, "ops", ops)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("EffectPipeline is immutable")
+
+    def apply(self, img):
+        for op, arg in self.ops:
+            if op == "lut":
+                img = cv2.LUT(img, arg)
+            elif op == "convert":
+                img = cv2.cvtColor(img, arg)
+            elif op == "blur":
+                img = cv2.GaussianBlur(img, (arg * 2 + 1, arg * 2 + 1), 0)
+        return img
+
+@lru_cache(maxsize=64)
+def _compile(key):
+    params = dict(key)
+    ops = []
+    tone = _tone_table(params["brightness"], params["contrast"], params["invert"])
+    if not _is_identity(tone):
+        ops.append(("lut", tone))
+    ops.append(("convert", cv2.COLOR_BGR2HSV))
+    ops.append(("lut", _hsv_table(params["saturation"], params["hue_shift"], params["colorize"])))
+    ops.append(("convert", cv2.COLOR_HSV2BGR))
+    unit = _unit_table()
+    if not _is_identity(unit):
+        ops.append(("lut", unit))
+    if params.get("blur", 0) > 0:
+        ops.append(("blur", int(params["blur"])))
+    return EffectPipeline(params, tuple(ops))
+
+def compile_effects(params):
+    """EffectPipeline for a parameter set (the effect chain's keys, plus an optional blur radius)"""
+    return _compile(tuple(sorted(params.items())))
+
+def apply_effects(img, params):
+    """Brightness/contrast, invert, saturation and hue shift/colorize on a BGR image"""
+    return compile_effects(params).apply(img)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Durable FTP publishing queue for app.py.
+Final images are copied into an on-disk outbox and uploaded by a background
+thread, so saving never waits on the network. The uploader keeps a single
+FTP(S) session open, sends queued files in batches, retries with exponential
+backoff when the venue network drops, and skips content it has already sent
+(files are keyed by their SHA-256).
+
+Outbox layout:
+  <sha256>.jpg   queued image
+  <sha256>.json  {"remote_name": ..., "enqueued": ...}
+  sent.log       one "<sha256> <remote_name>" line per completed upload
+  damaged/       entries that couldn't be read, moved out of the queue
+"""
+
+import ftplib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 10
+KEEPALIVE_INTERVAL = 30  # seconds between NOOPs on an idle session
+BACKOFF_INITIAL = 2
+BACKOFF_MAX = 300
+
+def file_sha256(path):
+    """SHA-256 of a file's contents"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class FtpOutbox:
+    """On-disk outbox with a background uploader holding one persistent session"""
+
+    def __init__(self, outbox_dir, host, user, password, target_dir,
+                 port=21, use_tls=True, tls_context=None, batch_size=BATCH_SIZE):
+        self.outbox_dir = outbox_dir
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.target_dir = target_dir
+        self.use_tls = use_tls
+        self.tls_context = tls_context
+        self.batch_size = batch_size
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.ftp = None
+        self.last_activity = 0
+        self.sent_log = os.path.join(outbox_dir, "sent.log")
+        self.sent = set()
+        self.pending = deque()
+        self.copying = set()  # digests being copied in by enqueue(), not yet pending
+        self.stats = {
+            'uploaded': 0,
+            'bytes_uploaded': 0,
+            'duplicates_skipped': 0,
+            'failures': 0,
+            'connections': 0,
+            'last_error': None,
+            'last_upload': None,
+            'backoff': 0,
+        }
+        self.recent = deque(maxlen=100)  # (time, bytes) of recent uploads
+
+        os.makedirs(outbox_dir, exist_ok=True)
+        if os.path.exists(self.sent_log):
+            with open(self.sent_log) as f:
+                self.sent = {line.split()[0] for line in f if line.strip()}
+        # Anything left over from a previous run is still queued
+        queued = [n[:-5] for n in os.listdir(outbox_dir) if n.endswith(".json")]
+        queued.sort(key=lambda d: os.path.getmtime(os.path.join(outbox_dir, d + ".json")))
+        self.pending.extend(queued)
+
+    def start(self):
+        """Start the uploader thread"""
+        threading.Thread(target=self._loop, daemon=True, name="ftp-outbox").start()
+        if self.pending:
+            log.info("FTP outbox: %d queued uploads from a previous run", len(self.pending))
+
+    def enqueue(self, path, remote_name):
+        """Copy a file into the outbox; returns its content hash"""
+        digest = file_sha256(path)
+        with self.lock:
+            # Checked and reserved in one step, so concurrent saves of the same image queue it once
+            if digest in self.sent or digest in self.pending or digest in self.copying:
+                self.stats['duplicates_skipped'] += 1
+                return digest
+            self.copying.add(digest)
+        data_path = os.path.join(self.outbox_dir, digest + ".jpg")
+        meta_path = os.path.join(self.outbox_dir, digest + ".json")
+        try:
+            shutil.copyfile(path, data_path + ".tmp")
+            os.replace(data_path + ".tmp", data_path)
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump({'remote_name': remote_name, 'enqueued': time.time()}, f)
+            os.replace(meta_path + ".tmp", meta_path)
+        except Exception:
+            with self.lock:
+                self.copying.discard(digest)
+            raise
+        with self.lock:
+            self.copying.discard(digest)
+            self.pending.append(digest)
+        self.wakeup.set()
+        return digest
+
+    def status(self):
+        """Queue depth and throughput for the status endpoint"""
+        now = time.time()
+        with self.lock:
+            window = [(t, b) for t, b in self.recent if now - t <= 300]
+            return {
+                **self.stats,
+                'queued': len(self.pending),
+                'connected': self.ftp is not None,
+                'host': f"{self.host}:{self.port}",
+                'uploads_per_min_5m': len(window) / 5.0,
+                'kbytes_per_s_5m': sum(b for _, b in window) / 300.0 / 1024.0,
+            }
+
+    def _connect(self):
+        if self.use_tls:
+            ftp = ftplib.FTP_TLS(context=self.tls_context)
+        else:
+            ftp = ftplib.FTP()
+        ftp.connect(self.host, self.port, timeout=30)
+        ftp.login(self.user, self.password)
+        if self.use_tls:
+            ftp.prot_p()
+        try:
+            ftp.cwd(self.target_dir)
+        except ftplib.error_perm:
+            ftp.mkd(self.target_dir)
+            ftp.cwd(self.target_dir)
+        self.ftp = ftp
+        self.stats['connections'] += 1
+        self.last_activity = time.time()
+
+    def _disconnect(self):
+        if self.ftp is not None:
+            try:
+                self.ftp.close()
+            except Exception:
+                pass
+        self.ftp = None
+
+    def _set_aside(self, *paths):
+        damaged_dir = os.path.join(self.outbox_dir, "damaged")
+        os.makedirs(damaged_dir, exist_ok=True)
+        for path in paths:
+            try:
+                os.replace(path, os.path.join(damaged_dir, os.path.basename(path)))
+            except FileNotFoundError:
+                pass
+
+    def _upload(self, digest):
+        meta_path = os.path.join(self.outbox_dir, digest + ".json")
+        data_path = os.path.join(self.outbox_dir, digest + ".jpg")
+        try:
+            with open(meta_path) as f:
+                remote_name = json.load(f)['remote_name']
+            size = os.path.getsize(data_path)
+        except (OSError, ValueError, KeyError) as e:
+            # A damaged entry would block the queue forever; drop it, and move its
+            # files aside so the next start doesn't queue it again
+            log.warning("FTP outbox: dropping unreadable entry %s: %s", digest, e)
+            self._set_aside(meta_path, data_path)
+            with self.lock:
+                self.pending.remove(digest)
+            return
+        with open(data_path, "rb") as f:
+            self.ftp.storbinary(f"STOR {remote_name}", f)
+        with open(self.sent_log, "a") as sent_log:
+            sent_log.write(f"{digest} {remote_name}\n")
+        os.remove(data_path)
+        os.remove(meta_path)
+        now = time.time()
+        with self.lock:
+            self.sent.add(digest)
+            self.pending.remove(digest)
+            self.stats['uploaded'] += 1
+            self.stats['bytes_uploaded'] += size
+            self.stats['last_upload'] = now
+            self.recent.append((now, size))
+        self.last_activity = now
+
+    def _loop(self):
+        backoff = 0
+        while True:
+            self.wakeup.wait(timeout=KEEPALIVE_INTERVAL)
+            self.wakeup.clear()
+            try:
+                with self.lock:
+                    batch = list(self.pending)[:self.batch_size]
+                if not batch:
+                    # Idle: keep the session warm, or let it go if the server dropped it
+                    if self.ftp is not None and time.time() - self.last_activity >= KEEPALIVE_INTERVAL:
+                        self.ftp.voidcmd("NOOP")
+                        self.last_activity = time.time()
+                    continue
+                if self.ftp is None:
+                    self._connect()
+                for digest in batch:
+                    self._upload(digest)
+                backoff = 0
+                self.stats['backoff'] = 0
+                if self.pending:
+                    self.wakeup.set()
+            except Exception as e:
+                self._disconnect()
+                backoff = min(BACKOFF_MAX, backoff * 2 if backoff else BACKOFF_INITIAL)
+                with self.lock:
+                    self.stats['failures'] += 1
+                    self.stats['last_error'] = f"{type(e).__name__}: {e}"
+                    self.stats['backoff'] = backoff
+                log.warning("FTP outbox upload failed, retrying in %ss: %s", backoff, e)
+                time.sleep(backoff)
+                self.wakeup.set()
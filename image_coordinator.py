@@ -8,25 +8,69 @@ no image repetition across all displays.
 
 import os
 import sys
+import hmac
+import logging
 import time
 import glob
 import random
 import threading
-from flask import Flask, jsonify
+import bisect
+import cv2
+from collections import namedtuple
+from flask import Flask, Response, jsonify, request, send_file
 from datetime import datetime
+from dotenv import load_dotenv
+from serving import run_server
+from display_schedule import DisplaySchedule, list_schedule_images
+from tiles import make_tile, encode_tile, sha256_hex, tile_path, CATALOG_TOKEN_HEADER
+from assignment_wire import AssignmentPublisher, HEADER, multicast_sender, parse_group
+from discovery import BeaconSender
+from telemetry import TelemetryStore, TELEMETRY_HEADER, DISPLAY_HEADER
+from metrics import Counter, Gauge, Histogram, TimedLock, install_flask
+from logs import setup_logging, install_flask as install_logs
+
+load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 EXHIBITION_FOLDER = os.path.join(BASE_DIR, "exhibition")
 
 app = Flask(__name__)
+install_flask(app, "coordinator")
+install_logs(app)
+
+log = logging.getLogger("coordinator")
+
+LOCK_WAIT = Histogram("coordinator_lock_wait_seconds", "Time spent waiting to acquire a lock", ("lock",))
+LOCK_HOLD = Histogram("coordinator_lock_hold_seconds", "Time a lock was held", ("lock",))
+TILE_READS = Counter("coordinator_tile_reads_total", "Tile files served from disk", ("endpoint",))
+ASSIGNMENT_VERSION = Gauge("coordinator_assignment_version", "Current assignment sequence")
 
 # Configuration
 CYCLE_TIME = 120
 INCREMENTAL_UPDATE_TIME = 2.0  # seconds between incremental updates
 NUM_DISPLAYS = 3  # number of Pi displays
 SCREENS_PER_DISPLAY = [4, 4, 2]  # screens per Pi: Pi#1=4, Pi#2=4, Pi#3=2
-
-# Global state
+# When set, assignments come from the deterministic schedule in display_schedule.py,
+# so display Pis configured with the same seed can follow it during outages
+SCHEDULE_SEED = os.getenv("SCHEDULE_SEED")
+SCHEDULE_EPOCH = float(os.getenv("SCHEDULE_EPOCH", "0"))
+# Binary assignment frames (see assignment_wire.py) are also sent to this
+# multicast group ("239.255.42.1:5005") when set
+ASSIGN_MULTICAST = parse_group(os.getenv("ASSIGN_MULTICAST"))
+ASSIGN_KEYFRAME_INTERVAL = 10  # seconds between full frames on multicast, for late joiners
+# Discovery beacons (see discovery.py); set DISCOVERY_GROUP empty to disable
+DISCOVERY_GROUP = parse_group(os.getenv("DISCOVERY_GROUP", "239.255.42.2:5007"))
+COORDINATOR_PORT = 5001
+# Shared with app.py; POST /catalog/add is refused without it
+CATALOG_TOKEN = os.getenv("CATALOG_TOKEN", "")
+
+# Assignment state as the API sees it: an immutable snapshot that the writers
+# replace (one reference assignment) whenever they change the working state
+# below, so request handlers read a consistent view without taking a lock
+AssignmentSnapshot = namedtuple("AssignmentSnapshot",
+                                "version assignments next_images cycle_start screen_to_update image_index total_images")
+
+# Global state (the working copy; only changed with coordinator_lock held)
 image_files = []
 current_assignments = {}  # {display_id: [img1, img2, img3, img4]}
 next_cycle_images = []  # Next 10 images to cycle through
@@ -36,7 +80,22 @@ cycle_start_time = time.time()
 cycle_count = 0
 last_incremental_update = time.time()
 current_screen_to_update = 0  # Which screen position to update next (0-9)
-coordinator_lock = threading.Lock()
+coordinator_lock = TimedLock(LOCK_WAIT.labels("coordinator"), hold=LOCK_HOLD.labels("coordinator"))
+snapshot = AssignmentSnapshot(0, {}, (), cycle_start_time, 0, 0, 0)
+schedule = None  # DisplaySchedule when SCHEDULE_SEED is set
+# Panel tiles: {relative image path: {'sha256': ..., 'bytes': ..., 'version': ...}}
+catalog = {}
+catalog_removed = {}  # {relative image path: version it was removed at}
+tiles_by_hash = {}  # {sha256: relative image path}, for /cas
+catalog_version = 0
+CATALOG_EPOCH = str(int(time.time()))  # versions restart with the process; clients resync on a new epoch
+catalog_lock = TimedLock(LOCK_WAIT.labels("catalog"), hold=LOCK_HOLD.labels("catalog"))
+# Serialises /catalog/add, so the existence check and the write can't interleave
+catalog_add_lock = TimedLock(LOCK_WAIT.labels("catalog_add"), hold=LOCK_HOLD.labels("catalog_add"))
+assignment_publisher = AssignmentPublisher()
+ASSIGNMENT_VERSION.set_function(lambda: assignment_publisher.seq)
+beacon = None  # BeaconSender when DISCOVERY_GROUP is set
+telemetry_store = TelemetryStore()
 
 def load_image_files():
     """Load all JPG files from the exhibition folder"""
@@ -49,9 +108,117 @@ def load_image_files():
     image_files.sort()  # Sort for consistent order before shuffling
     if len(image_files) > 1:
         random.shuffle(image_files)
-    print(f"Loaded {len(image_files)} images")
+    log.info("Loaded %d images", len(image_files))
     return len(image_files) > 0
 
+def set_catalog_entry(rel_path, tile_bytes):
+    """Record a tile in the catalog (the tile file is already on disk)"""
+    global catalog_version
+    sha = sha256_hex(tile_bytes)
+    with catalog_lock:
+        entry = catalog.get(rel_path)
+        if entry is not None and entry['sha256'] == sha:
+            return
+        catalog_version += 1
+        catalog[rel_path] = {'sha256': sha, 'bytes': len(tile_bytes), 'version': catalog_version}
+        catalog_removed.pop(rel_path, None)
+        tiles_by_hash[sha] = rel_path
+
+def drop_catalog_entries(keep):
+    """Remove catalog entries whose images are gone from the exhibition folder"""
+    global catalog_version
+    with catalog_lock:
+        for rel_path in [p for p in catalog if p not in keep]:
+            catalog_version += 1
+            sha = catalog.pop(rel_path)['sha256']
+            catalog_removed[rel_path] = catalog_version
+            if tiles_by_hash.get(sha) == rel_path:
+                other = next((p for p, e in catalog.items() if e['sha256'] == sha), None)
+                if other:
+                    tiles_by_hash[sha] = other
+                else:
+                    del tiles_by_hash[sha]
+
+def build_catalog():
+    """Make sure every exhibition image has an up-to-date tile, and catalog them"""
+    images, linkings = list_schedule_images(EXHIBITION_FOLDER)
+    rotated, _ = list_schedule_images(os.path.join(EXHIBITION_FOLDER, "rotate"))
+    built = 0
+    all_paths = images + linkings + [f"rotate/{name}" for name in rotated]
+    drop_catalog_entries(set(all_paths))
+    for rel_path in all_paths:
+        image_path = os.path.join(EXHIBITION_FOLDER, rel_path)
+        tile_file = tile_path(EXHIBITION_FOLDER, rel_path)
+        if os.path.exists(tile_file) and os.path.getmtime(tile_file) >= os.path.getmtime(image_path):
+            with open(tile_file, "rb") as f:
+                set_catalog_entry(rel_path, f.read())
+            continue
+        img = cv2.imread(image_path)
+        if img is None:
+            continue
+        tile_bytes = encode_tile(make_tile(img))
+        write_atomic(tile_file, tile_bytes)
+        set_catalog_entry(rel_path, tile_bytes)
+        built += 1
+    log.info("Tile catalog: %d tiles (%d built)", len(catalog), built)
+
+def write_atomic(path, data):
+    """Write a file so readers never see a partial copy"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def safe_rel_path(rel_path):
+    """Normalise an exhibition-relative path, or None if it points outside the folder"""
+    rel_path = os.path.normpath(rel_path or "").replace(os.sep, "/")
+    if not rel_path or rel_path.startswith(("/", ".")):  # also rejects "..", and the .tiles store
+        return None
+    return rel_path
+
+def register_image(rel_path, image_bytes, tile_bytes, scheduled):
+    """Add one promoted image and its tile without rescanning the exhibition folder"""
+    global schedule
+    write_atomic(os.path.join(EXHIBITION_FOLDER, rel_path), image_bytes)
+    write_atomic(tile_path(EXHIBITION_FOLDER, rel_path), tile_bytes)
+    set_catalog_entry(rel_path, tile_bytes)
+    if not scheduled:
+        return
+
+    is_linking = rel_path.startswith("linkings/")
+    if SCHEDULE_SEED:
+        if schedule is not None:
+            images, linkings = list(schedule.images), list(schedule.linkings)
+            target = linkings if is_linking else images
+            if rel_path not in target:
+                bisect.insort(target, rel_path)
+                schedule = DisplaySchedule(images, linkings, SCHEDULE_SEED,
+                                           epoch=SCHEDULE_EPOCH,
+                                           cycle_time=CYCLE_TIME,
+                                           incremental_update_time=INCREMENTAL_UPDATE_TIME,
+                                           screens_per_display=SCREENS_PER_DISPLAY)
+    elif not is_linking:
+        # Linking images are re-listed every cycle; exhibition images go into
+        # the slots the next cycle will show
+        full_path = os.path.join(EXHIBITION_FOLDER, rel_path)
+        with coordinator_lock:
+            if full_path not in image_files:
+                pos = (image_index + 3 * sum(SCREENS_PER_DISPLAY)) % (len(image_files) + 1)
+                image_files.insert(pos, full_path)
+                publish_snapshot()
+
+def publish_snapshot():
+    """Replace the API's snapshot with a copy of the working state (call with coordinator_lock held)"""
+    global snapshot
+    snapshot = AssignmentSnapshot(snapshot.version + 1,
+                                  {display_id: tuple(images) for display_id, images in current_assignments.items()},
+                                  tuple(next_cycle_images), cycle_start_time, current_screen_to_update,
+                                  image_index, len(image_files))
+    # Under the lock too, so the binary publisher sees versions in order
+    assignment_publisher.publish(snapshot.assignments, snapshot.cycle_start)
+    return snapshot
+
 def assign_images():
     """Assign initial images to each display, ensuring no repetition"""
     global current_assignments, next_cycle_images, image_index, current_screen_to_update
@@ -97,8 +264,9 @@ def assign_images():
 
         # Reset incremental update counter
         current_screen_to_update = 0
+        publish_snapshot()
 
-        print("Initial image assignments created")
+    log.info("Initial image assignments created")
 
 def update_single_image():
     """Update a single image incrementally during the cycle"""
@@ -108,6 +276,7 @@ def update_single_image():
         return
     
     total_screens = sum(SCREENS_PER_DISPLAY)
+    new_image = None
 
     with coordinator_lock:
         # Find which display and screen position this update affects
@@ -128,18 +297,31 @@ def update_single_image():
         if current_display < len(current_assignments) and local_screen < len(current_assignments[current_display]):
             new_image = next_cycle_images[screen_position]
             current_assignments[current_display][local_screen] = new_image
-            print(f"Updated Display {current_display}, Screen {local_screen} with: {new_image[:20]}...")
 
         # Move to next screen for next update
         current_screen_to_update = (current_screen_to_update + 1) % total_screens
+        publish_snapshot()
+
+    if new_image is not None:
+        log.debug("Updated Display %d, Screen %d with: %s...", current_display, local_screen, new_image[:20])
 
 def start_new_cycle():
     """Start a new 2-minute cycle with fresh images"""
     global image_index, next_cycle_images, current_screen_to_update, cycle_start_time, cycle_count
-    # Store previous cycle's assignments for duplicate check
-    prev_assignments = {k: v.copy() for k, v in current_assignments.items()} if current_assignments else {}
+    # Previous cycle's assignments for the duplicate check (snapshots are never modified)
+    prev_assignments = snapshot.assignments
     
     total_screens = sum(SCREENS_PER_DISPLAY)
+
+    # Listed before taking the lock: a folder scan on an SD card can take a while
+    linkings_folder = os.path.join(EXHIBITION_FOLDER, "linkings")
+    linkings_images = []
+    if os.path.exists(linkings_folder):
+        linkings_images = glob.glob(os.path.join(linkings_folder, "*.jpg"))
+        linkings_images.extend(glob.glob(os.path.join(linkings_folder, "*.jpeg")))
+        linkings_images.extend(glob.glob(os.path.join(linkings_folder, "*.JPG")))
+        linkings_images.extend(glob.glob(os.path.join(linkings_folder, "*.JPEG")))
+        linkings_images = [os.path.relpath(img, EXHIBITION_FOLDER) for img in linkings_images]
     
     with coordinator_lock:
         # Move to next set of images
@@ -173,15 +355,6 @@ def start_new_cycle():
             next_cycle_images.append(candidate)
 
         # After preparing next_cycle_images, for Pi 0 and Pi 1, replace one of the first 4 and one of the next 4 with a linking image
-        linkings_folder = os.path.join(EXHIBITION_FOLDER, "linkings")
-        linkings_images = []
-        if os.path.exists(linkings_folder):
-            linkings_images = glob.glob(os.path.join(linkings_folder, "*.jpg"))
-            linkings_images.extend(glob.glob(os.path.join(linkings_folder, "*.jpeg")))
-            linkings_images.extend(glob.glob(os.path.join(linkings_folder, "*.JPG")))
-            linkings_images.extend(glob.glob(os.path.join(linkings_folder, "*.JPEG")))
-            linkings_images = [os.path.relpath(img, EXHIBITION_FOLDER) for img in linkings_images]
-
         # Pi 0 (first 4 images) - no check needed
         pi0_link_base = None
         if linkings_images and len(next_cycle_images) >= 4:
@@ -225,21 +398,63 @@ def start_new_cycle():
         cycle_start_time = time.time()
 
         # Shuffle when we complete a full cycle through all images
-        if image_index == 0 and len(image_files) > total_screens:
+        shuffled = image_index == 0 and len(image_files) > total_screens
+        if shuffled:
             random.shuffle(image_files)
-            print("Shuffled image order for new cycle")
-
-        print(f"Started new 2-minute cycle at {datetime.now().strftime('%H:%M:%S')}")
-        print(f"Next images to cycle: {[img[:15] + '...' for img in next_cycle_images[:5]]}...")
+        published = publish_snapshot()
+
+    if shuffled:
+        log.info("Shuffled image order for new cycle")
+    log.info("Started new 2-minute cycle at %s", datetime.now().strftime('%H:%M:%S'))
+    log.debug("Next images to cycle: %s...", [img[:15] + '...' for img in published.next_images[:5]])
+
+def build_schedule():
+    """Create the deterministic schedule from the current exhibition folder"""
+    global schedule
+    images, linkings = list_schedule_images(EXHIBITION_FOLDER)
+    schedule = DisplaySchedule(images, linkings, SCHEDULE_SEED,
+                               epoch=SCHEDULE_EPOCH,
+                               cycle_time=CYCLE_TIME,
+                               incremental_update_time=INCREMENTAL_UPDATE_TIME,
+                               screens_per_display=SCREENS_PER_DISPLAY)
+    log.info("Deterministic schedule: %d images, %d linkings, seed '%s'", len(images), len(linkings), SCHEDULE_SEED)
+
+def apply_schedule(now):
+    """Publish the deterministic schedule's assignments for time now"""
+    global current_assignments, next_cycle_images, cycle_start_time, current_screen_to_update, cycle_count
+    cycle, into_cycle = schedule.cycle_at(now)
+    assignments = schedule.assignments_at(now)
+    with coordinator_lock:
+        changed = assignments != current_assignments
+        current_assignments = assignments
+        next_cycle_images = schedule.cycle_images(cycle)
+        cycle_start_time = now - into_cycle
+        cycle_count = cycle
+        current_screen_to_update = min(int(into_cycle // INCREMENTAL_UPDATE_TIME) + 1,
+                                       sum(SCREENS_PER_DISPLAY)) % sum(SCREENS_PER_DISPLAY)
+        publish_snapshot()
+    return changed
+
+def scheduled_coordinator_loop():
+    """Coordinator loop driven by the deterministic schedule"""
+    build_schedule()
+    while True:
+        if apply_schedule(time.time()):
+            log.debug("Schedule update at %s", datetime.now().strftime('%H:%M:%S'))
+        time.sleep(0.5)
 
 def coordinator_loop():
     """Main coordinator loop that cycles images incrementally"""
     global last_incremental_update, cycle_start_time
     
-    print("Starting coordinator loop...")
+    log.info("Starting coordinator loop...")
     
     if not load_image_files():
-        print("No images found in exhibition folder!")
+        log.error("No images found in exhibition folder!")
+        return
+
+    if SCHEDULE_SEED:
+        scheduled_coordinator_loop()
         return
     
     # Initial assignment
@@ -260,97 +475,311 @@ def coordinator_loop():
             # Debug: show which images are currently displayed
             cycle_progress = int((current_time - cycle_start_time) / INCREMENTAL_UPDATE_TIME)
             time_left = CYCLE_TIME - (current_time - cycle_start_time)
-            print(f"Incremental update #{cycle_progress}, {time_left:.0f}s left in cycle")
+            log.debug("Incremental update #%d, %.0fs left in cycle", cycle_progress, time_left)
         
         time.sleep(0.5)  # Check more frequently for better timing
 
+def beacon_state():
+    """What the discovery beacon advertises"""
+    return assignment_publisher.epoch, assignment_publisher.seq, catalog_version, SCHEDULE_EPOCH
+
+def record_telemetry(display_id, data):
+    """Store a display's telemetry record, checked against what it is assigned"""
+    assigned = snapshot.assignments.get(display_id)
+    telemetry_store.add(display_id, data, assigned)
+
+def record_request_telemetry(display_id=None):
+    """Telemetry sent with an HTTP poll, if any"""
+    data = request.headers.get(TELEMETRY_HEADER)
+    if display_id is None:
+        display_id = request.headers.get(DISPLAY_HEADER, type=int)
+    if data and display_id is not None:
+        record_telemetry(display_id, data)
+
+def multicast_loop():
+    """Send assignment deltas (and a periodic full frame) to ASSIGN_MULTICAST"""
+    sock = multicast_sender()
+    sent_seq = None
+    last_keyframe = 0
+    log.info("Multicasting assignments to %s:%d", *ASSIGN_MULTICAST)
+    while True:
+        now = time.time()
+        if now - last_keyframe >= ASSIGN_KEYFRAME_INTERVAL:
+            frame = assignment_publisher.frame()
+            last_keyframe = now
+        else:
+            frame = assignment_publisher.frame(sent_seq)
+        if frame:
+            try:
+                sock.sendto(frame, ASSIGN_MULTICAST)
+                # The seq of the frame that went out; a publish() since frame() isn't sent yet
+                sent_seq = HEADER.unpack_from(frame)[5]
+            except OSError as e:
+                log.warning("Multicast send failed: %s", e)
+        time.sleep(0.5)
+
 # API Endpoints
 
 @app.route('/status')
 def status():
     """Get coordinator status"""
+    current = snapshot
     current_time = time.time()
     return jsonify({
         'status': 'running',
-        'total_images': len(image_files),
+        'total_images': current.total_images,
         'displays': NUM_DISPLAYS,
         'screens_per_display': SCREENS_PER_DISPLAY,
         'total_screens': sum(SCREENS_PER_DISPLAY),
         'cycle_time': CYCLE_TIME,
         'incremental_update_time': INCREMENTAL_UPDATE_TIME,
-        'current_index': image_index,
-        'cycle_start': cycle_start_time,
-        'time_in_current_cycle': current_time - cycle_start_time,
-        'time_until_next_cycle': max(0, CYCLE_TIME - (current_time - cycle_start_time)),
-        'current_screen_to_update': current_screen_to_update
+        'current_index': current.image_index,
+        'cycle_start': current.cycle_start,
+        'time_in_current_cycle': current_time - current.cycle_start,
+        'time_until_next_cycle': max(0, CYCLE_TIME - (current_time - current.cycle_start)),
+        'current_screen_to_update': current.screen_to_update,
+        'assignment_version': assignment_publisher.seq,
+        'display_health': beacon.status(assignment_publisher.epoch, assignment_publisher.seq) if beacon else None
     })
 
 @app.route('/images/<int:display_id>')
 def get_images(display_id):
     """Get current image assignments for a specific display"""
-    if display_id not in current_assignments:
+    current = snapshot
+    if display_id not in current.assignments:
         return jsonify({'error': 'Invalid display ID'}), 400
+    record_request_telemetry(display_id)
     
-    with coordinator_lock:
-        return jsonify({
-            'display_id': display_id,
-            'images': current_assignments[display_id],
-            'cycle_start': cycle_start_time,
-            'time_in_cycle': time.time() - cycle_start_time,
-            'next_cycle_in': max(0, CYCLE_TIME - (time.time() - cycle_start_time))
-        })
+    now = time.time()
+    return jsonify({
+        'display_id': display_id,
+        'images': current.assignments[display_id],
+        'cycle_start': current.cycle_start,
+        'time_in_cycle': now - current.cycle_start,
+        'next_cycle_in': max(0, CYCLE_TIME - (now - current.cycle_start))
+    })
 
 @app.route('/images/all')
 def get_all_images():
     """Get image assignments for all displays"""
-    with coordinator_lock:
-        return jsonify({
-            'assignments': current_assignments,
-            'cycle_start': cycle_start_time,
-            'time_in_cycle': time.time() - cycle_start_time,
-            'next_cycle_in': max(0, CYCLE_TIME - (time.time() - cycle_start_time)),
-            'total_images': len(image_files),
-            'total_screens': sum(SCREENS_PER_DISPLAY),
-            'current_screen_to_update': current_screen_to_update,
-            'next_images': next_cycle_images
-        })
+    current = snapshot
+    now = time.time()
+    return jsonify({
+        'assignments': current.assignments,
+        'cycle_start': current.cycle_start,
+        'time_in_cycle': now - current.cycle_start,
+        'next_cycle_in': max(0, CYCLE_TIME - (now - current.cycle_start)),
+        'total_images': current.total_images,
+        'total_screens': sum(SCREENS_PER_DISPLAY),
+        'current_screen_to_update': current.screen_to_update,
+        'next_images': current.next_images
+    })
+
+@app.route('/assign')
+def get_assign_frame():
+    """Binary assignment frame: a delta since ?since=<seq>&epoch=<epoch> when possible, else full; 304 if unchanged"""
+    record_request_telemetry()
+    frame = assignment_publisher.frame(request.args.get('since', type=int),
+                                       request.args.get('epoch', type=int))
+    if frame is None:
+        return '', 304
+    return Response(frame, mimetype='application/octet-stream')
+
+@app.route('/assign/table')
+def get_assign_table():
+    """Binary id table for assignment frames, from id ?start=<n>"""
+    return Response(assignment_publisher.table(request.args.get('start', 0, type=int)),
+                    mimetype='application/octet-stream')
+
+@app.route('/telemetry')
+def get_telemetry():
+    """Display telemetry time series: ?display=<id> for one display, ?since=<unix time> for recent samples"""
+    series = telemetry_store.series(request.args.get('display', type=int),
+                                    request.args.get('since', 0, type=float))
+    return jsonify({'displays': {str(d): samples for d, samples in series.items()}})
+
+# Display telemetry and beacon liveness, read from their stores on each scrape
+DISPLAY_GAUGES = {
+    'display_fps': ('fps', "Frame loop iterations per second"),
+    'display_loop_ms': ('loop_ms', "Mean frame loop work time in milliseconds"),
+    'display_load1': ('load', "1-minute load average"),
+    'display_temperature_celsius': ('temp_c', "SoC temperature"),
+    'display_cache_hit_ratio': ('cache_hit_rate', "Tile cache hit rate"),
+    'display_missing_screens': ('missing', "Screens without an image"),
+    'display_errors': ('errors', "Errors in the last telemetry window"),
+    'display_in_sync': ('in_sync', "1 if the display shows its current assignment"),
+}
+for gauge_name, (field, help_text) in DISPLAY_GAUGES.items():
+    Gauge(gauge_name, help_text, ("display",)).set_function(
+        lambda field=field: {(d,): record[field] for d, (_, record) in telemetry_store.latest().items()})
+Gauge("display_telemetry_age_seconds", "Seconds since the last telemetry record", ("display",)).set_function(
+    lambda: {(d,): time.time() - t for d, (t, _) in telemetry_store.latest().items()})
+
+def display_health(key, scale=1):
+    """{(display,): value} from the beacon replies, for a liveness gauge"""
+    if beacon is None:
+        return {}
+    health = beacon.status(assignment_publisher.epoch, assignment_publisher.seq)
+    return {(d,): None if entry[key] is None else entry[key] * scale for d, entry in health.items()}
+
+Gauge("display_last_seen_seconds", "Seconds since the last beacon reply", ("display",)).set_function(
+    lambda: display_health('last_seen_ago'))
+Gauge("display_latency_seconds", "Smoothed beacon round-trip time", ("display",)).set_function(
+    lambda: display_health('latency_ms', 0.001))
+Gauge("display_version_lag", "Assignment versions the display is behind", ("display",)).set_function(
+    lambda: display_health('version_lag'))
+
+@app.route('/schedule')
+def get_schedule():
+    """Describe the deterministic schedule so displays can verify their local copy"""
+    if schedule is None:
+        return jsonify({'error': 'Deterministic schedule not enabled'}), 404
+    return jsonify({
+        'seed': schedule.seed,
+        'epoch': schedule.epoch,
+        'cycle_time': schedule.cycle_time,
+        'incremental_update_time': schedule.incremental_update_time,
+        'screens_per_display': schedule.screens_per_display,
+        'images': len(schedule.images),
+        'linkings': len(schedule.linkings)
+    })
+
+@app.route('/catalog')
+def get_catalog():
+    """Tile checksums for every exhibition image"""
+    with catalog_lock:
+        return jsonify({'version': catalog_version, 'tiles': catalog})
+
+@app.route('/tiles/<path:rel_path>')
+def get_tile(rel_path):
+    """The 32x32 PNG tile for an exhibition image"""
+    rel_path = safe_rel_path(rel_path)
+    with catalog_lock:
+        entry = catalog.get(rel_path) if rel_path else None
+    if entry is None:
+        return jsonify({'error': 'Unknown tile'}), 404
+    TILE_READS.labels("tiles").inc()
+    response = send_file(tile_path(EXHIBITION_FOLDER, rel_path), mimetype='image/png')
+    response.headers['X-Tile-Sha256'] = entry['sha256']
+    return response
+
+@app.route('/manifest')
+def get_manifest():
+    """Path -> tile hash changes since a version, for the displays' tile stores"""
+    since = request.args.get('since', 0, type=int)
+    etag = f'"{CATALOG_EPOCH}:{catalog_version}"'
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304, {'ETag': etag}
+    with catalog_lock:
+        full = request.args.get('epoch') != CATALOG_EPOCH or since > catalog_version
+        if full:
+            since = 0
+        tiles = {p: e['sha256'] for p, e in catalog.items() if e['version'] > since}
+        removed = [p for p, v in catalog_removed.items() if v > since and not full]
+        response = jsonify({'epoch': CATALOG_EPOCH, 'version': catalog_version, 'full': full,
+                            'tiles': tiles, 'removed': removed})
+    response.headers['ETag'] = etag
+    return response
+
+@app.route('/cas/<sha256>')
+def get_tile_by_hash(sha256):
+    """A tile by content hash; immutable, with ETag and Range support"""
+    with catalog_lock:
+        rel_path = tiles_by_hash.get(sha256)
+    if rel_path is None:
+        return jsonify({'error': 'Unknown tile'}), 404
+    TILE_READS.labels("cas").inc()
+    response = send_file(tile_path(EXHIBITION_FOLDER, rel_path), mimetype='image/png',
+                         etag=sha256, conditional=True, max_age=31536000)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.route('/catalog/add', methods=['POST'])
+def add_to_catalog():
+    """Register one promoted image: multipart with path, scheduled, overwrite, tile_sha256
+    and image/tile files, sent with the catalog token"""
+    token = request.headers.get(CATALOG_TOKEN_HEADER, "")
+    if not CATALOG_TOKEN or not hmac.compare_digest(token.encode(), CATALOG_TOKEN.encode()):
+        return jsonify({'error': 'Missing or wrong catalog token'}), 403
+    rel_path = safe_rel_path(request.form.get('path'))
+    image_file = request.files.get('image')
+    tile_file = request.files.get('tile')
+    if rel_path is None or image_file is None or tile_file is None:
+        return jsonify({'error': 'Missing path, image or tile'}), 400
+    tile_bytes = tile_file.read()
+    if sha256_hex(tile_bytes) != request.form.get('tile_sha256'):
+        return jsonify({'error': 'Tile checksum mismatch'}), 400
+    scheduled = request.form.get('scheduled', '1') == '1'
+    overwrite = request.form.get('overwrite', '0') == '1'
+    with catalog_add_lock:
+        if not overwrite and os.path.exists(os.path.join(EXHIBITION_FOLDER, rel_path)):
+            return jsonify({'error': f'{rel_path} already exists; send overwrite=1 to replace it'}), 409
+        register_image(rel_path, image_file.read(), tile_bytes, scheduled)
+    log.info("Registered %s%s", rel_path, '' if scheduled else ' (not scheduled)')
+    with catalog_lock:
+        return jsonify({'status': 'registered', 'path': rel_path, 'sha256': catalog[rel_path]['sha256'],
+                        'catalog_version': catalog_version})
 
 @app.route('/reload')
 def reload_images():
     """Reload images from exhibition folder"""
     if load_image_files():
-        assign_images()
+        build_catalog()
+        if SCHEDULE_SEED:
+            build_schedule()
+            apply_schedule(time.time())
+        else:
+            assign_images()
         return jsonify({'status': 'reloaded', 'image_count': len(image_files)})
     else:
         return jsonify({'error': 'No images found'}), 404
 
 def main():
     """Main function"""
-    print("Image Coordinator Service")
-    print(f"Exhibition folder: {EXHIBITION_FOLDER}")
-    print(f"Managing {NUM_DISPLAYS} displays:")
+    global beacon
+    setup_logging()
+    log.info("Image Coordinator Service")
+    log.info("Exhibition folder: %s", EXHIBITION_FOLDER)
+    log.info("Managing %d displays:", NUM_DISPLAYS)
     for i, screens in enumerate(SCREENS_PER_DISPLAY):
-        print(f"  Display {i}: {screens} screens")
-    print(f"Total screens: {sum(SCREENS_PER_DISPLAY)}")
-    print(f"Cycle time: {CYCLE_TIME} seconds ({CYCLE_TIME/60:.1f} minutes)")
-    print(f"Incremental update every: {INCREMENTAL_UPDATE_TIME} seconds")
+        log.info("  Display %d: %d screens", i, screens)
+    log.info("Total screens: %d", sum(SCREENS_PER_DISPLAY))
+    log.info("Cycle time: %d seconds (%.1f minutes)", CYCLE_TIME, CYCLE_TIME / 60)
+    log.info("Incremental update every: %s seconds", INCREMENTAL_UPDATE_TIME)
     
     # Ensure exhibition folder exists
     os.makedirs(EXHIBITION_FOLDER, exist_ok=True)
     
+    build_catalog()
+
     # Start coordinator in background thread
     coordinator_thread = threading.Thread(target=coordinator_loop, daemon=True)
     coordinator_thread.start()
+    if ASSIGN_MULTICAST:
+        threading.Thread(target=multicast_loop, daemon=True).start()
+    if DISCOVERY_GROUP:
+        beacon = BeaconSender(DISCOVERY_GROUP, COORDINATOR_PORT, beacon_state, on_reply=record_telemetry)
+        threading.Thread(target=beacon.run, daemon=True).start()
+        log.info("Discovery beacon on %s:%d", *DISCOVERY_GROUP)
     
-    print("Starting Flask server on http://0.0.0.0:5001")
-    print("API endpoints:")
-    print("  GET /status - Get coordinator status")
-    print("  GET /images/<display_id> - Get images for specific display")
-    print("  GET /images/all - Get all image assignments")
-    print("  GET /reload - Reload images from folder")
+    log.info("Starting Flask server on http://0.0.0.0:%d", COORDINATOR_PORT)
+    log.info("API endpoints:")
+    log.info("  GET /status - Get coordinator status")
+    log.info("  GET /images/<display_id> - Get images for specific display")
+    log.info("  GET /images/all - Get all image assignments")
+    log.info("  GET /assign?since=<seq> - Binary assignments; GET /assign/table - Binary id table")
+    log.info("  GET /metrics - Prometheus metrics; GET /telemetry - Display telemetry series")
+    log.info("  GET /logs?since=<unix time>&level=<name> - Recent log records")
+    log.info("  GET /schedule - Deterministic schedule parameters (SCHEDULE_SEED)")
+    log.info("  GET /catalog - Tile checksums; GET /tiles/<path> - 32x32 tile")
+    log.info("  GET /manifest?since=<version> - Tile hash changes; GET /cas/<sha256> - Tile by hash")
+    log.info("  POST /catalog/add - Register a promoted image and its tile")
+    if not CATALOG_TOKEN:
+        log.warning("CATALOG_TOKEN is not set: POST /catalog/add will refuse every request")
+    log.info("  GET /reload - Reload images from folder")
     
-    # Start Flask server
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    # Start the HTTP server (mode selected by SERVER_MODE, see serving.py)
+    run_server(app, host='0.0.0.0', port=COORDINATOR_PORT)
 
 if __name__ == "__main__":
     main()
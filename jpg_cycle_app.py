@@ -1,5 +1,6 @@
 import os
 import sys
+import logging
 import time
 import glob
 import cv2
@@ -10,10 +11,21 @@ import threading
 import random
 import requests
 import json
+from collections import OrderedDict
 from dotenv import load_dotenv
+from display_schedule import DisplaySchedule, list_schedule_images, split_schedule_images
+from tile_store import TileStore
+from assignment_wire import AssignmentClient, parse_group
+from discovery import BeaconListener
+from telemetry import DisplayTelemetry, DISPLAY_HEADER
+from metrics import Counter, Histogram, serve as serve_metrics
+from logs import setup_logging, logs_route
+from dither import PanelQuantizer
 
 load_dotenv()
 
+log = logging.getLogger("display")
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 os.chdir(BASE_DIR)
 sys.path.insert(0, BASE_DIR)
@@ -28,12 +40,42 @@ USE_COORDINATOR = True  # Set to True to use coordinator service
 COORDINATOR_IP = os.getenv("COORDINATOR_IP", "127.0.0.1")  # IP of the coordinator Pi
 COORDINATOR_PORT = 5001
 DISPLAY_ID = 0  # Set to 0 for first Pi, 1 for second Pi, etc.
+# Shared with the coordinator: with the same seed the fallback follows the
+# coordinator's deterministic schedule instead of cycling local files
+SCHEDULE_SEED = os.getenv("SCHEDULE_SEED")
+SCHEDULE_EPOCH = float(os.getenv("SCHEDULE_EPOCH", "0"))
+FALLBACK_FAIL_THRESHOLD = 4  # consecutive coordinator failures before fallback
+TILE_CACHE_SIZE = 512  # decoded 32x32 tiles kept in memory (~3 KB each)
+TILE_SYNC_INTERVAL = 60  # seconds between tile manifest syncs with the coordinator
+# "binary" polls the coordinator's compact /assign frames instead of /images/<id> JSON.
+# With ASSIGN_MULTICAST set, frames are received from that group and HTTP is only
+# used when they stop arriving (see assignment_wire.py).
+ASSIGN_PROTOCOL = os.getenv("ASSIGN_PROTOCOL", "json")
+ASSIGN_MULTICAST = parse_group(os.getenv("ASSIGN_MULTICAST"))
+ASSIGN_MULTICAST_TIMEOUT = 30  # seconds without a datagram before polling over HTTP
+# Coordinator beacons (see discovery.py). Without COORDINATOR_IP the beacon's
+# address is used, and polls are skipped while beacons say nothing changed.
+DISCOVERY_GROUP = parse_group(os.getenv("DISCOVERY_GROUP", "239.255.42.2:5007"))
+DISCOVER_COORDINATOR = "COORDINATOR_IP" not in os.environ
+BEACON_MAX_AGE = 3  # seconds a beacon is trusted to skip a poll
+MAX_POLL_INTERVAL = 30  # poll at least this often even when beacons say nothing changed
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))  # Prometheus /metrics listener, 0 to disable
+PWM_BITS = int(os.getenv("PWM_BITS", "7"))  # panel PWM depth; fewer bits refresh faster
+PANEL_BRIGHTNESS = 80
+panel_quantizer = PanelQuantizer(PWM_BITS, brightness=PANEL_BRIGHTNESS)  # DITHER=bayer|fs hides the banding
+
+FRAME_SECONDS = Histogram("display_frame_seconds", "Frame loop work per iteration, excluding the sleep")
+TILE_CACHE = Counter("display_tile_cache_total", "Decoded tile cache lookups", ("result",))
+IMAGE_READS = Counter("display_image_reads_total", "Images decoded from disk", ("source",))
+POLL_SECONDS = Histogram("display_poll_seconds", "Assignment poll round trips", ("protocol",))
 
 # Global variables
 current_images = [None, None, None, None]  # Always 4 screens
 assigned_filenames = [None, None, None, None]  # Current assigned filenames
 loaded_filenames = [None, None, None, None]  # Track last loaded filename for each screen
 last_coordinator_check = 0
+fetched_version = None  # beacon (epoch, seq) current when the last JSON fetch started
+display_telemetry = DisplayTelemetry()
 image_lock = threading.Lock()
 fallback_start_time = None
 fallback_last_update = 0
@@ -41,28 +83,114 @@ fallback_indices = [0, 1, 2, 3]
 fallback_files = []
 # Fallback failure tracking
 fallback_fail_count = 0
+fallback_schedule = None
+fallback_schedule_source = None  # manifest (epoch, version) the schedule was built from
+# Decoded tiles: {filename: (source key, 32x32 image)}, least recently used first.
+# The key is ("cas", sha256) for store tiles and (path, mtime) for local files.
+tile_cache = OrderedDict()
+tile_store = TileStore(EXHIBITION_FOLDER, f"http://{COORDINATOR_IP}:{COORDINATOR_PORT}") if USE_COORDINATOR else None
+
+def screen_state():
+    """(filenames on the screens, screens without an image) for telemetry"""
+    with image_lock:
+        shown = [f if img is not None else None for f, img in zip(loaded_filenames, current_images)]
+        return shown, sum(img is None for img in current_images)
+
+def telemetry_record():
+    """Telemetry bytes for beacon replies"""
+    return display_telemetry.record(*screen_state())
+
+def telemetry_headers():
+    """Headers sent with each coordinator poll"""
+    headers = display_telemetry.header(*screen_state())
+    headers[DISPLAY_HEADER] = str(DISPLAY_ID)
+    return headers
+
+# Created after telemetry_headers, which it sends with every poll
+assign_client = None
+if USE_COORDINATOR and (ASSIGN_PROTOCOL == "binary" or ASSIGN_MULTICAST):
+    assign_client = AssignmentClient(f"http://{COORDINATOR_IP}:{COORDINATOR_PORT}")
+    assign_client.headers = telemetry_headers
+
+def applied_version():
+    """(epoch, seq) of the assignments this display has, for beacon replies"""
+    if assign_client is not None:
+        return (assign_client.epoch, assign_client.seq) if assign_client.epoch is not None else None
+    return fetched_version
+
+def set_coordinator(ip, port):
+    """Point every coordinator client at a discovered address"""
+    global COORDINATOR_IP, COORDINATOR_PORT
+    if not DISCOVER_COORDINATOR:
+        return
+    COORDINATOR_IP, COORDINATOR_PORT = ip, port
+    base_url = f"http://{ip}:{port}"
+    if tile_store:
+        tile_store.base_url = base_url
+    if assign_client is not None:
+        assign_client.base_url = base_url
+
+beacon = None
+if USE_COORDINATOR and DISCOVERY_GROUP:
+    beacon = BeaconListener(DISCOVERY_GROUP, DISPLAY_ID, applied_version, set_coordinator, telemetry_record)
+
+def assignments_current():
+    """True when a recent beacon says the last fetch is still the latest assignment"""
+    if beacon is None or time.time() - last_coordinator_check > MAX_POLL_INTERVAL:
+        return False
+    return beacon.current(BEACON_MAX_AGE)
+
+def fetch_binary_assignments():
+    """Fetch current image assignments through the binary protocol"""
+    global assigned_filenames, last_coordinator_check
+    try:
+        if not ASSIGN_MULTICAST or time.time() - assign_client.last_frame > ASSIGN_MULTICAST_TIMEOUT:
+            with POLL_SECONDS.labels("binary").time():
+                assign_client.poll()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log.warning("Failed to fetch assignments from coordinator: %s", e)
+        return False
+    images = assign_client.display_images(DISPLAY_ID)
+    if images is None:
+        log.warning("Coordinator has no assignment for display %d", DISPLAY_ID)
+        return False
+    with image_lock:
+        if images != assigned_filenames:
+            log.info("Received from coordinator (seq %d): %s", assign_client.seq,
+                     [f[:20] + '...' if len(f) > 20 else f for f in images])
+        assigned_filenames = images
+        last_coordinator_check = time.time()
+    return True
 
 def fetch_coordinator_images():
     """Fetch current image assignments from coordinator"""
-    global assigned_filenames, last_coordinator_check
-    
+    global assigned_filenames, last_coordinator_check, fetched_version
+    if assign_client is not None:
+        return fetch_binary_assignments()
+
+    version = (beacon.epoch, beacon.seq) if beacon is not None and beacon.seq is not None else None
     try:
         url = f"http://{COORDINATOR_IP}:{COORDINATOR_PORT}/images/{DISPLAY_ID}"
-        response = requests.get(url, timeout=2)
+        with POLL_SECONDS.labels("json").time():
+            response = requests.get(url, timeout=2, headers=telemetry_headers())
         
         if response.status_code == 200:
             data = response.json()
             with image_lock:
+                changed = data['images'] != assigned_filenames
                 assigned_filenames = data['images']
                 last_coordinator_check = time.time()
-            print(f"Received from coordinator: {[f[:20] + '...' if len(f) > 20 else f for f in assigned_filenames]}")
+                fetched_version = version
+            if changed:
+                log.info("Received from coordinator: %s",
+                         [f[:20] + '...' if len(f) > 20 else f for f in assigned_filenames])
             return True
         else:
-            print(f"Coordinator returned status {response.status_code}")
+            log.warning("Coordinator returned status %d", response.status_code)
             return False
             
     except requests.exceptions.RequestException as e:
-        print(f"Failed to connect to coordinator: {e}")
+        log.warning("Failed to connect to coordinator: %s", e)
         return False
 
 def load_image_files():
@@ -75,25 +203,106 @@ def load_image_files():
     files.sort()
     if len(files) > 1:
         random.shuffle(files)
-    print(f"Fallback: Found {len(files)} local images")
+    log.info("Fallback: Found %d local images", len(files))
     return files
 
+def tile_sync_loop():
+    """Keep the local tile store in step with the coordinator's manifest"""
+    while True:
+        try:
+            changed, fetched = tile_store.sync()
+            if changed or fetched:
+                log.info("Tile sync: %d manifest changes, %d tiles fetched", changed, fetched)
+        except Exception as e:
+            log.warning("Tile sync failed: %s", e)
+        time.sleep(TILE_SYNC_INTERVAL)
+
 def load_and_resize_image(filename):
     """Load an image by filename and resize it to 32x32 for the LED matrix"""
     try:
-        image_path = os.path.join(EXHIBITION_FOLDER, filename)
-        img = cv2.imread(image_path)
-        if img is None:
-            print(f"Failed to load image: {image_path}")
-            return None
-        
-        # Resize to 32x32 for each screen
-        resized = cv2.resize(img, (32, 32), interpolation=cv2.INTER_AREA)
+        # The coordinator's tile for a path wins, so every display shows the same
+        # pixels even when its own copy of the file is missing or stale
+        sha = tile_store.lookup(filename) if tile_store else None
+        if sha is not None:
+            key = ("cas", sha)
+        else:
+            image_path = os.path.join(EXHIBITION_FOLDER, filename)
+            key = (image_path, os.path.getmtime(image_path))
+        cached = tile_cache.get(filename)
+        if cached is not None and cached[0] == key:
+            tile_cache.move_to_end(filename)
+            display_telemetry.cache(True)
+            TILE_CACHE.labels("hit").inc()
+            return cached[1]
+        display_telemetry.cache(False)
+        TILE_CACHE.labels("miss").inc()
+
+        # Only tiles already on disk: downloads are left to tile_sync_loop, so an
+        # unreachable coordinator never blocks the frame loop here
+        resized = tile_store.read(sha) if sha is not None else None
+        if resized is not None:
+            IMAGE_READS.labels("cas").inc()
+        else:
+            image_path = os.path.join(EXHIBITION_FOLDER, filename)
+            img = cv2.imread(image_path)
+            IMAGE_READS.labels("file").inc()
+            if img is None:
+                log.warning("Failed to load image: %s", image_path)
+                display_telemetry.error()
+                return None
+            # Resize to 32x32 for each screen
+            resized = cv2.resize(img, (32, 32), interpolation=cv2.INTER_AREA)
+            if sha is None:
+                key = (image_path, os.path.getmtime(image_path))
+            else:
+                key = None  # tile not synced yet; try the store again next time
+        tile_cache[filename] = (key, resized)
+        tile_cache.move_to_end(filename)
+        while len(tile_cache) > TILE_CACHE_SIZE:
+            tile_cache.popitem(last=False)
         return resized
     except Exception as e:
-        print(f"Error processing image {filename}: {e}")
+        log.warning("Error processing image %s: %s", filename, e)
+        display_telemetry.error()
         return None
 
+def get_fallback_schedule():
+    """Build the local copy of the coordinator's deterministic schedule.
+    The catalog comes from the tile manifest when there is one, so images promoted
+    on the coordinator (and missing from this Pi's folder) are in it too; the
+    schedule is rebuilt whenever the manifest changes"""
+    global fallback_schedule, fallback_schedule_source
+    if not SCHEDULE_SEED:
+        return None
+    source, paths = tile_store.paths() if tile_store else (None, [])
+    if not paths:
+        source = None
+    if fallback_schedule is None or source != fallback_schedule_source:
+        if paths:
+            images, linkings = split_schedule_images(paths)
+        else:
+            images, linkings = list_schedule_images(EXHIBITION_FOLDER)
+        if images:
+            fallback_schedule = DisplaySchedule(images, linkings, SCHEDULE_SEED, epoch=SCHEDULE_EPOCH)
+            fallback_schedule_source = source
+            log.info("Fallback: following local schedule (%d images, from the %s)",
+                     len(images), "tile manifest" if paths else "exhibition folder")
+    return fallback_schedule
+
+def show_assigned_images(filenames):
+    """Load any changed screen images, reusing decoded tiles where possible"""
+    with image_lock:
+        for screen in range(4):
+            fname = filenames[screen] if screen < len(filenames) else None
+            if fname:
+                if loaded_filenames[screen] != fname:
+                    current_images[screen] = load_and_resize_image(fname)
+                    loaded_filenames[screen] = fname
+                # else: keep current_images[screen] as is
+            else:
+                current_images[screen] = None
+                loaded_filenames[screen] = None
+
 def update_images():
     """Update the current images based on coordinator assignments"""
     global current_images, fallback_start_time, fallback_last_update, fallback_indices, fallback_files, fallback_fail_count
@@ -107,21 +316,15 @@ def update_images():
             fallback_last_update = 0
             fallback_indices = [0, 1, 2, 3]
             fallback_files = []
-            with image_lock:
-                for screen in range(4):
-                    fname = assigned_filenames[screen]
-                    if fname:
-                        if loaded_filenames[screen] != fname:
-                            current_images[screen] = load_and_resize_image(fname)
-                            loaded_filenames[screen] = fname
-                        # else: keep current_images[screen] as is
-                    else:
-                        current_images[screen] = None
-                        loaded_filenames[screen] = None
+            show_assigned_images(assigned_filenames)
         else:
             fallback_fail_count += 1
-            print(f"Coordinator unavailable, fail count: {fallback_fail_count}")
-            if fallback_fail_count >= 4:
+            log.warning("Coordinator unavailable, fail count: %d", fallback_fail_count)
+            schedule = get_fallback_schedule() if fallback_fail_count >= FALLBACK_FAIL_THRESHOLD else None
+            if schedule is not None:
+                # Same deterministic sequence the coordinator would have served
+                show_assigned_images(schedule.display_images_at(DISPLAY_ID, time.time()))
+            elif fallback_fail_count >= FALLBACK_FAIL_THRESHOLD:
                 # Only start fallback after 4 consecutive failures
                 if fallback_start_time is None:
                     fallback_start_time = time.time()
@@ -132,11 +335,7 @@ def update_images():
                         for screen in range(4):
                             if fallback_files and screen < len(fallback_files):
                                 img_path = fallback_files[fallback_indices[screen] % len(fallback_files)]
-                                img = cv2.imread(img_path)
-                                if img is not None:
-                                    current_images[screen] = cv2.resize(img, (32, 32))
-                                else:
-                                    current_images[screen] = None
+                                current_images[screen] = load_and_resize_image(img_path)
                             else:
                                 current_images[screen] = None
                 else:
@@ -150,12 +349,9 @@ def update_images():
                             if fallback_files and next_screen < len(fallback_indices):
                                 fallback_indices[next_screen] = (fallback_indices[next_screen] + 1) % len(fallback_files)
                                 img_path = fallback_files[fallback_indices[next_screen]]
-                                img = cv2.imread(img_path)
+                                img = load_and_resize_image(img_path)
                                 with image_lock:
-                                    if img is not None:
-                                        current_images[next_screen] = cv2.resize(img, (32, 32))
-                                    else:
-                                        current_images[next_screen] = None
+                                    current_images[next_screen] = img
             # If not enough failures, do nothing (keep last images)
     else:
         # Local mode (original behavior)
@@ -164,11 +360,7 @@ def update_images():
             for screen in range(4):
                 if fallback_files and screen < len(fallback_files):
                     img_path = fallback_files[screen % len(fallback_files)]
-                    img = cv2.imread(img_path)
-                    if img is not None:
-                        current_images[screen] = cv2.resize(img, (32, 32))
-                    else:
-                        current_images[screen] = None
+                    current_images[screen] = load_and_resize_image(img_path)
 
 def create_matrix_image():
     """Create the image for the matrix display"""
@@ -188,7 +380,7 @@ def create_matrix_image():
         matrix_img = np.concatenate(screen_images, axis=1) 
         matrix_img = cv2.rotate(matrix_img, cv2.ROTATE_180)
         matrix_img_rgb = cv2.cvtColor(matrix_img, cv2.COLOR_BGR2RGB)
-        return Image.fromarray(matrix_img_rgb)
+        return Image.fromarray(panel_quantizer.apply(matrix_img_rgb))
 
 def matrix_loop():
     """Main loop for the RGB matrix display"""
@@ -200,7 +392,7 @@ def matrix_loop():
         options.hardware_mapping = 'adafruit-hat'
         options.brightness = 50
         matrix = RGBMatrix(options=options)
-        print("Starting RGB matrix display in DEDICATED 4-COLOR TEST PATTERN mode...")
+        log.info("Starting RGB matrix display in DEDICATED 4-COLOR TEST PATTERN mode...")
         test_img = np.zeros((32, 128, 3), dtype=np.uint8)  # 4 panels wide
         # Create test pattern for 4 panels
         test_img[0:16, 0:32] = [255, 0, 0]     # Panel 1: red
@@ -221,7 +413,7 @@ def matrix_loop():
         options.chain_length = 4  # Always 4 panels
         # options.multiplexing = 6
         options.hardware_mapping = 'adafruit-hat'
-        options.brightness = 80
+        options.brightness = PANEL_BRIGHTNESS
         # anti-flickering stuff
         # options.pwm_lsb_nanoseconds = 130
         # options.gpio_slowdown = 4
@@ -229,15 +421,15 @@ def matrix_loop():
         # options.pwm_bits = 11
         options.pwm_lsb_nanoseconds = 300
         options.gpio_slowdown = 2
-        options.pwm_bits = 7
+        options.pwm_bits = PWM_BITS
         matrix = RGBMatrix(options=options)
         
-        print(f"Starting RGB matrix display (Display ID: {DISPLAY_ID})...")
+        log.info("Starting RGB matrix display (Display ID: %d)...", DISPLAY_ID)
         if USE_COORDINATOR:
-            print(f"Using coordinator at {COORDINATOR_IP}:{COORDINATOR_PORT}")
+            log.info("Using coordinator at %s:%d", COORDINATOR_IP, COORDINATOR_PORT)
         else:
-            print("Using local image cycling")
-        print("Press Ctrl+C to exit")
+            log.info("Using local image cycling")
+        log.info("Press Ctrl+C to exit")
         
         # Initial image load
         update_images()
@@ -248,7 +440,8 @@ def matrix_loop():
                 CHECK_INTERVAL = 1.0  # seconds
                 # Check for new assignments every few seconds
                 current_time = time.time()
-                if USE_COORDINATOR and current_time - last_coordinator_check > CHECK_INTERVAL:
+                if (USE_COORDINATOR and current_time - last_coordinator_check > CHECK_INTERVAL
+                        and not assignments_current()):
                     update_images()
                 
                 # Update display
@@ -256,34 +449,47 @@ def matrix_loop():
                     matrix_image = create_matrix_image()
                     matrix.SetImage(matrix_image)
                 except Exception as e:
-                    print(f"Error setting matrix image: {e}")
+                    log.warning("Error setting matrix image: %s", e)
+                    display_telemetry.error()
+                display_telemetry.frame(time.time() - current_time)
+                FRAME_SECONDS.observe(time.time() - current_time)
                 
                 time.sleep(0.5)
                 
         except KeyboardInterrupt:
-            print("\nExiting...")
+            log.info("Exiting...")
         finally:
             matrix.Clear()
 
 def main():
     """Main function"""
-    print("JPG Cycle App for 4-Panel RGB Matrix (Client Mode)")
-    print(f"Exhibition folder: {EXHIBITION_FOLDER}")
-    print(f"Display ID: {DISPLAY_ID}")
+    setup_logging()
+    log.info("JPG Cycle App for 4-Panel RGB Matrix (Client Mode)")
+    log.info("Exhibition folder: %s", EXHIBITION_FOLDER)
+    log.info("Display ID: %d", DISPLAY_ID)
     
     if USE_COORDINATOR:
-        print(f"Coordinator mode: {COORDINATOR_IP}:{COORDINATOR_PORT}")
+        log.info("Coordinator mode: %s:%d", COORDINATOR_IP, COORDINATOR_PORT)
     else:
-        print("Local cycling mode")
+        log.info("Local cycling mode")
     
     # Check if exhibition folder exists
     if not os.path.exists(EXHIBITION_FOLDER):
-        print(f"Creating exhibition folder: {EXHIBITION_FOLDER}")
+        log.info("Creating exhibition folder: %s", EXHIBITION_FOLDER)
         os.makedirs(EXHIBITION_FOLDER, exist_ok=True)
         if not USE_COORDINATOR:
-            print("Please add JPG images to the exhibition folder and restart the app.")
+            log.error("Please add JPG images to the exhibition folder and restart the app.")
             return
     
+    if tile_store:
+        threading.Thread(target=tile_sync_loop, daemon=True).start()
+    if assign_client is not None and ASSIGN_MULTICAST:
+        threading.Thread(target=assign_client.listen, args=(ASSIGN_MULTICAST,), daemon=True).start()
+    if beacon is not None:
+        threading.Thread(target=beacon.listen, daemon=True).start()
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT, routes={"/logs": logs_route})
+
     # Start the matrix loop
     matrix_loop()
 
@@ -1,5 +1,6 @@
 import os
 import sys
+import logging
 import time
 import glob
 import cv2
@@ -11,9 +12,17 @@ import random
 import requests
 import json
 from dotenv import load_dotenv
+from tile_store import TileStore
+from assignment_wire import parse_group
+from discovery import BeaconListener
+from metrics import Counter, Histogram, serve as serve_metrics
+from logs import setup_logging, logs_route
+from dither import PanelQuantizer
 
 load_dotenv()
 
+log = logging.getLogger("display")
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 os.chdir(BASE_DIR)
 sys.path.insert(0, BASE_DIR)
@@ -30,6 +39,17 @@ USE_COORDINATOR = True  # Set to True to use coordinator service
 COORDINATOR_IP = os.getenv("COORDINATOR_IP", "127.0.0.1")  # IP of the coordinator Pi
 COORDINATOR_PORT = 5001
 DISPLAY_ID = 1  # Set to 0 for first Pi, 1 for second Pi, etc.
+TILE_SYNC_INTERVAL = 60  # seconds between tile manifest syncs with the coordinator
+# Coordinator beacons (see discovery.py); without COORDINATOR_IP the beacon's address is used
+DISCOVERY_GROUP = parse_group(os.getenv("DISCOVERY_GROUP", "239.255.42.2:5007"))
+DISCOVER_COORDINATOR = "COORDINATOR_IP" not in os.environ
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))  # Prometheus /metrics listener, 0 to disable
+PWM_BITS = int(os.getenv("PWM_BITS", "8"))  # panel PWM depth; fewer bits refresh faster
+PANEL_BRIGHTNESS = 30
+panel_quantizer = PanelQuantizer(PWM_BITS, brightness=PANEL_BRIGHTNESS)  # DITHER=bayer|fs hides the banding
+
+FRAME_SECONDS = Histogram("display_frame_seconds", "Frame loop work per iteration, excluding the sleep")
+IMAGE_READS = Counter("display_image_reads_total", "Images decoded from disk", ("source",))
 
 # Global variables
 current_images = [None, None, None, None]  # Always 4 screens
@@ -44,6 +64,7 @@ fallback_indices = [0, 1, 2, 3]
 fallback_files = []
 # Fallback failure tracking
 fallback_fail_count = 0
+tile_store = TileStore(EXHIBITION_FOLDER, f"http://{COORDINATOR_IP}:{COORDINATOR_PORT}") if USE_COORDINATOR else None
 
 def fetch_coordinator_images():
     """Fetch current image assignments from coordinator"""
@@ -56,16 +77,19 @@ def fetch_coordinator_images():
         if response.status_code == 200:
             data = response.json()
             with image_lock:
+                changed = data['images'] != assigned_filenames
                 assigned_filenames = data['images']
                 last_coordinator_check = time.time()
-            print(f"Received from coordinator: {[f[:20] + '...' if len(f) > 20 else f for f in assigned_filenames]}")
+            if changed:
+                log.info("Received from coordinator: %s",
+                         [f[:20] + '...' if len(f) > 20 else f for f in assigned_filenames])
             return True
         else:
-            print(f"Coordinator returned status {response.status_code}")
+            log.warning("Coordinator returned status %d", response.status_code)
             return False
             
     except requests.exceptions.RequestException as e:
-        print(f"Failed to connect to coordinator: {e}")
+        log.warning("Failed to connect to coordinator: %s", e)
         return False
 
 def load_image_files():
@@ -78,25 +102,53 @@ def load_image_files():
     files.sort()
     if len(files) > 1:
         random.shuffle(files)
-    print(f"Fallback: Found {len(files)} local images")
+    log.info("Fallback: Found %d local images", len(files))
     return files
 
+def set_coordinator(ip, port):
+    """Point the coordinator clients at a discovered address"""
+    global COORDINATOR_IP, COORDINATOR_PORT
+    if not DISCOVER_COORDINATOR:
+        return
+    COORDINATOR_IP, COORDINATOR_PORT = ip, port
+    if tile_store:
+        tile_store.base_url = f"http://{ip}:{port}"
+
+beacon = BeaconListener(DISCOVERY_GROUP, DISPLAY_ID, on_coordinator=set_coordinator) if USE_COORDINATOR and DISCOVERY_GROUP else None
+
+def tile_sync_loop():
+    """Keep the local tile store in step with the coordinator's manifest"""
+    while True:
+        try:
+            changed, fetched = tile_store.sync()
+            if changed or fetched:
+                log.info("Tile sync: %d manifest changes, %d tiles fetched", changed, fetched)
+        except Exception as e:
+            log.warning("Tile sync failed: %s", e)
+        time.sleep(TILE_SYNC_INTERVAL)
+
 def load_and_resize_image(filename):
     """Load an image by filename and resize it to 32x32 for the LED matrix"""
     try:
         # Allow subfolders, but sanitize to prevent directory traversal
         safe_path = os.path.normpath(filename).lstrip(os.sep)
+        # The coordinator's tile for a path wins, so all displays show the same pixels
+        tile = tile_store.load(safe_path) if tile_store else None
+        if tile is not None:
+            IMAGE_READS.labels("cas").inc()
+            return tile
         image_path = os.path.join(EXHIBITION_FOLDER, safe_path)
-        print(f"Trying to load image: {image_path}")
+        log.debug("Trying to load image: %s", image_path)
         img = cv2.imread(image_path)
+        IMAGE_READS.labels("file").inc()
         if img is None:
-            print(f"Failed to load image: {image_path}")
+            log.warning("Failed to load image: %s", image_path)
             return None
         # Resize to 32x32 for each screen
         resized = cv2.resize(img, (32, 32), interpolation=cv2.INTER_AREA)
         return resized
     except Exception as e:
-        print(f"Error processing image {filename}: {e}")
+        log.warning("Error processing image %s: %s", filename, e)
         return None
 
 def update_images():
@@ -125,7 +177,7 @@ def update_images():
                         loaded_filenames[screen] = None
         else:
             fallback_fail_count += 1
-            print(f"Coordinator unavailable, fail count: {fallback_fail_count}")
+            log.warning("Coordinator unavailable, fail count: %d", fallback_fail_count)
             if fallback_fail_count >= 4:
                 # Only start fallback after 4 consecutive failures
                 if fallback_start_time is None:
@@ -193,7 +245,7 @@ def create_matrix_image():
         matrix_img = np.concatenate(screen_images, axis=1) 
         matrix_img = cv2.rotate(matrix_img, cv2.ROTATE_180)
         matrix_img_rgb = cv2.cvtColor(matrix_img, cv2.COLOR_BGR2RGB)
-        return Image.fromarray(matrix_img_rgb)
+        return Image.fromarray(panel_quantizer.apply(matrix_img_rgb))
 
 def matrix_loop():
     """Main loop for the RGB matrix display"""
@@ -206,7 +258,7 @@ def matrix_loop():
         options.hardware_mapping = 'adafruit-hat'
         options.brightness = 50
         matrix = RGBMatrix(options=options)
-        print("Starting RGB matrix display in DEDICATED 4-COLOR TEST PATTERN mode...")
+        log.info("Starting RGB matrix display in DEDICATED 4-COLOR TEST PATTERN mode...")
         test_img = np.zeros((32, 128, 3), dtype=np.uint8)  # 4 panels wide
         # Create test pattern for 4 panels
         test_img[0:16, 0:32] = [255, 0, 0]     # Panel 1: red
@@ -227,19 +279,19 @@ def matrix_loop():
         options.chain_length = 4  # Always 4 panels
         options.multiplexing = 6
         options.hardware_mapping = 'adafruit-hat'
-        options.brightness = 30
+        options.brightness = PANEL_BRIGHTNESS
         # anti flickering stuff
         options.pwm_lsb_nanoseconds = 490
         options.gpio_slowdown = 4
-        options.pwm_bits = 8
+        options.pwm_bits = PWM_BITS
         matrix = RGBMatrix(options=options)
         
-        print(f"Starting RGB matrix display (Display ID: {DISPLAY_ID})...")
+        log.info("Starting RGB matrix display (Display ID: %d)...", DISPLAY_ID)
         if USE_COORDINATOR:
-            print(f"Using coordinator at {COORDINATOR_IP}:{COORDINATOR_PORT}")
+            log.info("Using coordinator at %s:%d", COORDINATOR_IP, COORDINATOR_PORT)
         else:
-            print("Using local image cycling")
-        print("Press Ctrl+C to exit")
+            log.info("Using local image cycling")
+        log.info("Press Ctrl+C to exit")
         
         # Initial image load
         update_images()
@@ -256,34 +308,43 @@ def matrix_loop():
                     matrix_image = create_matrix_image()
                     matrix.SetImage(matrix_image)
                 except Exception as e:
-                    print(f"Error setting matrix image: {e}")
+                    log.warning("Error setting matrix image: %s", e)
+                FRAME_SECONDS.observe(time.time() - current_time)
                 
                 time.sleep(0.1)
                 
         except KeyboardInterrupt:
-            print("\nExiting...")
+            log.info("Exiting...")
         finally:
             matrix.Clear()
 
 def main():
     """Main function"""
-    print("JPG Cycle App for 4-Panel RGB Matrix (Client Mode)")
-    print(f"Exhibition folder: {EXHIBITION_FOLDER}")
-    print(f"Display ID: {DISPLAY_ID}")
+    setup_logging()
+    log.info("JPG Cycle App for 4-Panel RGB Matrix (Client Mode)")
+    log.info("Exhibition folder: %s", EXHIBITION_FOLDER)
+    log.info("Display ID: %d", DISPLAY_ID)
     
     if USE_COORDINATOR:
-        print(f"Coordinator mode: {COORDINATOR_IP}:{COORDINATOR_PORT}")
+        log.info("Coordinator mode: %s:%d", COORDINATOR_IP, COORDINATOR_PORT)
     else:
-        print("Local cycling mode")
+        log.info("Local cycling mode")
     
     # Check if exhibition folder exists
     if not os.path.exists(EXHIBITION_FOLDER):
-        print(f"Creating exhibition folder: {EXHIBITION_FOLDER}")
+        log.info("Creating exhibition folder: %s", EXHIBITION_FOLDER)
         os.makedirs(EXHIBITION_FOLDER, exist_ok=True)
         if not USE_COORDINATOR:
-            print("Please add JPG images to the exhibition folder and restart the app.")
+            log.error("Please add JPG images to the exhibition folder and restart the app.")
             return
     
+    if tile_store:
+        threading.Thread(target=tile_sync_loop, daemon=True).start()
+    if beacon is not None:
+        threading.Thread(target=beacon.listen, daemon=True).start()
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT, routes={"/logs": logs_route})
+
     # Start the matrix loop
     matrix_loop()
 
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Asyncio client runtime for the 4-panel display.
+Behaves like jpg_cycle_app.py, but coordinator polling, image loading and the
+display refresh run as independent tasks connected by bounded queues:
+
+  coordinator task --(assignments)--> loader task --(images)--> display task
+
+Network requests and cv2.imread run on executors, so a slow coordinator or a
+slow SD card never stalls the panels. Each task records how late it woke up
+compared to its schedule and the runtime logs per-task loop lag
+periodically. Discovery beacons and the tile sync run on threads, as in
+jpg_cycle_app.py, whose module state (coordinator address, tile store) is
+shared.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import requests
+from PIL import Image
+from rgbmatrix import RGBMatrix, RGBMatrixOptions
+
+import jpg_cycle_app as client  # COORDINATOR_IP/PORT change when discovery finds the coordinator
+from jpg_cycle_app import (
+    EXHIBITION_FOLDER, DISPLAY_ID,
+    FALLBACK_FAIL_THRESHOLD, PWM_BITS, PANEL_BRIGHTNESS, METRICS_PORT, panel_quantizer,
+    load_and_resize_image, load_image_files, get_fallback_schedule,
+)
+from metrics import serve as serve_metrics
+from logs import setup_logging, logs_route
+
+log = logging.getLogger("display")
+
+NUM_SCREENS = 4
+CHECK_INTERVAL = 1.0  # seconds between coordinator polls
+REFRESH_INTERVAL = 0.5  # seconds between display refreshes
+LAG_REPORT_INTERVAL = 30.0  # seconds between loop lag reports
+REQUEST_TIMEOUT = 2
+LOCAL_CYCLE_DELAY = 120  # seconds of local fallback before its images start to change
+LOCAL_CYCLE_INTERVAL = 7  # seconds between screen changes in the local fallback
+
+class TaskLag:
+    """Rolling record of how late a periodic task woke up"""
+
+    def __init__(self, name, size=200):
+        self.name = name
+        self.samples = deque(maxlen=size)
+
+    def record(self, lag):
+        self.samples.append(lag)
+
+    def summary(self):
+        if not self.samples:
+            return f"{self.name}: no samples"
+        ordered = sorted(self.samples)
+        avg = sum(ordered) / len(ordered)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return f"{self.name}: avg {avg * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms, max {ordered[-1] * 1000:.1f} ms"
+
+async def sleep_until(deadline, lag):
+    """Sleep until a loop-time deadline and record the wake-up lag"""
+    loop = asyncio.get_running_loop()
+    delay = deadline - loop.time()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    lag.record(max(0.0, loop.time() - deadline))
+
+def put_latest(queue, item):
+    """Put an item on a bounded queue, dropping the oldest entry if it is full"""
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(item)
+
+class LocalCycle:
+    """Fallback without SCHEDULE_SEED, as in jpg_cycle_app.py: the exhibition folder's
+    images, one screen moving on every LOCAL_CYCLE_INTERVAL after LOCAL_CYCLE_DELAY"""
+
+    def __init__(self, files, now):
+        self.files = files
+        self.start = now
+        self.last_update = 0
+        self.indices = list(range(NUM_SCREENS))
+
+    def assignments(self, now):
+        if self.files and now - self.start > LOCAL_CYCLE_DELAY and now - self.last_update > LOCAL_CYCLE_INTERVAL:
+            self.last_update = now
+            screen = int(((now - self.start) // LOCAL_CYCLE_INTERVAL) % NUM_SCREENS)
+            self.indices[screen] = (self.indices[screen] + 1) % len(self.files)
+        return [self.files[i % len(self.files)] if screen < len(self.files) else None
+                for screen, i in enumerate(self.indices)]
+
+def fetch_assignments(session):
+    """Blocking coordinator request, run on the network executor"""
+    url = f"http://{client.COORDINATOR_IP}:{client.COORDINATOR_PORT}/images/{DISPLAY_ID}"
+    response = session.get(url, timeout=REQUEST_TIMEOUT, headers=client.telemetry_headers())
+    if response.status_code != 200:
+        raise requests.exceptions.RequestException(f"status {response.status_code}")
+    return response.json()['images']
+
+async def coordinator_task(assignments_queue, net_executor, lag):
+    """Poll the coordinator and forward changed assignments"""
+    loop = asyncio.get_running_loop()
+    session = requests.Session()
+    last_assignments = None
+    fail_count = 0
+    local_cycle = None
+    deadline = loop.time()
+    while True:
+        assignments = None
+        try:
+            assignments = await loop.run_in_executor(net_executor, fetch_assignments, session)
+            fail_count = 0
+            local_cycle = None
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            # KeyError/ValueError: a reply without 'images' or not JSON; must not end the gather
+            fail_count += 1
+            log.warning("Failed to connect to coordinator: %s", e)
+            schedule = None
+            if fail_count >= FALLBACK_FAIL_THRESHOLD:
+                # Scans the exhibition folder, so off the event loop like every other blocking call
+                schedule = await loop.run_in_executor(net_executor, get_fallback_schedule)
+            if schedule is not None:
+                assignments = schedule.display_images_at(DISPLAY_ID, time.time())
+            elif fail_count >= FALLBACK_FAIL_THRESHOLD:
+                if local_cycle is None:
+                    files = await loop.run_in_executor(net_executor, load_image_files)
+                    local_cycle = LocalCycle(files, time.time())
+                assignments = local_cycle.assignments(time.time())
+        if assignments is not None and assignments != last_assignments:
+            last_assignments = assignments
+            put_latest(assignments_queue, list(assignments))
+            log.info("Assignments: %s", [f[:20] + '...' if f and len(f) > 20 else f for f in assignments])
+        deadline = max(deadline + CHECK_INTERVAL, loop.time())
+        await sleep_until(deadline, lag)
+
+async def loader_task(assignments_queue, images_queue, io_executor, lag):
+    """Decode newly assigned images off the event loop"""
+    loop = asyncio.get_running_loop()
+    images = [None] * NUM_SCREENS
+    loaded = [None] * NUM_SCREENS
+    while True:
+        assignments = await assignments_queue.get()
+        start = loop.time()
+        for screen in range(NUM_SCREENS):
+            fname = assignments[screen] if screen < len(assignments) else None
+            if not fname:
+                images[screen] = None
+                loaded[screen] = None
+            elif loaded[screen] != fname:
+                images[screen] = await loop.run_in_executor(io_executor, load_and_resize_image, fname)
+                loaded[screen] = fname
+        lag.record(loop.time() - start)
+        # What the screens show, for the telemetry in polls and beacon replies
+        with client.image_lock:
+            client.loaded_filenames[:] = loaded
+            client.current_images[:] = images
+        put_latest(images_queue, list(images))
+
+def compose_matrix_image(images, canvas):
+    """Lay out the screen images like create_matrix_image() in jpg_cycle_app.py"""
+    for i in range(NUM_SCREENS):
+        if images[i] is not None:
+            canvas[:, i * 32:(i + 1) * 32] = cv2.rotate(images[i], cv2.ROTATE_90_COUNTERCLOCKWISE)
+        else:
+            canvas[:, i * 32:(i + 1) * 32] = 0
+    matrix_img = cv2.rotate(canvas, cv2.ROTATE_180)
+    return Image.fromarray(panel_quantizer.apply(cv2.cvtColor(matrix_img, cv2.COLOR_BGR2RGB)))
+
+async def display_task(matrix, images_queue, lag):
+    """Refresh the panels at a fixed rate; never waits on network or disk"""
+    loop = asyncio.get_running_loop()
+    images = [None] * NUM_SCREENS
+    canvas = np.zeros((32, 32 * NUM_SCREENS, 3), dtype=np.uint8)
+    deadline = loop.time()
+    while True:
+        try:
+            images = images_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        try:
+            matrix.SetImage(compose_matrix_image(images, canvas))
+        except Exception as e:
+            log.warning("Error setting matrix image: %s", e)
+        deadline = max(deadline + REFRESH_INTERVAL, loop.time())
+        await sleep_until(deadline, lag)
+
+async def lag_report_task(lags):
+    """Log per-task loop lag periodically"""
+    while True:
+        await asyncio.sleep(LAG_REPORT_INTERVAL)
+        log.info("Loop lag: %s", " | ".join(lag.summary() for lag in lags))
+
+async def run(matrix):
+    """Start all client tasks and run until cancelled"""
+    assignments_queue = asyncio.Queue(maxsize=1)
+    images_queue = asyncio.Queue(maxsize=1)
+    net_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="coordinator")
+    io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="loader")
+    lags = [TaskLag("coordinator"), TaskLag("loader"), TaskLag("display")]
+    try:
+        await asyncio.gather(
+            coordinator_task(assignments_queue, net_executor, lags[0]),
+            loader_task(assignments_queue, images_queue, io_executor, lags[1]),
+            display_task(matrix, images_queue, lags[2]),
+            lag_report_task(lags),
+        )
+    finally:
+        net_executor.shutdown(wait=False)
+        io_executor.shutdown(wait=False)
+
+def main():
+    """Main function"""
+    setup_logging()
+    log.info("JPG Cycle App for 4-Panel RGB Matrix (asyncio client)")
+    log.info("Exhibition folder: %s", EXHIBITION_FOLDER)
+    log.info("Display ID: %d", DISPLAY_ID)
+    log.info("Coordinator mode: %s:%d", client.COORDINATOR_IP, client.COORDINATOR_PORT)
+
+    options = RGBMatrixOptions()
+    options.rows = 32
+    options.cols = 32
+    options.chain_length = NUM_SCREENS
+    options.hardware_mapping = 'adafruit-hat'
+    options.brightness = PANEL_BRIGHTNESS
+    options.pwm_lsb_nanoseconds = 300
+    options.gpio_slowdown = 2
+    options.pwm_bits = PWM_BITS
+    matrix = RGBMatrix(options=options)
+    if client.tile_store:
+        threading.Thread(target=client.tile_sync_loop, daemon=True).start()
+    if client.beacon is not None:
+        threading.Thread(target=client.beacon.listen, daemon=True).start()
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT, routes={"/logs": logs_route})
+
+    log.info("Press Ctrl+C to exit")
+    try:
+        asyncio.run(run(matrix))
+    except KeyboardInterrupt:
+        log.info("Exiting...")
+    finally:
+        matrix.Clear()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Live preview channel for the effect editor in app.py.
+The browser POSTs slider values to one endpoint and listens on a Server-Sent
+Events stream for rendered previews. Updates are latest-value-wins: each POST
+only replaces the pending parameters, and the stream renders whatever is
+newest at most MAX_PREVIEW_FPS times a second, so a fast drag costs a bounded
+number of renders no matter how many input events the browser fires.
+
+SSE was picked over WebSockets because it runs on the plain WSGI servers in
+serving.py with no extra dependency, the same way the MJPEG feeds do.
+"""
+
+import base64
+import json
+import threading
+import time
+
+MAX_PREVIEW_FPS = 15
+KEEPALIVE_INTERVAL = 15  # seconds between SSE comments on an idle stream
+
+class PreviewChannel:
+    """Latest-value-wins parameter slot plus a rate-capped SSE preview stream"""
+
+    def __init__(self, render, max_fps=MAX_PREVIEW_FPS):
+        self.render = render  # (path, params) -> JPEG bytes or None
+        self.min_interval = 1.0 / max_fps
+        self.cond = threading.Condition()
+        self.version = 0
+        self.pending = None  # (path, params)
+        self.updates = 0
+        self.frames_sent = 0
+
+    def update(self, path, params):
+        """Replace the pending preview request; returns its version"""
+        with self.cond:
+            self.version += 1
+            self.updates += 1
+            self.pending = (path, params)
+            self.cond.notify_all()
+            return self.version
+
+    def stream(self):
+        """SSE generator: one 'preview' event per rendered version, rate capped"""
+        seen = 0
+        last_frame = 0
+        yield "retry: 1000\n\n"
+        while True:
+            with self.cond:
+                changed = self.cond.wait_for(lambda: self.version != seen, timeout=KEEPALIVE_INTERVAL)
+            if not changed:
+                yield ": keepalive\n\n"
+                continue
+            # Let updates that arrive during the cap interval replace this one
+            delay = last_frame + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self.cond:
+                seen = self.version
+                path, params = self.pending
+            last_frame = time.monotonic()
+            data = self.render(path, params)
+            if data is None:
+                yield f"event: error\ndata: {json.dumps({'version': seen})}\n\n"
+                continue
+            self.frames_sent += 1
+            payload = {
+                'version': seen,
+                'image': "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii"),
+            }
+            yield f"event: preview\ndata: {json.dumps(payload)}\n\n"
+
+    def status(self):
+        """Counters for checking how much the channel coalesced"""
+        with self.cond:
+            return {'version': self.version, 'updates': self.updates, 'frames_sent': self.frames_sent}
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Load test for the coordinator and the webcam app.
+Simulates many display Pis polling /images/<id> on the coordinator while a
+number of browsers hold MJPEG streams open, then reports requests/sec and
+latency percentiles for the polls and frames/sec for the streams.
+
+Example:
+  python3 load_test.py --coordinator http://127.0.0.1:5001 --displays 50 \
+      --mjpeg http://127.0.0.1:5000/video_feed_mosaic --viewers 5 --duration 30
+"""
+
+import argparse
+import math
+import threading
+import time
+import requests
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+def display_worker(base_url, display_id, interval, stop_event, latencies, errors, lock):
+    """Poll /images/<display_id> like a display client does"""
+    session = requests.Session()
+    url = f"{base_url}/images/{display_id}"
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        try:
+            response = session.get(url, timeout=5)
+            elapsed = time.perf_counter() - start
+            with lock:
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(response.status_code)
+        except requests.exceptions.RequestException as e:
+            with lock:
+                errors.append(type(e).__name__)
+        if interval > 0:
+            stop_event.wait(interval)
+
+def mjpeg_worker(url, stop_event, frame_counts, index):
+    """Hold an MJPEG stream open and count the frames received"""
+    try:
+        with requests.get(url, stream=True, timeout=5) as response:
+            for chunk in response.iter_content(chunk_size=16384):
+                if stop_event.is_set():
+                    break
+                frame_counts[index] += chunk.count(b'--frame')
+    except requests.exceptions.RequestException as e:
+        print(f"MJPEG viewer {index} failed: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the coordinator and MJPEG streams")
+    parser.add_argument("--coordinator", default="http://127.0.0.1:5001", help="coordinator base URL")
+    parser.add_argument("--displays", type=int, default=50, help="number of simulated displays")
+    parser.add_argument("--num-ids", type=int, default=3, help="number of valid display ids to cycle through")
+    parser.add_argument("--interval", type=float, default=0.0,
+                        help="seconds between polls per display (0 = as fast as possible)")
+    parser.add_argument("--mjpeg", default=None, help="MJPEG stream URL, e.g. http://127.0.0.1:5000/video_feed_mosaic")
+    parser.add_argument("--viewers", type=int, default=0, help="number of concurrent MJPEG viewers")
+    parser.add_argument("--duration", type=float, default=30.0, help="test duration in seconds")
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+    frame_counts = [0] * args.viewers
+    threads = []
+
+    if args.mjpeg:
+        for i in range(args.viewers):
+            t = threading.Thread(target=mjpeg_worker, args=(args.mjpeg, stop_event, frame_counts, i), daemon=True)
+            t.start()
+            threads.append(t)
+
+    for i in range(args.displays):
+        t = threading.Thread(target=display_worker,
+                             args=(args.coordinator, i % args.num_ids, args.interval,
+                                   stop_event, latencies, errors, lock),
+                             daemon=True)
+        t.start()
+        threads.append(t)
+
+    print(f"Running {args.displays} displays and {args.viewers if args.mjpeg else 0} MJPEG viewers "
+          f"for {args.duration:.0f}s...")
+    start = time.perf_counter()
+    time.sleep(args.duration)
+    stop_event.set()
+    elapsed = time.perf_counter() - start
+
+    with lock:
+        samples = list(latencies)
+        failures = list(errors)
+
+    print("\n/images/<id> polling")
+    print(f"  requests:   {len(samples)} ok, {len(failures)} failed")
+    print(f"  throughput: {len(samples) / elapsed:.1f} req/s")
+    if samples:
+        print(f"  latency:    p50 {percentile(samples, 50) * 1000:.1f} ms, "
+              f"p90 {percentile(samples, 90) * 1000:.1f} ms, "
+              f"p99 {percentile(samples, 99) * 1000:.1f} ms, "
+              f"max {max(samples) * 1000:.1f} ms")
+    if args.mjpeg and args.viewers:
+        print("\nMJPEG viewers")
+        for i, count in enumerate(frame_counts):
+            print(f"  viewer {i}: {count / elapsed:.1f} frames/s")
+
+if __name__ == "__main__":
+    main()
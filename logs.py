@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Logging for the services and display clients, on top of the standard
+logging module:
+  - levels (LOG_LEVEL, default INFO);
+  - per-message rate limiting: the first LOG_RATE_BURST records of a message
+    template per LOG_RATE_WINDOW seconds go through, the rest are counted and
+    summarised once the window ends ("SetImage error: %s x342 in last 10s");
+  - an asynchronous, buffered writer: callers only put records on a queue, a
+    background thread writes them to stdout in one write per LOG_FLUSH_INTERVAL
+    (straight away for errors), so a fault in a frame loop doesn't turn into a
+    journal write per frame on the SD card;
+  - a ring of the last LOG_RING_SIZE records, served as JSON at /logs.
+
+Rate limiting keys on the unformatted message, so hot paths should log with
+arguments (log.warning("SetImage error: %s", e)), not f-strings.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "10"))  # seconds
+LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST", "3"))  # records per message and window; 0 disables
+LOG_RING_SIZE = int(os.getenv("LOG_RING_SIZE", "500"))  # 0 disables /logs
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1"))  # seconds
+FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+class RateLimiter(logging.Filter):
+    """Lets the first burst records of each message template through per window and counts the rest"""
+
+    def __init__(self, window=LOG_RATE_WINDOW, burst=LOG_RATE_BURST):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.messages = {}  # {(logger, level, template): [window start, passed, suppressed, last record]}
+        self.due = []  # summaries of windows that ended when the message came back
+        self.suppressed_total = 0
+
+    def filter(self, record):
+        if not self.burst or getattr(record, "summary", False):
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = record.created
+        with self.lock:
+            entry = self.messages.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                if entry is not None and entry[2]:
+                    self.due.append(self._summary(entry, now))
+                self.messages[key] = [now, 1, 0, None]
+                return True
+            if entry[1] < self.burst:
+                entry[1] += 1
+                return True
+            entry[2] += 1
+            entry[3] = record
+            self.suppressed_total += 1
+            return False
+
+    def _summary(self, entry, now):
+        last = entry[3]
+        summary = logging.LogRecord(last.name, last.levelno, last.pathname, last.lineno,
+                                    "%s x%d in last %ds",
+                                    (last.getMessage(), entry[2], round(now - entry[0])), None)
+        summary.summary = True
+        return summary
+
+    def expire(self, now=None, everything=False):
+        """Summary records for the windows that have ended with suppressed records
+        (every window with suppressed records when everything is set, e.g. at exit)"""
+        now = time.time() if now is None else now
+        with self.lock:
+            summaries, self.due = self.due, []
+            for key, entry in list(self.messages.items()):
+                if now - entry[0] < self.window and not everything:
+                    continue
+                del self.messages[key]
+                if entry[2]:
+                    summaries.append(self._summary(entry, now))
+        return summaries
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """Collects lines and writes them together, every flush interval or straight away from flush_level"""
+
+    def __init__(self, stream=None, interval=LOG_FLUSH_INTERVAL, flush_level=logging.ERROR):
+        super().__init__(stream)
+        self.interval = interval
+        self.flush_level = flush_level
+        self.pending = []
+        self.last_flush = time.time()
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            self.pending.append(line)
+        if record.levelno >= self.flush_level or time.time() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            data = "\n".join(self.pending) + "\n"
+            self.pending = []
+            self.last_flush = time.time()
+            try:
+                self.stream.write(data)
+                self.stream.flush()
+            except Exception:
+                pass
+
+class RingHandler(logging.Handler):
+    """The last size records, as dicts, for /logs"""
+
+    def __init__(self, size=LOG_RING_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=size)
+
+    def emit(self, record):
+        entry = {'time': record.created, 'level': record.levelname, 'logger': record.name,
+                 'message': record.getMessage()}
+        with self.lock:
+            self.records.append(entry)
+
+    def query(self, since=0, level=None):
+        """Records after unix time since, at level or above"""
+        minimum = logging.getLevelName(level.upper()) if level else 0
+        if not isinstance(minimum, int):
+            minimum = 0
+        with self.lock:
+            return [r for r in self.records
+                    if r['time'] > since and logging.getLevelName(r['level']) >= minimum]
+
+rate_limiter = None
+ring = None
+
+def setup_logging(level=LOG_LEVEL, ring_size=LOG_RING_SIZE):
+    """Route the root logger through the rate limiter and the background writer; call once from main"""
+    global rate_limiter, ring
+    if rate_limiter is not None:
+        return ring
+    rate_limiter = RateLimiter()
+    records = queue.SimpleQueue()
+    queue_handler = QueueHandler(records)
+    queue_handler.addFilter(rate_limiter)
+    stream = BufferedStreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter(FORMAT))
+    handlers = [stream]
+    if ring_size:
+        ring = RingHandler(ring_size)
+        handlers.append(ring)
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+    # Library chatter (requests' connection pool, the Flask dev server's request lines)
+    # isn't worth the SD card writes
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+
+    def maintain():
+        while True:
+            time.sleep(min(LOG_FLUSH_INTERVAL, rate_limiter.window / 2 or 1))
+            for summary in rate_limiter.expire():
+                queue_handler.handle(summary)
+            stream.flush()
+
+    def shutdown():
+        # The writer threads are daemons: write out what is still queued or buffered,
+        # so the last lines before an exit (or a crash) aren't lost
+        listener.stop()
+        for summary in rate_limiter.expire(everything=True):
+            for handler in handlers:
+                handler.handle(summary)
+        stream.flush()
+
+    threading.Thread(target=maintain, daemon=True).start()
+    atexit.register(shutdown)
+    return ring
+
+def logs_json(args):
+    """Body of GET /logs?since=<unix time>&level=<name> from the ring"""
+    if ring is None:
+        return json.dumps({'error': 'log ring disabled'})
+    try:
+        since = float(args.get('since') or 0)
+    except ValueError:
+        since = 0
+    return json.dumps({'records': ring.query(since, args.get('level')),
+                       'suppressed': rate_limiter.suppressed_total if rate_limiter else 0})
+
+def logs_route(query):
+    """/logs for metrics.serve(routes=...)"""
+    return "application/json", logs_json(query)
+
+def install_flask(app):
+    """Serve the ring at GET /logs from a Flask app"""
+    from flask import Response, request
+
+    @app.route("/logs")
+    def logs_endpoint():
+        return Response(logs_json(request.args), mimetype="application/json")
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Process metrics in the Prometheus text format, shared by app.py,
+image_coordinator.py and the display clients.
+Counters, gauges and fixed-bucket histograms register in one registry per
+process. Labelled metrics hand out a child per label set, which hot paths
+look up once and keep, so an update is a lock and an add (a histogram also
+bisects its bucket bounds) without any label handling.
+
+Serving:
+  - install_flask(app) adds GET /metrics to a Flask app and times every
+    request per route (for streaming routes this is the time to the first byte);
+  - serve(port) runs a tiny HTTP listener for the headless display clients.
+
+TimedLock wraps a lock and records how long each acquire waited and, optionally,
+how long the lock was held.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# Seconds; suits frame loops, encodes, lock waits and request latencies alike
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+log = logging.getLogger(__name__)
+
+def _format_value(value):
+    if value is None or value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Registry:
+    """The metrics (and extra line collectors) one process exposes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        with self.lock:
+            if any(m.name == metric.name for m in self.metrics):
+                raise ValueError(f"Duplicate metric {metric.name}")
+            self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """collect() returns exposition lines (with their own HELP/TYPE) to append on each scrape"""
+        with self.lock:
+            self.collectors.append(collect)
+
+    def render(self):
+        """The whole registry in Prometheus text format"""
+        with self.lock:
+            metrics = list(self.metrics)
+            collectors = list(self.collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collect in collectors:
+            try:
+                lines.extend(collect())
+            except Exception as e:
+                lines.append(f"# collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+        self.function = None
+        if not self.labelnames:
+            self._default = self._new_child()
+            self.children[()] = self._default
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        """The child for one set of label values (keep it on hot paths)"""
+        values = tuple(str(v) for v in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead; it may return a number
+        or, for labelled metrics, {label values tuple: number}"""
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            value = self.function()
+            if not isinstance(value, dict):
+                value = {(): value}
+            return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+                    for k, v in sorted(value.items())]
+        with self.lock:
+            children = sorted(self.children.items())
+        lines = []
+        for values, child in children:
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+class _Value:
+    __slots__ = ("lock", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+class Counter(_Metric):
+    """Monotonic count; name it ..._total"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+class _Buckets:
+    __slots__ = ("lock", "bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.lock = threading.Lock()
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the time its block takes"""
+        return _Timer(self)
+
+    def samples(self, name, labelnames, values):
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.bounds + (float("inf"),), counts):
+            cumulative += n
+            le = (("le", _format_value(bound)),)
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {count}")
+        return lines
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, plus their sum and count"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames, registry)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+class TimedLock:
+    """A lock that records how long each acquire waited (and optionally how long
+    the lock was then held) in histogram children"""
+
+    def __init__(self, wait_histogram, lock=None, hold=None):
+        self.lock = lock or threading.Lock()
+        self.wait = wait_histogram
+        self.hold = hold
+        self.acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        now = time.perf_counter()
+        self.wait.observe(now - start)
+        if acquired:
+            self.acquired_at = now
+        return acquired
+
+    def release(self):
+        held = time.perf_counter() - self.acquired_at
+        self.lock.release()
+        if self.hold is not None:
+            self.hold.observe(held)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+def install_flask(app, prefix, registry=REGISTRY):
+    """Serve /metrics from a Flask app and time its requests per route"""
+    from flask import Response, request, g
+
+    latency = Histogram(f"{prefix}_http_request_duration_seconds",
+                        "Request handling time by route (time to first byte for streams)",
+                        ("route", "method", "status"), registry=registry)
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            latency.labels(route, request.method, response.status_code).observe(time.perf_counter() - start)
+        return response
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return Response(registry.render(), mimetype=CONTENT_TYPE)
+
+    return latency
+
+def serve(port, host="0.0.0.0", registry=REGISTRY, routes=None):
+    """Serve GET /metrics on a background thread (for processes without a web app).
+    routes adds other paths: {path: function(query dict) returning (content type, body)}"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/metrics":
+                content_type, body = CONTENT_TYPE, registry.render()
+            elif routes and url.path in routes:
+                content_type, body = routes[url.path](dict(parse_qsl(url.query)))
+            else:
+                self.send_error(404)
+                return
+            body = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes every few seconds would drown the console
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info("Metrics on http://%s:%d/metrics", host, port)
+    return server
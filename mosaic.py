@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Mosaic generation shared by app.py's live view, scanner previews and edit
+sessions.
+The 32x32 cell grid is computed once per frame with INTER_AREA, which
+averages every source pixel into its cell (INTER_LINEAR only samples a 2x2
+neighbourhood when shrinking 180->32, so fine detail aliases and flickers as
+the camera moves). The same grid is what the panels show, and the browser
+mosaic is a blocky upscale of it, built with np.repeat from cached per-cell
+pixel counts (the same mapping as INTER_NEAREST, without a second resize).
+
+Grid sizes are configurable: build_pyramid() makes several levels (64, 32,
+16, 8 cells by default) in one pass, and each output picks its level. The
+chained panels follow a layout (see parse_panel_layout), so each panel can
+show a different zoom level or crop of the same frame.
+"""
+
+from functools import lru_cache
+import cv2
+import numpy as np
+from PIL import Image
+
+GRID_SIZE = 32
+
+def square_crop(img):
+    """Centre square crop of a frame (a view, no copy)"""
+    h, w = img.shape[:2]
+    min_dim = min(h, w)
+    start_x = max((w - min_dim) // 2, 0)
+    start_y = max((h - min_dim) // 2, 0)
+    return img[start_y:start_y+min_dim, start_x:start_x+min_dim]
+
+def block_grid(img, cells=GRID_SIZE):
+    """cells x cells block average of an image"""
+    return cv2.resize(img, (cells, cells), interpolation=cv2.INTER_AREA)
+
+@lru_cache(maxsize=16)
+def _cell_counts(size, cells):
+    """How many output pixels each cell covers along an axis (INTER_NEAREST's mapping)"""
+    index = np.minimum((np.arange(size) * cells) // size, cells - 1)
+    return np.bincount(index, minlength=cells)
+
+def upscale(grid, size):
+    """Blocky size x size image of a grid, for encoding"""
+    counts = _cell_counts(size, grid.shape[0])
+    # Repeating columns on the 32-row grid, then whole rows, is a pair of
+    # block copies; this measured faster than cv2.resize(INTER_NEAREST) and
+    # than reshaping an np.broadcast_to view (which has to copy for imencode)
+    return np.repeat(np.repeat(grid, counts, axis=1), counts, axis=0)
+
+def build_mosaic(img, cells=GRID_SIZE):
+    """(grid, mosaic) for a frame: the cell grid and its upscale to the crop size"""
+    cropped = square_crop(img)
+    grid = block_grid(cropped, cells)
+    return grid, upscale(grid, cropped.shape[0])
+
+# --- Pyramid and panel layout ---
+
+PYRAMID_LEVELS = (64, 32, 16, 8)
+PANEL_SIZE = 32
+
+def build_pyramid(img, levels=PYRAMID_LEVELS):
+    """{cells: grid} for each level. Only the largest level is resized from the
+    image; each smaller one is block-averaged from the level above when it
+    divides evenly (an integer INTER_AREA, which is cheap)."""
+    pyramid = {}
+    prev = None
+    for cells in sorted(set(levels), reverse=True):
+        src = prev if prev is not None and prev.shape[0] % cells == 0 else img
+        pyramid[cells] = prev = block_grid(src, cells)
+    return pyramid
+
+def parse_panel_layout(spec, chain=4):
+    """Parse a layout like '32,64:16:16,16,8' into one (cells, offset) per chained panel.
+    Each entry is a pyramid level, optionally with the x:y cell offset of the
+    panel's window into that level (centred by default). Missing entries
+    repeat the last one."""
+    layout = []
+    for entry in spec.split(","):
+        parts = [int(p) for p in entry.strip().split(":")]
+        if len(parts) not in (1, 3):
+            raise ValueError(f"Bad panel layout entry: {entry!r}")
+        layout.append((parts[0], tuple(parts[1:]) if len(parts) == 3 else None))
+    layout = layout[:chain]
+    layout += [layout[-1]] * (chain - len(layout))
+    return layout
+
+def layout_levels(layout):
+    """Pyramid levels a panel layout reads from"""
+    return {cells for cells, _ in layout}
+
+def render_panel(pyramid, cells, offset=None, panel=PANEL_SIZE):
+    """One panel's frame from a pyramid level: a window into larger levels, a blocky upscale of smaller ones"""
+    grid = pyramid[cells]
+    if cells > panel:
+        if offset is None:
+            offset = ((cells - panel) // 2, (cells - panel) // 2)
+        x = min(max(offset[0], 0), cells - panel)
+        y = min(max(offset[1], 0), cells - panel)
+        return grid[y:y+panel, x:x+panel]
+    if cells < panel:
+        return upscale(grid, panel)
+    return grid
+
+def compose_panels(pyramid, layout, panel=PANEL_SIZE):
+    """Chained panel frame (panel x panel*len(layout)) for a layout; repeated entries are rendered once"""
+    rendered = {}
+    frames = []
+    for cells, offset in layout:
+        key = (cells, offset)
+        if key not in rendered:
+            rendered[key] = render_panel(pyramid, cells, offset, panel)
+        frames.append(rendered[key])
+    return np.concatenate(frames, axis=1)
+
+class PanelFramebuffer:
+    """Preallocated pyramid and chained-panel frame for the live view.
+    Every frame is written in place: each level is resized into its own
+    buffer (cv2.resize dst=), panels are copied into their slots with slice
+    assignment, the colour conversion runs in place, and the frame is decoded
+    into one persistent PIL image for SetImage. Nothing image-sized is
+    allocated per frame.
+
+    Image.frombuffer can't share this memory: PIL keeps RGB images at 4 bytes
+    per pixel and only maps 4-byte layouts (as mode RGBX, which SetImage
+    rejects), so image.frombytes() into the existing image is the cheapest
+    hand-off."""
+
+    def __init__(self, layout, levels=(), panel=PANEL_SIZE):
+        self.layout = layout
+        self.panel = panel
+        self.levels = sorted(set(levels) | layout_levels(layout), reverse=True)
+        self.grids = {cells: np.empty((cells, cells, 3), np.uint8) for cells in self.levels}
+        self.frame = np.empty((panel, panel * len(layout), 3), np.uint8)
+        self.slots = [self.frame[:, i*panel:(i+1)*panel] for i in range(len(layout))]
+        self.image = Image.new("RGB", (self.frame.shape[1], self.frame.shape[0]))
+
+    def update_pyramid(self, img):
+        """Block-average img into every level's buffer"""
+        prev = None
+        for cells in self.levels:
+            src = prev if prev is not None and prev.shape[0] % cells == 0 else img
+            cv2.resize(src, (cells, cells), dst=self.grids[cells], interpolation=cv2.INTER_AREA)
+            prev = self.grids[cells]
+
+    def _fill_slot(self, slot, cells, offset):
+        grid = self.grids[cells]
+        panel = self.panel
+        if cells > panel:
+            if offset is None:
+                offset = ((cells - panel) // 2, (cells - panel) // 2)
+            x = min(max(offset[0], 0), cells - panel)
+            y = min(max(offset[1], 0), cells - panel)
+            slot[...] = grid[y:y+panel, x:x+panel]
+        elif cells < panel and panel % cells:
+            slot[...] = upscale(grid, panel)
+        elif cells < panel:
+            f = panel // cells
+            # Splitting the slot's axes is still a view, so the broadcast writes straight into the frame
+            slot.reshape(cells, f, cells, f, 3)[...] = grid[:, None, :, None]
+        else:
+            slot[...] = grid
+
+    def render(self, effect=None):
+        """Compose the panels from the current pyramid; returns the (reused) PIL image.
+        effect(frame, out) may rewrite the composed BGR frame in place (temporal.py)"""
+        # Each slot is filled from its grid: copying one slot of the frame into
+        # another would make numpy allocate a temporary for the overlap check
+        for slot, (cells, offset) in zip(self.slots, self.layout):
+            self._fill_slot(slot, cells, offset)
+        if effect is not None:
+            effect(self.frame, self.frame)
+        cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB, dst=self.frame)
+        self.image.frombytes(self.frame)
+        return self.image
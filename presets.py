@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Named, versioned effect presets for app.py.
+Each preset is one JSON file in PRESETS_DIR ({"name", "version", "params",
+"updated"}); saving a name again bumps its version.
+
+The parameters in use are held as a Preset: the parameters plus their
+effect chain compiled once (effects.compile_effects). app.py swaps the
+whole Preset by reference when anything changes, so the frame loops just
+call preset.stream.apply(frame) without parsing parameters or taking a lock.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+from effects import DEFAULT_PARAMS, compile_effects, parse_effect_params
+
+PRESETS_DIR = os.getenv("PRESETS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "presets"))
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+# params: the effect chain's keys (what EditSession renders with)
+# pipeline: that chain compiled; stream: brightness/contrast/saturation and blur,
+# the subset the webcam effect stream has always applied
+Preset = namedtuple("Preset", "name version params blur pipeline stream")
+
+def parse_preset_params(source):
+    """Effect chain parameters plus the effect stream's blur radius"""
+    params = parse_effect_params(source)
+    params["blur"] = max(0, int(source.get("blur", 0)))
+    return params
+
+def compile_preset(params, name=None, version=0):
+    """Preset for params (with or without blur); name None means unsaved edits"""
+    params = parse_preset_params(params)
+    blur = params.pop("blur")
+    stream = compile_effects(dict(params, hue_shift=0, colorize=0, invert=0, blur=blur))
+    return Preset(name, version, params, blur, compile_effects(params), stream)
+
+DEFAULT_PRESET = compile_preset(DEFAULT_PARAMS)
+
+def edit_preset(preset, changes):
+    """preset with some parameters changed; the same object if nothing changed"""
+    params = dict(preset.params, blur=preset.blur)
+    params.update(changes)
+    edited = compile_preset(params)
+    if edited.params == preset.params and edited.blur == preset.blur:
+        return preset
+    return edited
+
+def preset_params(preset):
+    """A Preset's parameters as saved in a preset file"""
+    return dict(preset.params, blur=preset.blur)
+
+class PresetStore:
+    """The preset files in one folder"""
+
+    def __init__(self, folder=PRESETS_DIR):
+        self.folder = folder
+        self.lock = threading.Lock()
+
+    def _path(self, name):
+        if not NAME_PATTERN.match(name or ""):
+            raise ValueError(f"Invalid preset name {name!r}")
+        return os.path.join(self.folder, name + ".json")
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self):
+        """All presets, sorted by name"""
+        try:
+            files = sorted(f for f in os.listdir(self.folder) if f.endswith(".json"))
+        except OSError:
+            return []
+        records = (self._read(os.path.join(self.folder, f)) for f in files)
+        return [r for r in records if r is not None]
+
+    def get(self, name):
+        """The preset record, or None"""
+        return self._read(self._path(name))
+
+    def save(self, name, params):
+        """Write a preset, bumping its version; returns the record"""
+        path = self._path(name)
+        with self.lock:
+            previous = self._read(path)
+            record = {
+                "name": name,
+                "version": (previous["version"] + 1) if previous else 1,
+                "params": parse_preset_params(params),
+                "updated": time.time(),
+            }
+            os.makedirs(self.folder, exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(record, f, indent=1)
+            os.replace(tmp_path, path)
+        return record
+
+    def delete(self, name):
+        """Remove a preset; False if it didn't exist"""
+        path = self._path(name)
+        with self.lock:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def compile(self, name):
+        """Preset for a saved name, or None"""
+        record = self.get(name)
+        if record is None:
+            return None
+        return compile_preset(record["params"], record["name"], record["version"])
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Cached renderer for the editor's processed_mosaic preview.
+Slider drags request a new preview on every input event. Instead of reading
+the image from disk and running the effect chain on it each time, this keeps
+the decoded source in memory (already resized to the preview's display size),
+caches encoded JPEGs in an LRU keyed by (file, mtime, size, quantized params),
+and lets concurrent requests for the same key share one render.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+import cv2
+
+from effects import apply_effects
+
+MAX_RESPONSES = 256
+MAX_SOURCES = 8
+PARAM_STEP = 0.02  # brightness/contrast/saturation are rendered in these steps
+MIN_PREVIEW_SIZE = 32
+
+def quantize_params(params):
+    """Round float params to PARAM_STEP so near-identical slider positions share a render"""
+    q = dict(params)
+    for key in ("brightness", "contrast", "saturation"):
+        q[key] = round(round(params[key] / PARAM_STEP) * PARAM_STEP, 4)
+    q["hue_shift"] = int(params["hue_shift"]) % 180
+    q["colorize"] = 1 if params["colorize"] else 0
+    q["invert"] = 1 if params["invert"] else 0
+    return q
+
+class PreviewRenderer:
+    """Source cache + response LRU + in-flight request coalescing"""
+
+    def __init__(self, max_responses=MAX_RESPONSES, max_sources=MAX_SOURCES):
+        self.max_responses = max_responses
+        self.max_sources = max_sources
+        self.sources = OrderedDict()  # (path, size) -> (mtime, image)
+        self.responses = OrderedDict()  # key -> jpeg bytes
+        self.in_flight = {}  # key -> threading.Event
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.source_reads = 0  # images decoded from disk
+
+    def _source(self, path, mtime, size):
+        """Decoded source, downscaled once to the preview size"""
+        key = (path, size)
+        with self.lock:
+            cached = self.sources.get(key)
+            if cached is not None and cached[0] == mtime:
+                self.sources.move_to_end(key)
+                return cached[1]
+        img = cv2.imread(path)
+        self.source_reads += 1
+        if img is None:
+            return None
+        if size and size < max(img.shape[:2]):
+            scale = size / max(img.shape[:2])
+            img = cv2.resize(img, (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale))),
+                             interpolation=cv2.INTER_AREA)
+        with self.lock:
+            self.sources[key] = (mtime, img)
+            self.sources.move_to_end(key)
+            while len(self.sources) > self.max_sources:
+                self.sources.popitem(last=False)
+        return img
+
+    def render(self, path, params, size=None):
+        """JPEG bytes of the effect chain applied to path, or None if it can't be read"""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        if size is not None:
+            size = max(MIN_PREVIEW_SIZE, int(size))
+        q = quantize_params(params)
+        key = (path, mtime, size, tuple(sorted(q.items())))
+
+        while True:
+            with self.lock:
+                data = self.responses.get(key)
+                if data is not None:
+                    self.responses.move_to_end(key)
+                    self.hits += 1
+                    return data
+                event = self.in_flight.get(key)
+                if event is None:
+                    # This request renders; identical ones wait for it
+                    event = threading.Event()
+                    self.in_flight[key] = event
+                    self.misses += 1
+                    break
+            event.wait()
+            with self.lock:
+                if key not in self.responses and key not in self.in_flight:
+                    return None  # the render we waited for failed
+
+        data = None
+        try:
+            img = self._source(path, mtime, size)
+            if img is not None:
+                ok, buffer = cv2.imencode('.jpg', apply_effects(img, q))
+                if ok:
+                    data = buffer.tobytes()
+        finally:
+            with self.lock:
+                if data is not None:
+                    self.responses[key] = data
+                    while len(self.responses) > self.max_responses:
+                        self.responses.popitem(last=False)
+                del self.in_flight[key]
+            event.set()
+        return data
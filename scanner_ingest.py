@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Background ingest of scanner uploads for app.py.
+Uploads are queued as jobs and processed on a small worker pool, so the HTTP
+request returns a job id straight away. Each job decodes the scan at reduced
+resolution first (libjpeg DCT scaling via cv2.IMREAD_REDUCED_COLOR_*), publishes
+the 180x180 preview, and only then decodes at full resolution to write the
+archival crop.
+
+Threads are used rather than processes: cv2 releases the GIL while decoding
+and resizing, and the preview has to be handed back to app.py's globals.
+
+Scans arrive as spool files on disk (see SpoolingRequest in app.py) and are
+never read into memory whole: the preview decode reads a memory-mapped view
+of the file, and the archival decode only covers the crop region. For JPEG
+that means decoding stops after the crop's last row; for uncompressed TIFF
+only the crop's rows are read. Other formats fall back to a full decode.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+PREVIEW_SIZE = 180
+INGEST_WORKERS = 1  # one scan at a time keeps peak memory bounded on a 1 GB Pi
+MAX_FINISHED_JOBS = 50
+
+# A4 auto-crop region, in cm from the top-left of the scan
+A4_WIDTH_CM = 21.0
+CROP_LEFT_CM = 4.3
+CROP_TOP_CM = 1.4
+CROP_SIZE_CM = 11.8
+
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+def a4_crop_box(w, h):
+    """Crop box (left, top, right, bottom) of the drawing area on an A4 scan, or None"""
+    pixels_per_cm = w / A4_WIDTH_CM
+    left = int(CROP_LEFT_CM * pixels_per_cm)
+    top = int(CROP_TOP_CM * pixels_per_cm)
+    size = int(CROP_SIZE_CM * pixels_per_cm)
+    right = min(left + size, w)
+    bottom = min(top + size, h)
+    if right > left and bottom > top and left >= 0 and top >= 0:
+        return left, top, right, bottom
+    return None
+
+def crop_to_box(img, box, scale=1):
+    """Apply a full-resolution crop box to an image decoded at 1/scale"""
+    if box is None:
+        return img
+    left, top, right, bottom = (v // scale for v in box)
+    cropped = img[top:bottom, left:right]
+    if cropped.shape[0] > 0 and cropped.shape[1] > 0:
+        return cropped
+    return img
+
+def center_square(img):
+    """Centre square crop of an image"""
+    min_dim = min(img.shape[:2])
+    start_x = max((img.shape[1] - min_dim) // 2, 0)
+    start_y = max((img.shape[0] - min_dim) // 2, 0)
+    return img[start_y:start_y+min_dim, start_x:start_x+min_dim]
+
+def pick_reduction(crop_size, target=PREVIEW_SIZE):
+    """Largest DCT reduction that still leaves the crop at least target pixels wide"""
+    for factor, flag in REDUCED_FLAGS:
+        if crop_size // factor >= target:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+def image_header(path):
+    """Read (format, (width, height)) from the image header without decoding pixels"""
+    try:
+        with Image.open(path) as im:
+            return im.format, im.size
+    except Exception:
+        return None, None
+
+def _load_first_rows(im):
+    """Load a JPEG whose tile was cut short to its first rows.
+
+    Pillow (tested with 12.3) decodes the rows and clears im.tile before it
+    reports the scanlines libjpeg was stopped short of as an error, so that
+    last error is ignored here; an error with the tile still set is a real one.
+    Unlike ImageFile.LOAD_TRUNCATED_IMAGES this leaves other decoders alone.
+    """
+    try:
+        im.load()
+    except OSError:
+        if im.tile:
+            raise
+
+def decode_roi(path, box):
+    """Decode just the crop box of an image file at full resolution, as BGR.
+    The JPEG and raw shortcuts rewrite im.tile and im._size, which Pillow keeps
+    as (decoder, extents, offset, args) tuples; anything else is decoded whole"""
+    with Image.open(path) as im:
+        w, h = im.size
+        left, top, right, bottom = box if box else (0, 0, w, h)
+        tile = im.tile[0] if len(im.tile) == 1 else None
+
+        if tile and im.format == "JPEG":
+            # libjpeg emits rows top to bottom: stop after the crop's last row
+            im.tile = [(tile[0], (0, 0, w, bottom)) + tuple(tile[2:])]
+            im._size = (w, bottom)
+            _load_first_rows(im)
+        elif tile and tile[0] == "raw" and im.mode == "RGB" and tile[3][1:] in ((0, 1), (w * 3, 1)):
+            # Uncompressed top-down RGB: start reading at the crop's first row
+            rawmode = tile[3][0]
+            im.tile = [("raw", (0, 0, w, bottom - top), tile[2] + top * w * 3, (rawmode, 0, 1))]
+            im._size = (w, bottom - top)
+            im.load()
+            top, bottom = 0, bottom - top
+        region = im.crop((left, top, right, bottom)).convert("RGB")
+    return cv2.cvtColor(np.asarray(region), cv2.COLOR_RGB2BGR)
+
+def map_file(path):
+    """Read-only memory map of a spool file for cv2.imdecode"""
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+class IngestQueue:
+    """Job queue that turns uploaded scans into preview + archival images"""
+
+    def __init__(self, on_preview, on_done=None, workers=INGEST_WORKERS):
+        self.on_preview = on_preview
+        self.on_done = on_done
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, spool_path, original_path, small_path, context):
+        """Queue a spooled scan; returns the job id immediately. The job deletes the spool file."""
+        job_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.jobs[job_id] = {
+                'job_id': job_id,
+                'state': 'queued',
+                'error': None,
+                'submitted': time.time(),
+                'preview_ready': None,
+                'finished': None,
+                'reduction': None,
+                **context,
+            }
+            self._trim()
+        self.executor.submit(self._run, job_id, spool_path, original_path, small_path, context)
+        return job_id
+
+    def status(self, job_id):
+        """Snapshot of a job's state, or None for unknown ids"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def _trim(self):
+        finished = [j for j in self.jobs.values() if j['state'] in ('done', 'failed')]
+        finished.sort(key=lambda j: j['submitted'])
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job['job_id']]
+
+    def _publish(self, job_id, square_img, small_path, context, factor):
+        img_180 = cv2.resize(square_img, (PREVIEW_SIZE, PREVIEW_SIZE), interpolation=cv2.INTER_AREA)
+        cv2.imwrite(small_path, img_180)
+        self.on_preview(img_180, small_path, context)
+        self._update(job_id, state='archiving', preview_ready=time.time(), reduction=factor)
+
+    def _run(self, job_id, spool_path, original_path, small_path, context):
+        try:
+            self._update(job_id, state='decoding')
+            fmt, size = image_header(spool_path)
+            box = a4_crop_box(*size) if size else None
+
+            if fmt == "JPEG":
+                # Preview first, from a DCT-scaled decode of the mapped file
+                factor, flag = pick_reduction(box[2] - box[0] if box else 0)
+                img = cv2.imdecode(map_file(spool_path), flag)
+                if img is None:
+                    raise ValueError("Invalid image format")
+                self._publish(job_id, center_square(crop_to_box(img, box, factor)), small_path, context, factor)
+                img = None
+                # Then the archival crop at full resolution
+                cv2.imwrite(original_path, decode_roi(spool_path, box))
+            elif fmt:
+                # No cheap reduced decode: decode the crop once and derive both outputs
+                roi = decode_roi(spool_path, box)
+                self._publish(job_id, center_square(roi), small_path, context, 1)
+                cv2.imwrite(original_path, roi)
+            else:
+                # Not readable by PIL; let OpenCV decode the whole file
+                img = cv2.imdecode(map_file(spool_path), cv2.IMREAD_COLOR)
+                if img is None:
+                    raise ValueError("Invalid image format")
+                box = a4_crop_box(img.shape[1], img.shape[0])
+                cropped = crop_to_box(img, box)
+                self._publish(job_id, center_square(cropped), small_path, context, 1)
+                cv2.imwrite(original_path, cropped)
+            self._update(job_id, state='done', finished=time.time())
+            if self.on_done:
+                self.on_done(original_path, small_path, context)
+        except Exception as e:
+            self._update(job_id, state='failed', error=str(e), finished=time.time())
+            log.warning("Ingest job %s failed: %s", job_id, e)
+        finally:
+            try:
+                os.remove(spool_path)
+            except OSError:
+                pass
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Serving modes for the Flask apps.
+app.py and image_coordinator.py call run_server() instead of app.run() so the
+same app can be served by the Flask dev server, a threaded production WSGI
+server (waitress) or an asyncio ASGI server (uvicorn).
+
+Configuration comes from the environment (or .env):
+  SERVER_MODE              dev | wsgi | asgi   (default: wsgi)
+  SERVER_THREADS           worker threads handling requests (default: 16)
+  SERVER_CONNECTION_LIMIT  max simultaneous connections (default: 100)
+  SERVER_BACKLOG           listen backlog (default: 128)
+
+Every MJPEG viewer holds one worker thread for as long as it is connected,
+so SERVER_THREADS should be larger than the expected number of viewers plus
+the polling displays that can be in flight at once.
+"""
+
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "16"))
+SERVER_CONNECTION_LIMIT = int(os.getenv("SERVER_CONNECTION_LIMIT", "100"))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "128"))
+
+SERVER_MODES = ("dev", "wsgi", "asgi")
+
+def run_server(app, host="0.0.0.0", port=5000, mode=None, threads=None,
+               connection_limit=None, debug=False):
+    """Serve a Flask app with the selected server mode (blocks)"""
+    mode = mode or SERVER_MODE
+    threads = threads or SERVER_THREADS
+    connection_limit = connection_limit or SERVER_CONNECTION_LIMIT
+
+    if mode not in SERVER_MODES:
+        log.warning("Unknown SERVER_MODE '%s', expected one of %s; using dev server", mode, SERVER_MODES)
+        mode = "dev"
+
+    if mode == "wsgi":
+        try:
+            from waitress import serve
+        except ImportError:
+            log.warning("waitress is not installed (pip install waitress); using dev server")
+            mode = "dev"
+        else:
+            log.info("Serving on http://%s:%d with waitress (%d threads, %d connections)",
+                     host, port, threads, connection_limit)
+            serve(app, host=host, port=port,
+                  threads=threads,
+                  connection_limit=connection_limit,
+                  backlog=SERVER_BACKLOG,
+                  channel_timeout=30,
+                  ident=None)
+            return
+
+    if mode == "asgi":
+        try:
+            import uvicorn
+            from a2wsgi import WSGIMiddleware
+        except ImportError:
+            log.warning("uvicorn/a2wsgi are not installed (pip install uvicorn a2wsgi); using dev server")
+            mode = "dev"
+        else:
+            # The Flask views stay synchronous; a2wsgi runs them on a bounded
+            # thread pool while uvicorn's event loop owns the sockets.
+            asgi_app = WSGIMiddleware(app, workers=threads)
+            log.info("Serving on http://%s:%d with uvicorn (%d threads, %d connections)",
+                     host, port, threads, connection_limit)
+            uvicorn.run(asgi_app, host=host, port=port,
+                        limit_concurrency=connection_limit,
+                        backlog=SERVER_BACKLOG,
+                        log_level="warning")
+            return
+
+    log.info("Serving on http://%s:%d with the Flask dev server", host, port)
+    app.run(host=host, port=port, debug=debug, use_reloader=False, threaded=True)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Display health telemetry, from the display clients to the coordinator.
+Each display keeps a few counters in its frame loop and sends a 28-byte
+record with every poll (base64 in the X-Display-Telemetry header) and with
+every discovery beacon reply (appended to the UDP datagram, see
+discovery.py):
+
+  '<BBHfffffI'  format version, screens without an image, errors since the
+                last record, frames per second, mean loop time (ms), 1-minute
+                load average, SoC temperature (C, NaN if unknown), tile cache
+                hit rate (NaN before any lookups), CRC-32 of the filenames on
+                the screens
+
+The coordinator compares the CRC with what it assigned, so it can tell
+whether a display actually shows its assignment, and keeps the records in a
+ring buffer per display for /metrics and /telemetry.
+"""
+
+import base64
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+
+TELEMETRY_VERSION = 1
+TELEMETRY = struct.Struct("<BBHfffffI")
+TELEMETRY_HEADER = "X-Display-Telemetry"
+DISPLAY_HEADER = "X-Display-Id"
+THERMAL_ZONE = "/sys/class/thermal/thermal_zone0/temp"
+HISTORY = 720  # samples kept per display (12 minutes at one per second)
+MIN_WINDOW = 1.0  # seconds; polls and beacon replies within a window resend the same record
+
+FIELDS = ('missing', 'errors', 'fps', 'loop_ms', 'load', 'temp_c', 'cache_hit_rate', 'shown_crc')
+
+def filenames_crc(filenames):
+    """CRC-32 of the filenames shown on (or assigned to) a display's screens"""
+    return zlib.crc32("\n".join(f or "" for f in filenames).encode())
+
+def read_temperature():
+    """SoC temperature in C, or NaN off a Pi"""
+    try:
+        with open(THERMAL_ZONE) as f:
+            return int(f.read()) / 1000.0
+    except (OSError, ValueError):
+        return math.nan
+
+def telemetry_bytes(data):
+    """Raw record bytes from a header value (base64) or a datagram tail; None if malformed"""
+    if isinstance(data, str):
+        try:
+            data = base64.b64decode(data)
+        except ValueError:
+            return None
+    if len(data) < TELEMETRY.size or data[0] != TELEMETRY_VERSION:
+        return None
+    return bytes(data[:TELEMETRY.size])
+
+def decode_telemetry(data):
+    """Record dict from telemetry bytes or a header value; None if malformed"""
+    data = telemetry_bytes(data)
+    if data is None:
+        return None
+    return dict(zip(FIELDS, TELEMETRY.unpack(data)[1:]))
+
+class DisplayTelemetry:
+    """Display side: counters updated by the frame loop and image loader"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.loop_time = 0.0
+        self.errors = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.window_start = time.time()
+        self.last = None
+
+    def frame(self, seconds):
+        """Count one frame loop iteration that took seconds of work (excluding sleep)"""
+        with self.lock:
+            self.frames += 1
+            self.loop_time += seconds
+
+    def cache(self, hit):
+        with self.lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def error(self):
+        with self.lock:
+            self.errors += 1
+
+    def record(self, shown, missing):
+        """Encode the counters since the last record and start a new window.
+        shown is the list of filenames on the screens, missing how many screens have no image."""
+        now = time.time()
+        with self.lock:
+            elapsed = now - self.window_start
+            if self.last is not None and elapsed < MIN_WINDOW:
+                return self.last
+            lookups = self.cache_hits + self.cache_misses
+            data = TELEMETRY.pack(
+                TELEMETRY_VERSION, min(missing, 255), min(self.errors, 0xFFFF),
+                self.frames / elapsed,
+                self.loop_time / self.frames * 1000 if self.frames else math.nan,
+                os.getloadavg()[0],
+                read_temperature(),
+                self.cache_hits / lookups if lookups else math.nan,
+                filenames_crc(shown))
+            self.frames = 0
+            self.loop_time = 0.0
+            self.errors = 0
+            self.window_start = now
+            self.last = data
+        return data
+
+    def header(self, shown, missing):
+        """HTTP headers carrying a record"""
+        return {TELEMETRY_HEADER: base64.b64encode(self.record(shown, missing)).decode()}
+
+class TelemetryStore:
+    """Coordinator side: a ring buffer of records per display"""
+
+    def __init__(self, history=HISTORY):
+        self.lock = threading.Lock()
+        self.history = history
+        self.samples = {}  # {display_id: deque of (time, record)}
+        self.last_raw = {}  # {display_id: (time, bytes)} of the newest record, to drop repeats
+
+    def add(self, display_id, data, assigned=None):
+        """Store a record; assigned is the display's current assignment, to check shown_crc against"""
+        raw = telemetry_bytes(data)
+        if raw is None:
+            return None
+        now = time.time()
+        with self.lock:
+            last = self.last_raw.get(display_id)
+            if last is not None and last[1] == raw and now - last[0] < MIN_WINDOW * 2:
+                return None  # the same record again, sent with both a poll and a beacon reply
+            self.last_raw[display_id] = (now, raw)
+            record = decode_telemetry(raw)
+            record['in_sync'] = None if assigned is None else record['shown_crc'] == filenames_crc(assigned)
+            self.samples.setdefault(display_id, deque(maxlen=self.history)).append((now, record))
+        return record
+
+    def latest(self):
+        """{display_id: (time, record)} for the newest sample of each display"""
+        with self.lock:
+            return {display_id: samples[-1] for display_id, samples in self.samples.items() if samples}
+
+    def series(self, display_id=None, since=0):
+        """{display_id: [{time, field: value, ...}]}, JSON-safe (NaN becomes None)"""
+        with self.lock:
+            selected = {d: list(s) for d, s in self.samples.items() if display_id is None or d == display_id}
+        return {d: [dict({k: None if isinstance(v, float) and math.isnan(v) else v
+                          for k, v in record.items()}, time=t)
+                     for t, record in samples if t > since]
+                for d, samples in selected.items()}
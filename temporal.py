@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Temporal effects for the live panel frames (app.py's matrix_loop and
+webacm_single_interactive.py), applied after the per-frame mosaic:
+  trails   exponential moving average of past frames, so movement smears
+  motion   frame differencing: pixels that changed since the last frame keep
+           full brightness, the still background is dimmed
+  denoise  average of the last TEMPORAL_DEPTH frames where nothing moved, the
+           current frame where something did, to calm sensor noise without
+           ghosting
+
+Everything lives in buffers allocated once for the frame shape: a ring of
+the last frames, their running sum, the moving average and the scratch for
+the difference mask. Each frame updates them in place with cv2/numpy dst=
+operations, so a frame allocates nothing, which keeps a Pi 3B+ at camera rate.
+
+Settings are replaced as one namedtuple, so another thread (a Flask route)
+can change them while the frame loop reads them without a lock; a change of
+mode restarts the history.
+"""
+
+import os
+from collections import namedtuple
+import cv2
+import numpy as np
+
+MODES = ("off", "trails", "motion", "denoise")
+TEMPORAL_MODE = os.getenv("TEMPORAL_MODE", "off")
+TEMPORAL_DEPTH = int(os.getenv("TEMPORAL_DEPTH", "4"))  # frames averaged by denoise
+TRAIL_ALPHA = float(os.getenv("TRAIL_ALPHA", "0.25"))  # weight of the newest frame in trails
+MOTION_THRESHOLD = int(os.getenv("MOTION_THRESHOLD", "24"))  # grey level change that counts as motion
+MOTION_BACKGROUND = float(os.getenv("MOTION_BACKGROUND", "0.15"))  # brightness of still pixels in motion mode
+
+TemporalSettings = namedtuple("TemporalSettings", "mode alpha threshold background")
+
+def parse_temporal_settings(source, current=None):
+    """TemporalSettings from request JSON or env-style values, defaulting to current"""
+    current = current or TemporalSettings(TEMPORAL_MODE, TRAIL_ALPHA, MOTION_THRESHOLD, MOTION_BACKGROUND)
+    mode = source.get("mode", current.mode)
+    if mode not in MODES:
+        raise ValueError(f"Unknown temporal mode {mode!r}, expected one of {', '.join(MODES)}")
+    return TemporalSettings(
+        mode,
+        min(max(float(source.get("alpha", current.alpha)), 0.01), 1.0),
+        min(max(int(source.get("threshold", current.threshold)), 0), 255),
+        min(max(float(source.get("background", current.background)), 0.0), 1.0),
+    )
+
+class TemporalFilter:
+    """Temporal effects on a stream of same-shaped BGR uint8 frames"""
+
+    def __init__(self, shape, settings=None, depth=TEMPORAL_DEPTH):
+        if depth < 2:
+            raise ValueError("TEMPORAL_DEPTH must be at least 2")
+        self.settings = settings or parse_temporal_settings({})
+        self.mode = self.settings.mode
+        self.depth = depth
+        self.ring = np.zeros((depth,) + tuple(shape), np.uint8)
+        self.sum = np.zeros(shape, np.uint16)  # of the frames in the ring
+        self.wide = np.empty(shape, np.uint16)
+        self.average = np.zeros(shape, np.float32)
+        self.diff = np.empty(shape, np.uint8)
+        self.mask = np.empty(shape[:2], np.uint8)
+        self.out = np.empty(shape, np.uint8)
+        self.head = 0
+        self.count = 0
+
+    def configure(self, settings):
+        """Replace the settings; safe to call from another thread"""
+        self.settings = settings
+
+    def reset(self):
+        """Forget past frames (call when the picture cuts, e.g. a new camera session)"""
+        self.count = 0
+        self.head = 0
+        self.sum[...] = 0
+
+    def _motion_mask(self, current, previous, threshold):
+        cv2.absdiff(current, previous, dst=self.diff)
+        cv2.cvtColor(self.diff, cv2.COLOR_BGR2GRAY, dst=self.mask)
+        cv2.threshold(self.mask, threshold, 255, cv2.THRESH_BINARY, dst=self.mask)
+        return self.mask
+
+    def apply(self, frame, out=None):
+        """The effect of frame and its predecessors, written to out (default: an internal
+        buffer reused every frame); out may be frame itself. Returns out, or frame when off"""
+        settings = self.settings
+        if settings.mode != self.mode:
+            self.mode = settings.mode
+            self.reset()
+        if settings.mode == "off":
+            return frame
+        out = self.out if out is None else out
+
+        # Push frame into the ring, taking the oldest frame out of the running sum
+        previous = self.ring[self.head - 1] if self.count else None
+        current = self.ring[self.head]
+        if self.count == self.depth:
+            np.subtract(self.sum, current, out=self.sum, casting="unsafe")
+        np.copyto(current, frame)
+        np.add(self.sum, current, out=self.sum, casting="unsafe")
+        first = self.count == 0
+        self.head = (self.head + 1) % self.depth
+        self.count = min(self.count + 1, self.depth)
+
+        if settings.mode == "trails":
+            if first:
+                self.average[...] = current
+            else:
+                cv2.accumulateWeighted(current, self.average, settings.alpha)
+            cv2.convertScaleAbs(self.average, dst=out)
+        elif settings.mode == "motion":
+            cv2.convertScaleAbs(current, dst=out, alpha=settings.background)
+            if not first:
+                cv2.copyTo(current, self._motion_mask(current, previous, settings.threshold), out)
+        elif settings.mode == "denoise":
+            # Rounded mean of the ring, then the current frame wherever it moved
+            np.add(self.sum, self.count // 2, out=self.wide)
+            np.floor_divide(self.wide, self.count, out=self.wide)
+            np.copyto(out, self.wide, casting="unsafe")
+            if not first:
+                cv2.copyTo(current, self._motion_mask(current, previous, settings.threshold), out)
+        return out
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Content-addressed tile store for the display clients.
+The coordinator publishes a manifest mapping every exhibition path to the
+SHA-256 of its 32x32 tile (see tiles.py) and serves tiles by hash from
+/cas/<sha256>. Each display keeps the tiles it has under
+<exhibition>/.cas/<first two hex digits>/<sha256>.png plus a local copy of
+the manifest, so:
+  - a path whose file is missing or stale on this Pi still shows the same
+    tile as every other Pi;
+  - sync() only asks for manifest entries changed since its last version
+    and only downloads hashes it doesn't hold (like rsync), resuming partial
+    downloads with Range requests;
+  - tiles that drop out of the manifest are deleted.
+  - reads (load/read) only use tiles on disk and never block on the network.
+"""
+
+import json
+import logging
+import os
+import threading
+import requests
+
+from tiles import sha256_hex, decode_tile
+
+log = logging.getLogger(__name__)
+
+CAS_DIRNAME = ".cas"
+MANIFEST_FILE = "manifest.json"
+
+class TileStore:
+    """Local content-addressed tile cache kept in step with the coordinator's manifest"""
+
+    def __init__(self, folder, base_url, timeout=5):
+        self.root = os.path.join(folder, CAS_DIRNAME)
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.fetch_done = threading.Condition(self.lock)
+        self.in_flight = set()  # hashes being downloaded; each has one writer of its .part file
+        self.manifest = {}  # relative image path -> tile sha256
+        self.version = 0
+        self.epoch = None
+        self.stats = {'syncs': 0, 'fetched': 0, 'bytes_fetched': 0, 'checksum_failures': 0}
+        os.makedirs(self.root, exist_ok=True)
+        self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.root, MANIFEST_FILE)) as f:
+                data = json.load(f)
+            self.manifest = data['tiles']
+            self.version = data['version']
+            self.epoch = data['epoch']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save_manifest(self):
+        path = os.path.join(self.root, MANIFEST_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({'epoch': self.epoch, 'version': self.version, 'tiles': self.manifest}, f)
+        os.replace(path + ".tmp", path)
+
+    def path(self, sha):
+        """Where a tile with this hash is stored"""
+        return os.path.join(self.root, sha[:2], sha + ".png")
+
+    def has(self, sha):
+        return os.path.exists(self.path(sha))
+
+    def paths(self):
+        """((epoch, version), exhibition paths) of the manifest held locally"""
+        with self.lock:
+            return (self.epoch, self.version), list(self.manifest)
+
+    def lookup(self, rel_path):
+        """Tile hash for an exhibition path, or None if the manifest doesn't list it"""
+        with self.lock:
+            return self.manifest.get(rel_path)
+
+    def fetch(self, sha):
+        """Download one tile by hash and verify it; returns True once it is stored.
+        Safe to call from several threads: a hash already being fetched is waited for"""
+        path = self.path(sha)
+        with self.lock:
+            while sha in self.in_flight:
+                self.fetch_done.wait()
+            if os.path.exists(path):
+                return True
+            self.in_flight.add(sha)
+        try:
+            return self._download(sha, path)
+        finally:
+            with self.lock:
+                self.in_flight.discard(sha)
+                self.fetch_done.notify_all()
+
+    def _download(self, sha, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part = path + ".part"
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {'Range': f"bytes={offset}-"} if offset else {}
+        try:
+            response = requests.get(f"{self.base_url}/cas/{sha}", headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            log.warning("Tile fetch failed for %s: %s", sha[:12], e)
+            return False
+        if response.status_code == 206:
+            mode = "ab"
+        elif response.status_code == 200:
+            mode = "wb"
+        else:
+            if response.status_code == 416 and os.path.exists(part):
+                os.remove(part)  # our partial copy is longer than the tile; start over next time
+            log.warning("Tile fetch for %s returned %d", sha[:12], response.status_code)
+            return False
+        with open(part, mode) as f:
+            f.write(response.content)
+        with open(part, "rb") as f:
+            data = f.read()
+        if sha256_hex(data) != sha:
+            os.remove(part)
+            self.stats['checksum_failures'] += 1
+            log.warning("Tile checksum mismatch for %s", sha[:12])
+            return False
+        os.replace(part, path)
+        self.stats['fetched'] += 1
+        self.stats['bytes_fetched'] += len(response.content)
+        return True
+
+    def sync(self):
+        """Apply manifest changes since the last sync, then fetch missing tiles and drop unused ones.
+        Returns (changed entries, tiles fetched); raises RequestException if the coordinator is unreachable."""
+        params = {'since': self.version, 'epoch': self.epoch or ""}
+        headers = {'If-None-Match': f'"{self.epoch}:{self.version}"'} if self.epoch else {}
+        response = requests.get(f"{self.base_url}/manifest", params=params, headers=headers, timeout=self.timeout)
+        changed = 0
+        if response.status_code != 304:
+            response.raise_for_status()
+            data = response.json()
+            with self.lock:
+                if data['full']:
+                    self.manifest = {}
+                self.manifest.update(data['tiles'])
+                for rel_path in data['removed']:
+                    self.manifest.pop(rel_path, None)
+                self.version = data['version']
+                self.epoch = data['epoch']
+                self._save_manifest()
+            changed = len(data['tiles']) + len(data['removed'])
+
+        with self.lock:
+            wanted = set(self.manifest.values())
+        fetched = sum(1 for sha in wanted if not self.has(sha) and self.fetch(sha))
+        self._prune(wanted)
+        self.stats['syncs'] += 1
+        return changed, fetched
+
+    def _prune(self, wanted):
+        for sub in os.listdir(self.root):
+            sub_path = os.path.join(self.root, sub)
+            if not os.path.isdir(sub_path):
+                continue
+            for name in os.listdir(sub_path):
+                if name.endswith(".png") and name[:-4] not in wanted:
+                    os.remove(os.path.join(sub_path, name))
+
+    def read(self, sha):
+        """Decoded 32x32 tile for a hash if it is on disk, else None. Never downloads:
+        the display loops call this, and fetching is left to sync()"""
+        try:
+            with open(self.path(sha), "rb") as f:
+                return decode_tile(f.read())
+        except FileNotFoundError:
+            return None  # not fetched yet, or pruned by a sync
+
+    def load(self, rel_path):
+        """Decoded 32x32 tile for an exhibition path if the store holds it, else None"""
+        sha = self.lookup(rel_path)
+        return self.read(sha) if sha is not None else None
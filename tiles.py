@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Panel tiles shared by app.py (promotion), image_coordinator.py (catalog) and
+the display clients.
+A tile is the 32x32 image a display shows for an exhibition file, stored as a
+lossless PNG (a few KB), so a display can pull it instead of fetching and
+decoding the full JPEG. Tiles are identified by the exhibition-relative path
+of the image they stand for and checked by SHA-256.
+
+Promotion also builds the rotated variants the exhibition folder uses:
+  rotate/<name>               rotated 90 degrees counter-clockwise (rotate/)
+  linkings/<base>_rot180.jpg  extra orientations of a linking image
+  linkings/<base>_rot270.jpg
+"""
+
+import hashlib
+import os
+import cv2
+import numpy as np
+
+TILE_SIZE = 32
+TILES_DIRNAME = ".tiles"
+CATALOG_TOKEN_HEADER = "X-Catalog-Token"  # shared CATALOG_TOKEN, required by POST /catalog/add
+
+ROTATIONS = {
+    90: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_CLOCKWISE,
+}
+LINKING_ROTATIONS = (180, 270)
+
+def sha256_hex(data):
+    """SHA-256 of a bytes object"""
+    return hashlib.sha256(data).hexdigest()
+
+def make_tile(img):
+    """32x32 panel tile of an image, resized the way the displays do it"""
+    return cv2.resize(img, (TILE_SIZE, TILE_SIZE), interpolation=cv2.INTER_AREA)
+
+def encode_tile(tile):
+    """Lossless PNG bytes of a tile"""
+    ok, buffer = cv2.imencode('.png', tile)
+    if not ok:
+        raise ValueError("Failed to encode tile")
+    return buffer.tobytes()
+
+def decode_tile(data):
+    """Decode PNG tile bytes back to a BGR array, or None"""
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+def tile_path(folder, rel_path):
+    """Where the tile for an exhibition-relative image path lives under folder"""
+    return os.path.join(folder, TILES_DIRNAME, rel_path + ".png")
+
+def promotion_artifacts(img, name, linking=False):
+    """Every file a promoted image adds to the exhibition.
+    Returns [(rel_path, full_image, scheduled)], where scheduled says whether the
+    coordinator should put the path into rotation (rotate/ copies are stored but,
+    like the existing ones, not scheduled)."""
+    base, _ = os.path.splitext(name)
+    if linking:
+        artifacts = [(f"linkings/{base}.jpg", img, True)]
+        for angle in LINKING_ROTATIONS:
+            artifacts.append((f"linkings/{base}_rot{angle}.jpg", cv2.rotate(img, ROTATIONS[angle]), True))
+    else:
+        artifacts = [(f"{base}.jpg", img, True)]
+    artifacts.append((f"rotate/{base}.jpg", cv2.rotate(img, ROTATIONS[90]), False))
+    return artifacts
@@ -1,7 +1,10 @@
+import time
 from flask import Flask, render_template_string
 import requests
+from assignment_wire import AssignmentClient
 
 app = Flask(__name__)
+assignment_client = AssignmentClient("http://localhost:5001")
 
 TEMPLATE = """
 <!DOCTYPE html>
@@ -15,6 +18,10 @@ TEMPLATE = """
         .column h2 { text-align: center; color: #fff; }
         .img-box { margin: 5px; text-align: center; }
         img { max-width: 150px; max-height: 150px; border: 1px solid #ccc; }
+        .health { margin: 10px; border-collapse: collapse; font-family: monospace; }
+        .health td, .health th { padding: 2px 10px; border-bottom: 1px solid #333; text-align: right; }
+        .health .bad { color: #f66; }
+        .health svg polyline { fill: none; stroke: #6cf; stroke-width: 1; }
     </style>
     <script>
         let lastAssignments = null;
@@ -54,9 +61,43 @@ TEMPLATE = """
                 grid.appendChild(col);
             });
         }
+        function fmt(value, digits) {
+            return value === null || value === undefined ? '-' : value.toFixed(digits);
+        }
+        function sparkline(samples, field) {
+            const values = samples.map(s => s[field]).filter(v => v !== null);
+            if (values.length < 2) return '';
+            const max = Math.max(...values) || 1;
+            const points = values.map((v, i) => (i * 120 / (values.length - 1)).toFixed(1) + ',' +
+                                                (20 - v / max * 18).toFixed(1)).join(' ');
+            return '<svg width="120" height="20"><polyline points="' + points + '"/></svg>';
+        }
+        function fetchHealth() {
+            fetch('/telemetry_json')
+                .then(response => response.json())
+                .then(data => {
+                    const rows = Object.entries(data.displays).map(([pi, samples]) => {
+                        const last = samples[samples.length - 1];
+                        const age = data.now - last.time;
+                        const stale = age > 10 || last.in_sync === false || last.missing > 0;
+                        return '<tr class="' + (stale ? 'bad' : '') + '"><td>Pi ' + pi + '</td>' +
+                            '<td>' + fmt(last.fps, 1) + '</td><td>' + sparkline(samples, 'fps') + '</td>' +
+                            '<td>' + fmt(last.loop_ms, 1) + '</td><td>' + fmt(last.load, 2) + '</td>' +
+                            '<td>' + fmt(last.temp_c, 1) + '</td>' +
+                            '<td>' + (last.cache_hit_rate === null ? '-' : Math.round(last.cache_hit_rate * 100) + '%') + '</td>' +
+                            '<td>' + last.missing + '</td><td>' + last.errors + '</td>' +
+                            '<td>' + (last.in_sync === null ? '-' : last.in_sync ? 'yes' : 'NO') + '</td>' +
+                            '<td>' + age.toFixed(0) + 's</td></tr>';
+                    });
+                    document.getElementById('health-rows').innerHTML = rows.join('');
+                })
+                .catch(() => {});
+        }
         document.addEventListener('DOMContentLoaded', function() {
             fetchAndUpdate();
+            fetchHealth();
             setInterval(fetchAndUpdate, 5000);
+            setInterval(fetchHealth, 5000);
         });
     </script>
 </head>
@@ -64,6 +105,11 @@ TEMPLATE = """
     <div class="grid" id="grid">
         <!-- Grid will be populated by JS -->
     </div>
+    <table class="health">
+        <thead><tr><th></th><th>fps</th><th>last 5 min</th><th>loop ms</th><th>load</th><th>temp C</th>
+            <th>cache</th><th>missing</th><th>errors</th><th>in sync</th><th>seen</th></tr></thead>
+        <tbody id="health-rows"></tbody>
+    </table>
 </body>
 </html>
 """
@@ -76,11 +122,20 @@ def grid():
 # New endpoint for AJAX fetch
 @app.route("/assignments_json")
 def assignments_json():
-    resp = requests.get("http://localhost:5001/images/all")
-    data = resp.json()
-    assignments = {str(k): v for k, v in data["assignments"].items()}
+    # Binary frames: after the first poll the coordinator only answers with
+    # the screens that changed, or 304 when nothing did
+    assignment_client.poll()
+    assignments = {str(k): v for k, v in assignment_client.assignments().items()}
     return {"assignments": assignments}
 
+@app.route("/telemetry_json")
+def telemetry_json():
+    # Last 5 minutes of display telemetry from the coordinator's ring buffers
+    now = time.time()
+    resp = requests.get("http://localhost:5001/telemetry", params={"since": now - 300}, timeout=2)
+    displays = {pi: samples for pi, samples in resp.json()["displays"].items() if samples}
+    return {"displays": displays, "now": now}
+
 # Serve images from the exhibition folder
 from flask import send_from_directory
 import os
@@ -1,9 +1,12 @@
+import os
 import cv2
 import numpy as np
 from rgbmatrix import RGBMatrix, RGBMatrixOptions
 from PIL import Image
 from evdev import InputDevice, categorize, ecodes
 import threading
+from temporal import TemporalFilter
+from dither import PanelQuantizer
 
 def main():
     pipeline = (
@@ -54,10 +57,12 @@ def main():
     # options.pwm_bits = 6
     options.pwm_lsb_nanoseconds = 200
     options.gpio_slowdown = 2
-    options.pwm_bits = 8
+    options.pwm_bits = int(os.getenv("PWM_BITS", "8"))
     # options.brightness = 100
 
     matrix = RGBMatrix(options=options)
+    temporal = TemporalFilter((32, 32, 3))  # TEMPORAL_MODE=trails|motion|denoise
+    quantizer = PanelQuantizer(options.pwm_bits)  # DITHER=bayer
 
     if not cap.isOpened():
         print("Cannot open camera")
@@ -65,7 +70,6 @@ def main():
 
 
     from PIL import ImageDraw
-    import os
     try:
         black_img = Image.new("RGB", (32, 32), (0, 0, 0))
         last_show_time = 0
@@ -82,6 +86,7 @@ def main():
                     show_camera_event.clear()
                     last_show_time = time.time()
                     showing_camera = True
+                    temporal.reset()
                 continue
 
 
@@ -151,6 +156,8 @@ def main():
                     print(f"Resized shape invalid: {resized.shape}")
                     continue
 
+                resized = temporal.apply(resized)
+
                 if invert_mode.is_set():
                     contrastInv = 2
                     brightnessInv = 30 
@@ -162,6 +169,8 @@ def main():
                     hsv = cv2.merge([h, s, v])
                     resized = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
 
+                resized = quantizer.apply(resized)
+
                 try:
                     frame_rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
                     image = Image.fromarray(frame_rgb)
@@ -211,6 +220,7 @@ def main():
                         last_show_time = time.time()
                         showing_camera = True
                         showing_last_frame = False
+                        temporal.reset()
                         continue
                     else:
                         showing_last_frame = False